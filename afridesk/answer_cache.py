@@ -0,0 +1,219 @@
+import math
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+
+from afridesk.catalog import tokenize
+from afridesk.result_cache import ResultCache, cache_key
+from afridesk.search import analyze
+
+# Dimensions of the hashed question vectors
+EMBEDDING_DIM = 4096
+
+# Word pairs count less than single terms so reworded questions still match
+BIGRAM_WEIGHT = 0.5
+
+# Cosine similarity at which a stored answer is served for a new question
+ANSWER_CACHE_THRESHOLD = float(os.getenv('AFRIDESK_ANSWER_CACHE_THRESHOLD', 0.85))
+
+# Questions with fewer index terms are too vague to share an answer
+MIN_QUESTION_TERMS = 2
+
+# Words that point back into the conversation ("how much does it cost?", "what about fees?")
+FOLLOW_UP_WORDS = {'it', 'its', 'that', 'this', 'these', 'those', 'them', 'they', 'there', 'same', 'above', 'else'}
+FOLLOW_UP_OPENERS = (('what', 'about'), ('how', 'about'), ('and',), ('also',), ('then',))
+
+# Seconds before a worker re-reads a scope from disk to see other workers' answers
+SCOPE_RELOAD_SECONDS = 60
+
+
+def embed(text):
+    """
+    Hashed bag-of-words vector of a question
+
+    Terms are folded, stemmed and stripped of stopwords (see search.analyze);
+    terms and word pairs are hashed into EMBEDDING_DIM signed buckets and the
+    vector is L2-normalized.
+
+    Returns:
+        dict: bucket -> weight, empty if the text has no terms
+    """
+    terms = analyze(text)
+    features = Counter(terms)
+    for pair in zip(terms, terms[1:]):
+        features[" ".join(pair)] += BIGRAM_WEIGHT
+
+    vector = {}
+    for feature, count in features.items():
+        digest = zlib.crc32(feature.encode('utf-8'))
+        bucket = digest % EMBEDDING_DIM
+        sign = 1.0 if digest & 0x80000000 else -1.0
+        weight = (1 + math.log(count)) if count >= 1 else count
+        vector[bucket] = vector.get(bucket, 0.0) + sign * weight
+
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {bucket: weight / norm for bucket, weight in vector.items()} if norm else {}
+
+
+def cosine(a, b):
+    """Similarity of two normalized sparse vectors"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(bucket, 0.0) for bucket, weight in a.items())
+
+
+def bucket_profile(profile):
+    """
+    The coarse attributes of a profile that answers are shared by
+
+    Age becomes a band; employment status (Ask AfriDesk profiles) and income
+    level (assistant profiles) are kept as given. Names, contact details and
+    free text are never part of it, so a prompt built from these fields alone
+    gives an answer any user in the bucket may be shown.
+
+    Returns:
+        dict: age_band, employment_status and income_level, 'any' when unknown
+    """
+    profile = profile or {}
+    age = profile.get('age')
+    try:
+        age = int(age)
+        age_band = 'minor' if age < 18 else 'senior' if age >= 60 else 'adult'
+    except (TypeError, ValueError):
+        age_band = 'any'
+    bucket = {'age_band': age_band}
+    for field in ('employment_status', 'income_level'):
+        value = str(profile.get(field) or '').strip().lower()
+        bucket[field] = 'any' if value in ('', 'not specified') else value
+    return bucket
+
+
+def profile_bucket(profile):
+    """
+    Coarse profile group answers are shared within
+
+    Only attributes that change what the right answer is are used, so most
+    users of a country share one bucket.
+    """
+    return ":".join(bucket_profile(profile).values())
+
+
+class AnswerCache:
+    """
+    Near-duplicate question cache for chat answers.
+
+    Answers are scoped by country and profile bucket and stored in the shared
+    result cache (so they survive restarts and are shared by workers). A new
+    question is served the stored answer of the most similar earlier question
+    in its scope if the similarity reaches ``threshold``.
+    """
+
+    def __init__(self, namespace, ttl=7 * 24 * 60 * 60, max_entries=5000, threshold=ANSWER_CACHE_THRESHOLD):
+        """
+        Args:
+            namespace (str): Result cache namespace, one per answering model/prompt
+            ttl (float): Seconds an answer is served
+            max_entries (int): Answers kept before LRU eviction
+            threshold (float): Minimum cosine similarity to serve an answer
+        """
+        self.threshold = threshold
+        self._store = ResultCache(namespace, ttl=ttl, max_entries=max_entries, memory_entries=0)
+        self._scopes = {}         # scope -> (loaded_at, {key: vector})
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def scope(country, profile=None):
+        """Scope string for a country and profile"""
+        return f"{(country or 'any').strip().lower()}|{profile_bucket(profile)}"
+
+    @staticmethod
+    def cacheable(question):
+        """Whether a question stands on its own, without earlier turns, well enough to cache"""
+        words = tokenize(question)
+        if FOLLOW_UP_WORDS.intersection(words):
+            return False
+        if any(tuple(words[:len(opener)]) == opener for opener in FOLLOW_UP_OPENERS):
+            return False
+        return len(analyze(question)) >= MIN_QUESTION_TERMS
+
+    def _entries(self, scope):
+        with self._lock:
+            loaded = self._scopes.get(scope)
+        if loaded is not None and time.time() - loaded[0] < SCOPE_RELOAD_SECONDS:
+            return loaded[1]
+
+        entries = {}
+        for key, value in self._store.items(tag=scope):
+            vector = {int(bucket): weight for bucket, weight in value.get('vector', [])}
+            entries[key] = vector
+        with self._lock:
+            self._scopes[scope] = (time.time(), entries)
+        return entries
+
+    def lookup(self, question, scope):
+        """
+        Find a stored answer for a near-duplicate question
+
+        Returns:
+            tuple: (key, answer), or (None, None) on a miss
+        """
+        if not self.cacheable(question):
+            return None, None
+        vector = embed(question)
+        best_key, best_score = None, 0.0
+        for key, candidate in list(self._entries(scope).items()):
+            score = cosine(vector, candidate)
+            if score > best_score:
+                best_key, best_score = key, score
+        if best_key is None or best_score < self.threshold:
+            return None, None
+
+        # Re-check the store so expired or invalidated answers are not served
+        value, fresh = self._store.get(best_key)
+        if value is None or not fresh:
+            self._forget(scope, best_key)
+            return None, None
+        return best_key, value['answer']
+
+    def store(self, question, answer, scope):
+        """
+        Remember an answer
+
+        Returns:
+            str: Entry key (used to invalidate it), or None if not cacheable
+        """
+        if not self.cacheable(question) or not answer:
+            return None
+        vector = embed(question)
+        key = cache_key(scope, " ".join(analyze(question)))
+        self._store.set(
+            key,
+            {"question": question, "answer": answer, "vector": [[bucket, weight] for bucket, weight in vector.items()]},
+            tag=scope,
+        )
+        entries = self._entries(scope)
+        with self._lock:
+            entries[key] = vector
+        return key
+
+    def invalidate(self, key, scope=None):
+        """Drop an answer, e.g. after negative feedback"""
+        self._store.delete(key)
+        if scope is not None:
+            self._forget(scope, key)
+        else:
+            with self._lock:
+                for _, entries in self._scopes.values():
+                    entries.pop(key, None)
+
+    def _forget(self, scope, key):
+        with self._lock:
+            loaded = self._scopes.get(scope)
+            if loaded is not None:
+                loaded[1].pop(key, None)
+
+
+# OpenAI answers from the Government Services Assistant
+ASSISTANT_ANSWERS = AnswerCache('assistant_answers')
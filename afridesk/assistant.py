@@ -1,11 +1,128 @@
+import asyncio
+import functools
+import json
+import os
+import time
 
-from openai import OpenAI
 from pathlib import Path
+from openai import APITimeoutError
 from dotenv import load_dotenv
 from datetime import datetime
+from afridesk.answer_cache import ASSISTANT_ANSWERS, bucket_profile
+from afridesk.catalog import tokenize
+from afridesk.catalog_answers import CATALOG_ANSWERS
+from afridesk.hedging import (
+    HEDGE_CHAT, HEDGE_GEMINI_MODEL, gemini_text_stream, hedged_stream, openai_text_stream, openai_to_gemini
+)
+from afridesk.llm_clients import LLM_CLIENTS, CircuitOpenError
+from afridesk.prompt_cache import memoize_by_profile
+from afridesk.result_cache import ResultCache, cache_key
+from afridesk.search import fold_accents
+from afridesk.singleflight import LLM_REQUESTS
 
 load_dotenv()
 
+# Shown when a reply does not finish within its timeout
+CHAT_TIMEOUT_REPLY = "I'm sorry, the assistant took too long to reply. Please try again."
+
+# Office lists per location and office type; they barely change, so repeat questions skip OpenAI.
+# Read from disk only, so a purge from another process (afridesk.offices_purge) applies at once.
+GOVERNMENT_OFFICES_CACHE = ResultCache(
+    'government_offices',
+    ttl=int(os.getenv('AFRIDESK_OFFICES_CACHE_TTL', 7 * 24 * 60 * 60)),
+    max_entries=int(os.getenv('AFRIDESK_OFFICES_CACHE_SIZE', 2000)),
+    memory_entries=0
+)
+
+def normalize_location(text):
+    """Lowercase, accent-free words, so 'Nairobi,  Kenya' and 'nairobi kenya' share a cache entry"""
+    return " ".join(tokenize(fold_accents(text or "")))
+
+def cached_government_offices(location, office_type=None):
+    """
+    Cached office lookup as JSON text, or None
+    
+    Returns:
+        str: The same JSON text get_government_offices returns, or None on a miss
+    """
+    value, _ = GOVERNMENT_OFFICES_CACHE.get(_offices_cache_key(location, office_type))
+    if value is None:
+        return None
+    return json.dumps(value, ensure_ascii=False)
+
+def store_government_offices(location, office_type, office_info):
+    """
+    Cache an office lookup if it parses as {"offices": [...]}
+    
+    Error strings, invalid JSON and other shapes are never cached. Entries
+    are tagged with the location so purge_government_offices can drop a city.
+    """
+    try:
+        parsed = json.loads(office_info)
+    except (TypeError, ValueError):
+        return
+    if isinstance(parsed, dict) and isinstance(parsed.get('offices'), list):
+        GOVERNMENT_OFFICES_CACHE.set(
+            _offices_cache_key(location, office_type), parsed, tag=normalize_location(location)
+        )
+
+def purge_government_offices(location=None):
+    """
+    Drop cached office lookups for a location (every office type), or all of them
+    
+    Every cached location containing the location's words is dropped, so
+    'Nairobi' also drops 'Nairobi, Kenya' and 'Westlands, Nairobi'. From a
+    shell: ``python -m afridesk.offices_purge Nairobi``.
+    
+    Returns:
+        int: Cached lookups dropped
+    """
+    if not location:
+        return GOVERNMENT_OFFICES_CACHE.purge()
+    words = normalize_location(location)
+    if not words:
+        return 0
+    return GOVERNMENT_OFFICES_CACHE.purge(tag_words=words)
+
+def _offices_cache_key(location, office_type):
+    return cache_key('offices', normalize_location(location), normalize_location(office_type))
+
+def format_profile_context(profile_data):
+    """Format profile data for inclusion in prompts"""
+    if not profile_data:
+        return "No profile information available."
+        
+    context_lines = []
+    for key, value in profile_data.items():
+        if isinstance(value, list):
+            value = ", ".join([str(v) for v in value])
+        if value:  # Only include non-empty values
+            context_lines.append(f"{key.replace('_', ' ').title()}: {value}")
+            
+    return "\n".join(context_lines) if context_lines else "No profile information available."
+
+@memoize_by_profile
+def render_system_content(profile_data, current_date):
+    """System message text for a profile, memoized by a hash of the profile"""
+    return f"""You are a helpful government services assistant. Today's date is {current_date}.
+            Provide accurate, up-to-date information about government services, policies, and procedures.
+            Be clear, concise, and professional in your responses.
+            
+            User's profile context:
+            {format_profile_context(profile_data)}
+            """
+
+@memoize_by_profile
+def render_scope_content(bucket, country, current_date):
+    """
+    System message text for answers shared through ASSISTANT_ANSWERS
+    
+    Built from the answer cache scope alone (country and coarse profile
+    bucket), so the answer suits every user the scope is shared with.
+    """
+    context = {"country": country, **{key: value for key, value in bucket.items() if value != 'any'}}
+    return render_system_content(context, current_date)
+
 class GovernmentAssistant:
 
     def __init__(self, api_key, profile_data=None) -> None:
@@ -13,34 +130,16 @@ class GovernmentAssistant:
         self.client = self.get_client()
         self.current_date = datetime.now().strftime("%Y-%m-%d")
         self.profile_data = profile_data or {}
+        self.last_answer = None   # (key, scope) of the latest cached answer, for invalidation
 
     def _create_system_message(self):
         """Create a system message with profile context"""
-        system_message = {
-            "role": "system",
-            "content": f"""You are a helpful government services assistant. Today's date is {self.current_date}.
-            Provide accurate, up-to-date information about government services, policies, and procedures.
-            Be clear, concise, and professional in your responses.
-            
-            User's profile context:
-            {self._format_profile_context()}
-            """
-        }
-        return system_message
+        # Rendered once per profile and day, so every turn sends the same prefix
+        return {"role": "system", "content": render_system_content(self.profile_data, self.current_date)}
         
     def _format_profile_context(self):
         """Format profile data for inclusion in prompts"""
-        if not self.profile_data:
-            return "No profile information available."
-            
-        context_lines = []
-        for key, value in self.profile_data.items():
-            if isinstance(value, list):
-                value = ", ".join([str(v) for v in value])
-            if value:  # Only include non-empty values
-                context_lines.append(f"{key.replace('_', ' ').title()}: {value}")
-                
-        return "\n".join(context_lines) if context_lines else "No profile information available."
+        return format_profile_context(self.profile_data)
 
     def create_openai_assistant_prompt(self, user_query, user_context=None):
         """
@@ -80,7 +179,8 @@ class GovernmentAssistant:
 
 
     def get_client(self):
-        return OpenAI(api_key=self.api_key)
+        # Shared per key across sessions, with pooled keep-alive connections
+        return LLM_CLIENTS.openai(self.api_key)
     
     def create_assistant(self):
         assistant = self.client.beta.assistants.create(
@@ -106,63 +206,221 @@ class GovernmentAssistant:
             self.api_key = api_key
             self.client = self.get_client()
             
-        prompt = self.create_openai_assistant_prompt(user_query, user_context)
-        
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "system", "content": "You are a helpful government services assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=1500
-            )
+            with LLM_CLIENTS.slot('openai', self.api_key):
+                response = self.client.chat.completions.create(
+                    model="gpt-4-turbo-preview",
+                    messages=self._query_messages(user_query, user_context),
+                    temperature=0.3,
+                    max_tokens=1500
+                )
             return response.choices[0].message.content
             
         except Exception as e:
             return f"I encountered an error while processing your request. Please try again later. Error: {str(e)}"
-
-            
     
-    def chat(self, messages, use_profile_context=True):
+    def _query_messages(self, user_query, user_context):
+        return [
+            {"role": "system", "content": "You are a helpful government services assistant."},
+            {"role": "user", "content": self.create_openai_assistant_prompt(user_query, user_context)}
+        ]
+    
+    def chat(self, messages, use_profile_context=True, stream=False, timeout=None):
         """
         Handle a chat conversation with the government assistant
         
         Args:
             messages: List of message dictionaries with 'role' and 'content' keys
             use_profile_context: Whether to include profile context in the conversation
+            stream: Return a generator of text chunks instead of the full reply
+            timeout (float, optional): Seconds the streamed reply may take in total
             
         Returns:
-            str: Assistant's response
+            str: Assistant's response (a generator of str when stream is True)
         """
+        if stream:
+            return self.chat_stream(messages, use_profile_context, timeout)
+        
+        # Catalog lookups and repeat questions are answered without calling OpenAI
+        question, scope, messages = self._answer_plan(messages, use_profile_context)
+        grounded = self._catalog_answer(question)
+        if grounded is not None:
+            return grounded
+        if scope is not None:
+            key, cached = ASSISTANT_ANSWERS.lookup(question, scope)
+            if cached is not None:
+                self.last_answer = (key, scope)
+                return cached
+        
         try:
-            # Add system message with profile context if available and enabled
-            if use_profile_context and self.profile_data and messages[0]['role'] != 'system':
-                system_message = self._create_system_message()
-                messages = [system_message] + messages
-            
             print("messages", messages)
-            response = self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=messages,
-                temperature=0.3,
-            )
-            return response.choices[0].message.content
+            with LLM_CLIENTS.slot('openai', self.api_key):
+                response = self.client.chat.completions.create(
+                    model="gpt-4-turbo-preview",
+                    messages=messages,
+                    temperature=0.3,
+                )
+            answer = response.choices[0].message.content
+            self._remember_answer(question, answer, scope)
+            return answer
+        except CircuitOpenError:
+            return self._local_answer(question)
         except Exception as e:
             return f"I'm sorry, I encountered an error while processing your message. Please try again. Error: {str(e)}"
     
+    def chat_stream(self, messages, use_profile_context=True, timeout=None):
+        """
+        Like chat, but yield the reply in chunks as OpenAI generates them
+        
+        Errors are yielded as an apology, as chat returns them. With a timeout,
+        every provider read is bounded by it and the reply is cut off with
+        CHAT_TIMEOUT_REPLY once it has taken that long in total.
+        """
+        started = time.monotonic()
+        question, scope, messages = self._answer_plan(messages, use_profile_context)
+        grounded = self._catalog_answer(question)
+        if grounded is not None:
+            yield grounded
+            return
+        if scope is not None:
+            key, cached = ASSISTANT_ANSWERS.lookup(question, scope)
+            if cached is not None:
+                self.last_answer = (key, scope)
+                yield cached
+                return
+        
+        parts = []
+        openai_options = {'timeout': timeout} if timeout else {}
+        gemini_options = {'request_options': {'timeout': timeout}} if timeout else {}
+        try:
+            def openai_reply():
+                return openai_text_stream(
+                    self.api_key, self.client, "gpt-4-turbo-preview", messages, temperature=0.3, **openai_options
+                )
+            
+            gemini_key = os.getenv('GEMINI_API_KEY')
+            if HEDGE_CHAT and gemini_key:
+                # Gemini answers instead when OpenAI is slow to start
+                chunks = hedged_stream(
+                    ('openai', openai_reply),
+                    ('gemini', lambda: gemini_text_stream(
+                        gemini_key, LLM_CLIENTS.gemini(gemini_key, HEDGE_GEMINI_MODEL), openai_to_gemini(messages),
+                        **gemini_options
+                    )),
+                    interface='government_assistant',
+                )
+            else:
+                chunks = openai_reply()
+            
+            for text in chunks:
+                parts.append(text)
+                yield text
+                if timeout and time.monotonic() - started > timeout:
+                    chunks.close()
+                    yield f"\n\n{CHAT_TIMEOUT_REPLY}"
+                    self.last_answer = None
+                    return
+            self._remember_answer(question, "".join(parts), scope)
+        except CircuitOpenError:
+            # OpenAI is down and nothing was sent yet; answer offline right away
+            if not parts:
+                yield self._local_answer(question)
+        except Exception as e:
+            if timeout and (isinstance(e, (APITimeoutError, TimeoutError)) or time.monotonic() - started > timeout):
+                yield f"\n\n{CHAT_TIMEOUT_REPLY}" if parts else CHAT_TIMEOUT_REPLY
+                return
+            yield f"I'm sorry, I encountered an error while processing your message. Please try again. Error: {str(e)}"
+    
+    def _answer_scope(self, messages):
+        """The latest user question and its answer cache scope"""
+        question = next((m['content'] for m in reversed(messages) if m.get('role') == 'user'), "")
+        return question, ASSISTANT_ANSWERS.scope(self.profile_data.get('country'), self.profile_data)
+    
+    def _answer_plan(self, messages, use_profile_context):
+        """
+        The latest question, its answer cache scope and the messages to send
+        
+        Only the opening question of a conversation that carries no profile
+        context is shared: it is sent under a system message built from the
+        scope alone, so its answer suits everyone in the scope. Everything
+        else (follow-ups, later turns, profile-aware chats) is sent as is with
+        its full context and never cached (the scope is None).
+        """
+        question, scope = self._answer_scope(messages)
+        turns = [m for m in messages if m.get('role') != 'system']
+        personal = use_profile_context and bool(self.profile_data)
+        if personal or len(turns) > 1 or not ASSISTANT_ANSWERS.cacheable(question):
+            return question, None, self._with_system_message(messages, use_profile_context)
+        content = render_scope_content(bucket_profile(self.profile_data), self.profile_data.get('country'), self.current_date)
+        return question, scope, [{"role": "system", "content": content}, {"role": "user", "content": question}]
+    
+    def _remember_answer(self, question, answer, scope):
+        """Share an answer in its scope; nothing is cached for follow-ups"""
+        if scope is None:
+            self.last_answer = None
+            return
+        self.last_answer = (ASSISTANT_ANSWERS.store(question, answer, scope), scope)
+    
+    def _catalog_answer(self, question):
+        """Templated catalog answer for documents, fees and processing time questions, or None"""
+        answer = CATALOG_ANSWERS.answer(question, self.profile_data.get('country'))
+        if answer is not None:
+            self.last_answer = None
+        return answer
+    
+    def _local_answer(self, question):
+        """Offline answer while OpenAI's circuit breaker is open"""
+        from afridesk.response import LOCAL_RESPONDER
+        
+        return LOCAL_RESPONDER.respond(question, self.profile_data.get('country'))
+    
+    def _with_system_message(self, messages, use_profile_context):
+        """Prepend the profile system message if enabled and not already present"""
+        if use_profile_context and self.profile_data and messages[0]['role'] != 'system':
+            return [self._create_system_message()] + messages
+        return messages
+    
     def get_government_offices(self, location, office_type=None):
         """
         Get information about government offices in a specific location
+        
+        Lookups are cached on disk per location and office type (see
+        GOVERNMENT_OFFICES_CACHE); errors are returned but never cached.
         """
+        cached = cached_government_offices(location, office_type)
+        if cached is not None:
+            return cached
+        messages = self._offices_messages(location, office_type)
+            
+        def request_offices():
+            with LLM_CLIENTS.slot('openai', self.api_key):
+                response = self.client.chat.completions.create(
+                    model="gpt-4-turbo-preview",
+                    messages=messages,
+                    response_format={"type": "json_object"}
+                )
+            office_info = response.choices[0].message.content
+            store_government_offices(location, office_type, office_info)
+            return office_info
+            
+        # Concurrent lookups for the same place share one request
+        try:
+            return LLM_REQUESTS.do(self._offices_key(location, office_type), request_offices)
+        except Exception as e:
+            return f"Error retrieving government office information: {str(e)}"
+    
+    def _offices_key(self, location, office_type):
+        return f"offices:{normalize_location(location)}:{normalize_location(office_type)}"
+    
+    def _offices_messages(self, location, office_type):
+        """Chat messages asking for a location's offices as JSON"""
         prompt = f"""
         Provide information about government offices in {location}.
         
         Format the response as a JSON object with the following structure:
-        {
+        {{
             "offices": [
-                {
+                {{
                     "name": "Office Name",
                     "type": "Office Type (e.g., 'DMV', 'Post Office', 'City Hall')",
                     "address": "Full Address",
@@ -170,9 +428,9 @@ class GovernmentAssistant:
                     "hours": "Business Hours",
                     "services": ["Service 1", "Service 2"],
                     "website": "Official Website URL"
-                }
+                }}
             ]
-        }
+        }}
         
         Only include real, verifiable government offices. If you're not certain about an office's details,
         it's better to omit it than to provide potentially incorrect information.
@@ -180,19 +438,11 @@ class GovernmentAssistant:
         
         if office_type:
             prompt += f"\nFocus on offices of type: {office_type}"
-            
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "system", "content": "You are a helpful government services assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"}
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            return f"Error retrieving government office information: {str(e)}"
+        
+        return [
+            {"role": "system", "content": "You are a helpful government services assistant."},
+            {"role": "user", "content": prompt}
+        ]
 
     def text_to_speech(self, text, voice):
         speech_file_path = Path("audio.mp3")
@@ -212,3 +462,197 @@ class GovernmentAssistant:
         )
 
         return transcription.text
+
+
+# (event loop, lookup key) -> task of an office lookup in flight, shared by every AsyncGovernmentAssistant
+_OFFICES_IN_FLIGHT = {}
+
+
+async def _in_thread(func, *args, **kwargs):
+    """Run a blocking call in the loop's default executor (asyncio.to_thread needs Python 3.9)"""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+class AsyncGovernmentAssistant(GovernmentAssistant):
+    """
+    GovernmentAssistant whose calls are coroutines, so independent requests can run concurrently.
+
+    ``chat``, ``chat_stream``, ``generate_response``, ``get_government_offices``,
+    ``transcribe`` and ``text_to_speech`` mirror the synchronous methods on an
+    AsyncOpenAI client, sharing each key's slots and circuit breaker. Await
+    them on ASYNC_RUNNER (afridesk.async_runner), the loop the client's
+    connections belong to. Under an LLM cassette they run the synchronous
+    calls in a worker thread, so they are still recorded and replayed.
+    """
+
+    def __init__(self, api_key, profile_data=None) -> None:
+        super().__init__(api_key, profile_data)
+        self.async_client = LLM_CLIENTS.openai_async(self.api_key)
+
+    async def _complete(self, **request):
+        """Text of a chat completion, holding the key's slot"""
+        async with LLM_CLIENTS.slot('openai', self.api_key):
+            if self.async_client is None:
+                response = await _in_thread(self.client.chat.completions.create, **request)
+            else:
+                response = await self.async_client.chat.completions.create(**request)
+        return response.choices[0].message.content
+
+    async def generate_response(self, user_query, user_context=None, api_key=None):
+        """
+        Generate a response to a government-related query
+        """
+        if api_key:
+            self.api_key = api_key
+            self.client = self.get_client()
+            self.async_client = LLM_CLIENTS.openai_async(self.api_key)
+        
+        try:
+            return await self._complete(
+                model="gpt-4-turbo-preview",
+                messages=self._query_messages(user_query, user_context),
+                temperature=0.3,
+                max_tokens=1500
+            )
+        except Exception as e:
+            return f"I encountered an error while processing your request. Please try again later. Error: {str(e)}"
+
+    async def chat(self, messages, use_profile_context=True, stream=False):
+        """
+        Handle a chat conversation with the government assistant
+        
+        Args:
+            messages: List of message dictionaries with 'role' and 'content' keys
+            use_profile_context: Whether to include profile context in the conversation
+            stream: Return an async generator of text chunks instead of the full reply
+            
+        Returns:
+            str: Assistant's response (an async generator of str when stream is True)
+        """
+        if stream:
+            return self.chat_stream(messages, use_profile_context)
+        
+        question, scope, messages = self._answer_plan(messages, use_profile_context)
+        grounded = self._catalog_answer(question)
+        if grounded is not None:
+            return grounded
+        if scope is not None:
+            key, cached = ASSISTANT_ANSWERS.lookup(question, scope)
+            if cached is not None:
+                self.last_answer = (key, scope)
+                return cached
+        
+        try:
+            answer = await self._complete(
+                model="gpt-4-turbo-preview",
+                messages=messages,
+                temperature=0.3,
+            )
+            self._remember_answer(question, answer, scope)
+            return answer
+        except CircuitOpenError:
+            return self._local_answer(question)
+        except Exception as e:
+            return f"I'm sorry, I encountered an error while processing your message. Please try again. Error: {str(e)}"
+
+    async def chat_stream(self, messages, use_profile_context=True):
+        """
+        Like chat, but yield the reply in chunks as OpenAI generates them
+        
+        Unlike the synchronous stream it does not hedge to Gemini. Under a
+        cassette the whole reply is yielded at once.
+        """
+        if self.async_client is None:
+            yield await self.chat(messages, use_profile_context)
+            return
+        
+        question, scope, messages = self._answer_plan(messages, use_profile_context)
+        grounded = self._catalog_answer(question)
+        if grounded is not None:
+            yield grounded
+            return
+        if scope is not None:
+            key, cached = ASSISTANT_ANSWERS.lookup(question, scope)
+            if cached is not None:
+                self.last_answer = (key, scope)
+                yield cached
+                return
+        
+        parts = []
+        try:
+            async with LLM_CLIENTS.slot('openai', self.api_key):
+                response = await self.async_client.chat.completions.create(
+                    model="gpt-4-turbo-preview",
+                    messages=messages,
+                    temperature=0.3,
+                    stream=True,
+                )
+                try:
+                    async for chunk in response:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            parts.append(chunk.choices[0].delta.content)
+                            yield chunk.choices[0].delta.content
+                finally:
+                    # Closing the HTTP response is what actually cancels the generation
+                    await response.close()
+            self._remember_answer(question, "".join(parts), scope)
+        except CircuitOpenError:
+            if not parts:
+                yield self._local_answer(question)
+        except Exception as e:
+            yield f"I'm sorry, I encountered an error while processing your message. Please try again. Error: {str(e)}"
+
+    async def get_government_offices(self, location, office_type=None):
+        """
+        Get information about government offices in a specific location
+        
+        Cached lookups are answered at once. Concurrent lookups for the same
+        place share one request; a caller timing out does not cancel it for
+        the others.
+        """
+        cached = cached_government_offices(location, office_type)
+        if cached is not None:
+            return cached
+        # Tasks belong to one loop, so lookups are shared per loop across every session
+        key = (asyncio.get_running_loop(), self._offices_key(location, office_type))
+        task = _OFFICES_IN_FLIGHT.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._request_offices(location, office_type))
+            _OFFICES_IN_FLIGHT[key] = task
+            task.add_done_callback(lambda _: _OFFICES_IN_FLIGHT.pop(key, None))
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return f"Error retrieving government office information: {str(e)}"
+
+    async def _request_offices(self, location, office_type):
+        office_info = await self._complete(
+            model="gpt-4-turbo-preview",
+            messages=self._offices_messages(location, office_type),
+            response_format={"type": "json_object"}
+        )
+        store_government_offices(location, office_type, office_info)
+        return office_info
+
+    async def text_to_speech(self, text, voice):
+        if self.async_client is None:
+            return await _in_thread(super().text_to_speech, text, voice)
+        speech_file_path = Path("audio.mp3")
+        response = await self.async_client.audio.speech.create(
+            model="tts-1",
+            voice=voice,
+            input=text
+        )
+        await response.astream_to_file(speech_file_path)
+
+    async def transcribe(self, audio_path):
+        if self.async_client is None:
+            return await _in_thread(super().transcribe, audio_path)
+        with open(audio_path, "rb") as audio_file:
+            transcription = await self.async_client.audio.transcriptions.create(
+                model="whisper-1",
+                file=audio_file
+            )
+        return transcription.text
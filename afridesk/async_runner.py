@@ -0,0 +1,50 @@
+import asyncio
+import threading
+
+
+class AsyncRunner:
+    """
+    One asyncio event loop on a background thread, shared by every session.
+
+    Streamlit scripts are synchronous and run on their own threads. Async
+    clients such as AsyncOpenAI keep their connection pools on the loop that
+    first used them, so instead of ``asyncio.run`` per rerun (a new loop each
+    time) every coroutine is submitted to this long-lived loop.
+    """
+
+    def __init__(self, name="afridesk-async"):
+        self._name = name
+        self._loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name=self._name, daemon=True).start()
+                    self._loop = loop
+        return self._loop
+
+    def submit(self, coro):
+        """
+        Schedule a coroutine on the loop
+
+        Returns:
+            concurrent.futures.Future: Its outcome; cancelling it cancels the coroutine
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the loop and wait for its result"""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+
+# Event loop for every async LLM call in the process
+ASYNC_RUNNER = AsyncRunner()
@@ -0,0 +1,239 @@
+"""
+Pre-generate personalized services so the result cache is warm after a deploy.
+
+Covers every country of the profile form with the onboarding category
+combinations plus the combinations seen in recent traffic. Finished jobs are
+appended to a progress file, so an interrupted run resumes where it stopped.
+
+Usage:
+    python -m afridesk.cache_warm                       # warm the shared cache with Gemini
+    python -m afridesk.cache_warm --countries Kenya Ghana --concurrency 2
+    python -m afridesk.cache_warm --stub --dry-run      # list jobs without calling anything
+    python -m afridesk.cache_warm --stub --recordings recorded.json
+"""
+import argparse
+import contextlib
+import hashlib
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import SimpleNamespace
+
+from afridesk import services
+from afridesk.paths import CACHE_DIR
+from afridesk.profile_options import COUNTRIES, ONBOARDING_SERVICES
+from afridesk.result_cache import RESULT_CACHE_PATH
+
+# Stub runs never write into the production cache unless --cache-path says so
+DEFAULT_STUB_CACHE_PATH = os.path.join(CACHE_DIR, 'results-stub.sqlite')
+
+
+class StubClients:
+    """
+    Offline stand-in for LLM_CLIENTS.
+
+    Responses come from a recordings file (prompt sha256 -> response text) when
+    one matches, otherwise they are built from the local service catalog.
+    """
+
+    def __init__(self, recordings=None, latency=0.0):
+        self.recordings = recordings or {}
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def gemini(self, api_key, model_name):
+        return SimpleNamespace(generate_content=self._generate_content)
+
+    def slot(self, provider, api_key):
+        return contextlib.nullcontext()
+
+    def _generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        text = self.recordings.get(prompt_digest(prompt))
+        if text is None:
+            text = json.dumps(_catalog_response(prompt))
+        if stream:
+            return [SimpleNamespace(text=text)]
+        return SimpleNamespace(text=text)
+
+
+def prompt_digest(prompt):
+    """Key of a prompt in a recordings file"""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+def _catalog_response(prompt):
+    country = re.search(r"- Country: (.*)", prompt)
+    needs = re.search(r"- Interested Services: (.*)", prompt)
+    country = country.group(1).strip() if country else ""
+    needs = [need.strip() for need in needs.group(1).split(",") if need.strip()] if needs else []
+    matches = services.get_local_services(country, needs) or services.get_local_services(country)
+    return {"services": [service.to_dict() for service in matches[:7]]}
+
+
+def category_combinations(categories):
+    """Every non-empty combination of the categories, smallest first"""
+    return [
+        list(combo)
+        for size in range(1, len(categories) + 1)
+        for combo in itertools.combinations(categories, size)
+    ]
+
+
+def plan_jobs(countries, categories, traffic, fanout):
+    """
+    List the (country, services_needed) requests to pre-generate
+
+    With fan-out, multi-category requests are answered from per-category cache
+    entries, so one request with every category warms them all; without it,
+    every combination has its own entry.
+
+    Args:
+        countries (list): Countries to warm
+        categories (list): Onboarding categories
+        traffic (list): Recent requests as {"country": ..., "services_needed": [...]}
+        fanout (bool): Whether services are fanned out per category
+
+    Returns:
+        list: (country, services_needed) tuples without duplicates
+    """
+    if fanout:
+        combos = [[]] + [[category] for category in categories] + [list(categories)]
+    else:
+        combos = [[]] + category_combinations(categories)
+
+    jobs = []
+    seen = set()
+
+    def add(country, needs):
+        job = (country, tuple(sorted(needs)))
+        if job not in seen:
+            seen.add(job)
+            jobs.append(job)
+
+    for country in countries:
+        for needs in combos:
+            add(country, needs)
+
+    wanted = set(countries)
+    for request in traffic:
+        if request.get('country') in wanted:
+            add(request['country'], request.get('services_needed', []))
+    return jobs
+
+
+def job_id(country, needs):
+    """Progress key; changes when the prompt, model or fan-out mode changes"""
+    return services.cache_key(
+        country, list(needs), services.SERVICES_MODEL, services.SERVICES_PROMPT_VERSION, services.FANOUT_SERVICES
+    )
+
+
+def load_progress(path):
+    """Job ids already completed by an earlier run"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return {line.strip() for line in f if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def warm(jobs, api_key, concurrency, progress_path):
+    """
+    Run the jobs through load_personalized_services, skipping completed ones
+
+    Returns:
+        tuple: (warmed, skipped, failed) job counts
+    """
+    done = load_progress(progress_path)
+    pending = [job for job in jobs if job_id(*job) not in done]
+    skipped = len(jobs) - len(pending)
+
+    os.makedirs(os.path.dirname(os.path.abspath(progress_path)), exist_ok=True)
+    lock = threading.Lock()
+    warmed = failed = 0
+
+    with open(progress_path, 'a', encoding='utf-8') as progress, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="afridesk-warm") as executor:
+        futures = {
+            executor.submit(services.load_personalized_services, country, list(needs), api_key): (country, needs)
+            for country, needs in pending
+        }
+        for future in as_completed(futures):
+            country, needs = futures[future]
+            label = f"{country}: {', '.join(needs) or '(no categories)'}"
+            try:
+                count = len(future.result()['services'])
+            except Exception as e:
+                failed += 1
+                print(f"  failed  {label}: {e}", file=sys.stderr)
+                continue
+            with lock:
+                progress.write(job_id(country, needs) + "\n")
+                progress.flush()
+                warmed += 1
+            print(f"  warmed  {label} ({count} services) [{warmed + failed}/{len(pending)}]")
+    return warmed, skipped, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate personalized services into the result cache")
+    parser.add_argument('--countries', nargs='+', default=COUNTRIES, help="Countries to warm (default: profile form list)")
+    parser.add_argument('--categories', nargs='+', default=ONBOARDING_SERVICES, help="Categories to combine")
+    parser.add_argument('--no-traffic', action='store_true', help="Ignore combinations from recent traffic")
+    parser.add_argument('--concurrency', type=int, default=4, help="Requests in flight at once")
+    parser.add_argument('--progress', help="File recording completed jobs (default: next to the cache file)")
+    parser.add_argument('--restart', action='store_true', help="Forget earlier progress")
+    parser.add_argument('--cache-path', help="Result cache SQLite file (default: the shared cache)")
+    parser.add_argument('--stub', action='store_true', help="Use an offline provider instead of Gemini")
+    parser.add_argument('--recordings', help="JSON file of recorded responses for --stub")
+    parser.add_argument('--stub-latency', type=float, default=0.0, help="Seconds each stubbed call takes")
+    parser.add_argument('--dry-run', action='store_true', help="Only list the jobs")
+    args = parser.parse_args(argv)
+
+    cache_path = args.cache_path or (DEFAULT_STUB_CACHE_PATH if args.stub else None)
+    if cache_path:
+        services.PERSONALIZED_SERVICES_CACHE = services.PERSONALIZED_SERVICES_CACHE.with_path(cache_path)
+        services.PERSONALIZED_SERVICES_REQUESTS = services.PERSONALIZED_SERVICES_REQUESTS.with_path(cache_path)
+    # Progress belongs to the cache it describes
+    progress_path = args.progress or os.path.splitext(cache_path or RESULT_CACHE_PATH)[0] + '.warm-progress'
+
+    api_key = 'stub' if args.stub else os.getenv('GEMINI_API_KEY')
+    if args.stub:
+        recordings = {}
+        if args.recordings:
+            with open(args.recordings, encoding='utf-8') as f:
+                recordings = json.load(f)
+        services.LLM_CLIENTS = StubClients(recordings, args.stub_latency)
+    elif not api_key and not args.dry_run:
+        print("GEMINI_API_KEY is not set; use --stub for an offline run", file=sys.stderr)
+        return 1
+
+    traffic = [] if args.no_traffic else services.recent_services_requests()
+    jobs = plan_jobs(args.countries, args.categories, traffic, services.FANOUT_SERVICES)
+    print(f"{len(jobs)} jobs for {len(args.countries)} countries ({len(traffic)} recent requests)")
+
+    if args.dry_run:
+        for country, needs in jobs:
+            print(f"  {country}: {', '.join(needs) or '(no categories)'}")
+        return 0
+
+    if args.restart and os.path.exists(progress_path):
+        os.remove(progress_path)
+
+    warmed, skipped, failed = warm(jobs, api_key, max(1, args.concurrency), progress_path)
+    print(f"Warmed {warmed}, skipped {skipped} already done, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
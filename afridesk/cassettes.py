@@ -0,0 +1,492 @@
+"""
+Record and replay Gemini and OpenAI calls, chunk timing included.
+
+Set AFRIDESK_LLM_CASSETTE to a file and AFRIDESK_LLM_CASSETTE_MODE to
+``record`` (call the providers and append every exchange to the file) or
+``replay`` (answer from the file without any network access or real keys).
+Every call site goes through LLM_CLIENTS, so the chat views, services and
+recommendations are all covered.
+
+Replays keep the recorded timings by default. AFRIDESK_LLM_REPLAY_SCALE
+scales them; AFRIDESK_LLM_REPLAY_FIRST_TOKEN / AFRIDESK_LLM_REPLAY_INTER_CHUNK
+replace them with a distribution (``fixed:0.4``, ``uniform:0.2,1.5`` or
+``lognormal:MU,SIGMA`` in seconds).
+
+Usage:
+    AFRIDESK_LLM_CASSETTE=chat.jsonl AFRIDESK_LLM_CASSETTE_MODE=record streamlit run streamlit_app.py
+    AFRIDESK_LLM_CASSETTE=chat.jsonl AFRIDESK_LLM_CASSETTE_MODE=replay GEMINI_API_KEY=replay streamlit run streamlit_app.py
+    python -m afridesk.cassettes chat.jsonl             # summarize a cassette
+"""
+import builtins
+import hashlib
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
+from google.api_core import exceptions as google_exceptions
+
+CASSETTE_PATH = os.getenv('AFRIDESK_LLM_CASSETTE')
+
+# 'record' or 'replay'
+CASSETTE_MODE = os.getenv('AFRIDESK_LLM_CASSETTE_MODE', 'replay')
+
+# Multiplier on recorded delays when replaying
+REPLAY_SCALE = float(os.getenv('AFRIDESK_LLM_REPLAY_SCALE', 1.0))
+
+# Optional distributions replacing recorded first-token and between-chunk delays
+REPLAY_FIRST_TOKEN = os.getenv('AFRIDESK_LLM_REPLAY_FIRST_TOKEN')
+REPLAY_INTER_CHUNK = os.getenv('AFRIDESK_LLM_REPLAY_INTER_CHUNK')
+
+# Prompts carry today's date; masked so a cassette replays on any day
+_DATE_RE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+
+
+class CassetteMissError(LookupError):
+    """Raised when a replayed request was never recorded"""
+
+
+class ReplayedError(RuntimeError):
+    """A recorded error whose class cannot be rebuilt; keeps its HTTP status for the breakers"""
+
+    def __init__(self, message, error_type=None, status=None):
+        super().__init__(message)
+        self.error_type = error_type
+        self.status_code = status
+
+
+def error_info(error):
+    """What a cassette keeps of an error: its message, class and HTTP status"""
+    status = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+    return {
+        'error': str(error),
+        'error_type': f"{type(error).__module__}.{type(error).__qualname__}",
+        'error_status': status if isinstance(status, int) and not isinstance(status, bool) else None,
+    }
+
+
+def replayed_error(exchange):
+    """
+    An error equivalent to the one recorded in an exchange
+
+    OpenAI status, timeout and connection errors, Google API errors and
+    builtin errors are rebuilt as their own class, so rate-limit handling and
+    the circuit breakers see what they saw live; anything else (and cassettes
+    recorded before error types were kept) becomes a ReplayedError.
+    """
+    message = exchange['error']
+    status = exchange.get('error_status')
+    error_type = exchange.get('error_type') or ''
+    module, _, name = error_type.rpartition('.')
+    request = httpx.Request('POST', 'https://replay.invalid')
+
+    if module.split('.')[0] == 'openai':
+        cls = getattr(openai, name, None)
+        if isinstance(cls, type) and issubclass(cls, openai.APIStatusError) and status:
+            return cls(message, response=httpx.Response(status, request=request), body=None)
+        if cls is openai.APITimeoutError:
+            return cls(request)
+        if isinstance(cls, type) and issubclass(cls, openai.APIConnectionError):
+            return cls(message=message, request=request)
+    if module.startswith('google.api_core') and status:
+        # str() of a Google API error starts with its status code
+        prefix = f"{status} "
+        message = message[len(prefix):] if message.startswith(prefix) else message
+        cls = getattr(google_exceptions, name, None)
+        if isinstance(cls, type) and issubclass(cls, google_exceptions.GoogleAPICallError):
+            return cls(message)
+        return google_exceptions.from_http_status(status, message)
+    if module == 'builtins':
+        cls = getattr(builtins, name, None)
+        if isinstance(cls, type) and issubclass(cls, Exception):
+            return cls(message)
+    return ReplayedError(message, error_type or None, status)
+
+
+def request_key(provider, model, payload, stream, options=None):
+    """Stable key of a request: provider, model, payload, stream flag and output-shaping options"""
+    canonical = json.dumps(
+        [provider, model, payload, bool(stream), options or {}],
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(_DATE_RE.sub("<date>", canonical).encode('utf-8')).hexdigest()
+
+
+def latency_sampler(spec):
+    """
+    Sampler for a delay distribution spec
+
+    Args:
+        spec (str): 'fixed:S', 'uniform:LOW,HIGH' or 'lognormal:MU,SIGMA' (seconds)
+
+    Returns:
+        callable: Zero-argument function returning seconds, or None without a spec
+    """
+    if not spec:
+        return None
+    kind, _, args = spec.partition(':')
+    values = [float(value) for value in args.split(',') if value.strip()]
+    if kind == 'fixed' and len(values) == 1:
+        return lambda: values[0]
+    if kind == 'uniform' and len(values) == 2:
+        return lambda: random.uniform(*values)
+    if kind == 'lognormal' and len(values) == 2:
+        return lambda: random.lognormvariate(*values)
+    raise ValueError(f"Unknown latency spec '{spec}'; use fixed:S, uniform:LOW,HIGH or lognormal:MU,SIGMA")
+
+
+class Cassette:
+    """
+    JSON Lines file of recorded exchanges.
+
+    Each line holds one exchange: the request key, the chunks as
+    [seconds since the previous chunk (or the request), text] pairs, and the
+    error (message, class and HTTP status) if the call failed. Requests recorded several times are replayed in
+    turn, so a cassette can hold a latency sample per request.
+    """
+
+    def __init__(self, path, mode=CASSETTE_MODE, scale=REPLAY_SCALE,
+                 first_token=REPLAY_FIRST_TOKEN, inter_chunk=REPLAY_INTER_CHUNK):
+        """
+        Args:
+            path (str): Cassette file
+            mode (str): 'record' or 'replay'
+            scale (float): Multiplier on recorded delays
+            first_token (str, optional): Distribution spec replacing the first chunk's delay
+            inter_chunk (str, optional): Distribution spec replacing the other chunks' delays
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Cassette mode must be 'record' or 'replay', not '{mode}'")
+        self.path = path
+        self.mode = mode
+        self.scale = scale
+        self.first_token = latency_sampler(first_token)
+        self.inter_chunk = latency_sampler(inter_chunk)
+        self._lock = threading.Lock()
+        self._exchanges = {}   # key -> recorded exchanges
+        self._turns = {}       # key -> replays served so far
+        if mode == 'replay':
+            for exchange in load_exchanges(path):
+                self._exchanges.setdefault(exchange['key'], []).append(exchange)
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    def gemini(self, model_name, model=None):
+        """GenerativeModel stand-in that records through ``model`` or replays"""
+        return _GeminiTransport(self, model_name, model)
+
+    def openai(self, client=None):
+        """OpenAI client stand-in that records through ``client`` or replays"""
+        return _OpenAIClient(self, client)
+
+    def record(self, exchange):
+        line = json.dumps(exchange, ensure_ascii=False)
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+    def lookup(self, key):
+        with self._lock:
+            exchanges = self._exchanges.get(key)
+            if not exchanges:
+                raise CassetteMissError(f"No recorded exchange for request {key[:12]} in {self.path}")
+            turn = self._turns.get(key, 0)
+            self._turns[key] = turn + 1
+        return exchanges[turn % len(exchanges)]
+
+    def delay(self, index, recorded):
+        """Seconds to wait before replaying chunk ``index``"""
+        sampler = self.first_token if index == 0 else self.inter_chunk
+        return max(0.0, sampler() if sampler else recorded * self.scale)
+
+    def replay_chunks(self, exchange):
+        """Yield recorded chunk texts with their delays; raise the recorded error at its point"""
+        for index, (recorded, text) in enumerate(exchange['chunks']):
+            time.sleep(self.delay(index, recorded))
+            yield text
+        if exchange.get('error'):
+            raise replayed_error(exchange)
+
+
+def load_exchanges(path):
+    """Exchanges in a cassette file (none if it does not exist yet)"""
+    exchanges = []
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    exchanges.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return exchanges
+
+
+class _Recorder:
+    """Times the chunks of one live call and writes the exchange when it ends"""
+
+    def __init__(self, cassette, key, provider, model):
+        self.cassette = cassette
+        self.exchange = {'key': key, 'provider': provider, 'model': model, 'chunks': [], 'error': None}
+        self._last = time.monotonic()
+
+    def chunk(self, text):
+        now = time.monotonic()
+        self.exchange['chunks'].append([round(now - self._last, 4), text])
+        self._last = now
+
+    def finish(self, error=None):
+        if error is not None:
+            self.exchange.update(error_info(error))
+        self.exchange['recorded_at'] = time.time()
+        self.cassette.record(self.exchange)
+
+
+def _gemini_text(chunk):
+    # Blocked chunks raise on .text; they are replayed as None and raise again
+    try:
+        return chunk.text
+    except ValueError:
+        return None
+
+
+def _gemini_chunk(text):
+    return _BlockedChunk() if text is None else SimpleNamespace(text=text)
+
+
+class _BlockedChunk:
+    @property
+    def text(self):
+        raise ValueError("The response was blocked (replayed from cassette)")
+
+
+class _GeminiTransport:
+    """``generate_content`` for one Gemini model, recorded or replayed"""
+
+    def __init__(self, cassette, model_name, model):
+        self._cassette = cassette
+        self.model_name = model_name
+        self._model = model
+
+    def generate_content(self, contents, generation_config=None, safety_settings=None, stream=False, **kwargs):
+        key = request_key('gemini', self.model_name, contents, stream, generation_config)
+        if self._cassette.replaying:
+            exchange = self._cassette.lookup(key)
+            chunks = (_gemini_chunk(text) for text in self._cassette.replay_chunks(exchange))
+            if stream:
+                return chunks
+            chunks = list(chunks)
+            if any(isinstance(chunk, _BlockedChunk) for chunk in chunks):
+                return _BlockedChunk()
+            return SimpleNamespace(text="".join(chunk.text for chunk in chunks))
+
+        recorder = _Recorder(self._cassette, key, 'gemini', self.model_name)
+        try:
+            response = self._model.generate_content(
+                contents, generation_config=generation_config, safety_settings=safety_settings,
+                stream=stream, **kwargs
+            )
+        except Exception as e:
+            recorder.finish(e)
+            raise
+        if not stream:
+            recorder.chunk(_gemini_text(response))
+            recorder.finish()
+            return response
+        return _RecordedGeminiStream(recorder, response)
+
+
+class _RecordedGeminiStream:
+    """
+    Iterates a live Gemini stream, timing its chunks
+
+    Exposes ``_iterator.cancel`` like the SDK's streamed response, so
+    hedging can still cancel the gRPC call behind it.
+    """
+
+    def __init__(self, recorder, response):
+        self._recorder = recorder
+        self._response = response
+        self._finished = False
+
+    @property
+    def _iterator(self):
+        return self
+
+    def __iter__(self):
+        try:
+            for chunk in self._response:
+                self._recorder.chunk(_gemini_text(chunk))
+                yield chunk
+        except Exception as e:
+            self._finish(e)
+            raise
+        self._finish()
+
+    def _finish(self, error=None):
+        if not self._finished:
+            self._finished = True
+            self._recorder.finish(error)
+
+    def cancel(self):
+        # A stream cancelled part way is not a complete recording
+        self._finished = True
+        cancel = getattr(getattr(self._response, '_iterator', None), 'cancel', None)
+        if cancel:
+            cancel()
+
+
+class _OpenAIClient:
+    """
+    OpenAI client whose chat completions go through the cassette
+
+    Other APIs (audio, assistants) are not recorded: while recording they go
+    straight to the real client, and in replay they fail with CassetteMissError.
+    """
+
+    def __init__(self, cassette, client):
+        self._client = client
+        self.chat = SimpleNamespace(completions=_OpenAITransport(cassette, client))
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if self._client is None:
+            raise CassetteMissError(
+                f"OpenAI '{name}' calls are not recorded; cassettes only replay chat.completions"
+            )
+        return getattr(self._client, name)
+
+
+class _OpenAITransport:
+    """``chat.completions.create``, recorded or replayed"""
+
+    def __init__(self, cassette, client):
+        self._cassette = cassette
+        self._client = client
+
+    def create(self, model, messages, stream=False, **kwargs):
+        options = {name: kwargs[name] for name in ('response_format', 'tools') if name in kwargs}
+        key = request_key('openai', model, messages, stream, options)
+        if self._cassette.replaying:
+            exchange = self._cassette.lookup(key)
+            chunks = self._cassette.replay_chunks(exchange)
+            if stream:
+                return (
+                    SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+                    for text in chunks
+                )
+            text = "".join(text or "" for text in chunks)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+        recorder = _Recorder(self._cassette, key, 'openai', model)
+        try:
+            response = self._client.chat.completions.create(model=model, messages=messages, stream=stream, **kwargs)
+        except Exception as e:
+            recorder.finish(e)
+            raise
+        if not stream:
+            recorder.chunk(response.choices[0].message.content)
+            recorder.finish()
+            return response
+        return _RecordedOpenAIStream(recorder, response)
+
+
+class _RecordedOpenAIStream:
+    """Iterates a live OpenAI stream, timing its chunks; ``close`` still cancels it"""
+
+    def __init__(self, recorder, response):
+        self._recorder = recorder
+        self._response = response
+        self._finished = False
+
+    def __iter__(self):
+        try:
+            for chunk in self._response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    self._recorder.chunk(chunk.choices[0].delta.content)
+                yield chunk
+        except Exception as e:
+            self._finish(e)
+            raise
+        self._finish()
+
+    def _finish(self, error=None):
+        if not self._finished:
+            self._finished = True
+            self._recorder.finish(error)
+
+    def close(self):
+        # A stream cancelled part way is not a complete recording
+        self._finished = True
+        close = getattr(self._response, 'close', None)
+        if close:
+            close()
+
+
+def cassette_from_env():
+    """Cassette configured by AFRIDESK_LLM_CASSETTE, or None"""
+    if not CASSETTE_PATH:
+        return None
+    return Cassette(CASSETTE_PATH)
+
+
+def summarize(path):
+    """Exchange counts and first-token / total latency percentiles per provider"""
+    by_provider = {}
+    for exchange in load_exchanges(path):
+        by_provider.setdefault(exchange['provider'], []).append(exchange)
+
+    summary = {}
+    for provider, exchanges in by_provider.items():
+        first = sorted(exchange['chunks'][0][0] for exchange in exchanges if exchange['chunks'])
+        total = sorted(sum(delay for delay, _ in exchange['chunks']) for exchange in exchanges)
+
+        def percentile(values, pct):
+            return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else None
+
+        summary[provider] = {
+            'exchanges': len(exchanges),
+            'distinct_requests': len({exchange['key'] for exchange in exchanges}),
+            'errors': sum(1 for exchange in exchanges if exchange.get('error')),
+            'first_chunk_p50': percentile(first, 50),
+            'first_chunk_p90': percentile(first, 90),
+            'total_p50': percentile(total, 50),
+            'total_p90': percentile(total, 90),
+            'mean_chunks': statistics.mean(len(exchange['chunks']) for exchange in exchanges),
+        }
+    return summary
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("Usage: python -m afridesk.cassettes CASSETTE", file=sys.stderr)
+        return 2
+    summary = summarize(argv[0])
+    if not summary:
+        print(f"{argv[0]} has no recorded exchanges")
+        return 1
+    def seconds(value):
+        # Providers whose exchanges all failed before a chunk have no first-chunk timings
+        return "-" if value is None else f"{value:.3f}s"
+
+    for provider, stats in summary.items():
+        print(f"{provider}: {stats['exchanges']} exchanges ({stats['distinct_requests']} distinct, {stats['errors']} errors)")
+        print(f"  first chunk p50 {seconds(stats['first_chunk_p50'])}  p90 {seconds(stats['first_chunk_p90'])}")
+        print(f"  total       p50 {seconds(stats['total_p50'])}  p90 {seconds(stats['total_p90'])}  "
+              f"({stats['mean_chunks']:.1f} chunks on average)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import re
+import threading
+
+from afridesk.records import SERVICE_STORE
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Split text into lowercase alphanumeric tokens"""
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+class _CountryIndex:
+    """Inverted indexes over the services of a single country"""
+
+    def __init__(self, services):
+        # Catalog services are pinned in the shared store as compact records
+        self.services = [SERVICE_STORE.add(service, pinned=True) for service in services]
+        self.names = [service.get('name', '').lower() for service in self.services]
+        self.by_category = {}
+        self.by_token = {}
+        self._expansions = {}
+
+        for idx, service in enumerate(self.services):
+            category = service.get('category', '').lower()
+            self.by_category.setdefault(category, set()).add(idx)
+            for token in tokenize(service.get('name', '')):
+                self.by_token.setdefault(token, set()).add(idx)
+
+    def _token_postings(self, query_token):
+        """
+        Union of the postings of every name token containing query_token.
+
+        Category filters match anywhere inside a service name (e.g. "Health"
+        matches "Healthcare"), so a query token is expanded against the
+        vocabulary once and the result is memoized.
+        """
+        postings = self._expansions.get(query_token)
+        if postings is None:
+            postings = set()
+            for token, ids in self.by_token.items():
+                if query_token in token:
+                    postings |= ids
+            self._expansions[query_token] = frozenset(postings)
+        return postings
+
+    def _name_matches(self, category):
+        """Ids of services whose name contains the category as a substring"""
+        tokens = tokenize(category)
+        if not tokens:
+            candidates = range(len(self.services))
+        else:
+            candidates = None
+            for token in tokens:
+                postings = self._token_postings(token)
+                candidates = set(postings) if candidates is None else candidates & postings
+                if not candidates:
+                    return set()
+        # Tokens only narrow the candidates; the substring check keeps the match exact
+        return {idx for idx in candidates if category in self.names[idx]}
+
+    def lookup(self, categories):
+        """Ids of services matching any of the categories, in catalog order"""
+        matches = set()
+        for category in categories:
+            category = category.lower()
+            matches |= self.by_category.get(category, set())
+            matches |= self._name_matches(category)
+        return sorted(matches)
+
+
+class ServiceCatalog:
+    """
+    Service catalog with per-country, per-category and per-token indexes.
+
+    Indexes are built once per country on first use, so lookups are answered
+    from set intersections instead of scanning every service.
+    """
+
+    def __init__(self, source):
+        """
+        Args:
+            source (dict): Mapping of country name to {"services": [...]}
+        """
+        self._source = source
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def countries(self):
+        """List the countries available in the catalog"""
+        return list(self._source.keys())
+
+    def _index(self, country):
+        index = self._indexes.get(country)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(country)
+                if index is None:
+                    country_data = self._source.get(country) or {}
+                    index = _CountryIndex(country_data.get('services', []))
+                    self._indexes[country] = index
+        return index
+
+    def get_services(self, country, service_categories=None):
+        """
+        Get services for a country, optionally filtered by service categories
+
+        A service matches a category if its category equals it or its name
+        contains it (both case-insensitive). Countries without services fall
+        back to the first country in the catalog.
+
+        Args:
+            country (str): The country to get services for
+            service_categories (list, optional): List of service categories to filter by
+
+        Returns:
+            list: Service records matching the criteria
+        """
+        index = self._index(country)
+        if not index.services and self._source:
+            index = self._index(next(iter(self._source)))
+
+        if not service_categories:
+            return list(index.services)
+
+        return [index.services[idx] for idx in index.lookup(service_categories)]
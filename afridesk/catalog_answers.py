@@ -0,0 +1,144 @@
+import threading
+
+from afridesk.intents import IntentMatcher, service_intents
+from afridesk.catalog_store import LOCAL_SERVICES, SERVICE_CATALOG
+
+# Catalog fields that can be asked about, with the phrases that ask for them
+ATTRIBUTES = {
+    'required_documents': {
+        'label': "Required documents",
+        'cues': ['document', 'documents', 'papers', 'paperwork', 'requirements', 'requirement',
+                 'need to bring', 'what to bring'],
+    },
+    'fees': {
+        'label': "Fees",
+        'cues': ['fee', 'fees', 'cost', 'costs', 'how much', 'price', 'charge', 'charges',
+                 'is it free'],
+    },
+    'processing_time': {
+        'label': "Processing time",
+        'cues': ['how long', 'processing time', 'turnaround', 'does it take', 'will it take',
+                 'waiting time', 'when will'],
+    },
+}
+
+# Score a service needs to be resolved: its full name, an acronym, or two name words
+MIN_SERVICE_SCORE = 2
+
+
+class CatalogAnswerer:
+    """
+    Answers "attribute of a service" questions straight from the catalog.
+
+    A question is answered only when all three slots resolve: the country
+    (named in the question, else the user's), one service of that country
+    with no tie, and at least one attribute (documents, fees, processing
+    time) the service has. Anything else returns None so the caller asks
+    the LLM as before.
+    """
+
+    def __init__(self, catalog, source=None):
+        """
+        Args:
+            catalog (ServiceCatalog): Indexed catalog to resolve services in
+            source (CatalogStore, optional): Compiled catalog, for the version in citations
+        """
+        self._catalog = catalog
+        self._version = (getattr(source, 'content_hash', None) or '')[:12]
+        self._attributes = IntentMatcher([
+            {'name': field, 'terms': {cue: 1 for cue in spec['cues']}, 'answer': None}
+            for field, spec in ATTRIBUTES.items()
+        ])
+        self._countries = IntentMatcher([
+            {'name': country, 'terms': {country: 1}, 'answer': None}
+            for country in catalog.countries()
+        ])
+        self._services = {}
+        self._lock = threading.Lock()
+
+    def _service_matcher(self, country):
+        matcher = self._services.get(country)
+        if matcher is None:
+            with self._lock:
+                matcher = self._services.get(country)
+                if matcher is None:
+                    services = self._catalog.get_services(country)
+                    intents = service_intents(services, country)
+                    for intent, service in zip(intents, services):
+                        intent['service'] = service
+                    matcher = self._services[country] = IntentMatcher(intents)
+        return matcher
+
+    def resolve(self, prompt, country=None):
+        """
+        Fill the country, service and attribute slots of a question
+
+        Returns:
+            dict: 'country', 'service' (catalog record) and 'attributes' (fields
+            asked about, in catalog order), or None if a slot does not resolve
+        """
+        named = self._countries.match(prompt)
+        country = named['name'] if named else country
+        if not country or country not in self._catalog.countries():
+            return None
+
+        asked = self._attributes.scores(prompt)
+        if not asked:
+            return None
+
+        matcher = self._service_matcher(country)
+        scores = matcher.scores(prompt)
+        if not scores:
+            return None
+        ranked = sorted(scores.values(), reverse=True)
+        if ranked[0] < MIN_SERVICE_SCORE or (len(ranked) > 1 and ranked[1] == ranked[0]):
+            return None
+        service = matcher.intents[max(scores, key=scores.get)]['service']
+
+        attributes = [
+            field for idx, field in enumerate(ATTRIBUTES)
+            if idx in asked and service.get(field)
+        ]
+        if not attributes:
+            return None
+        return {'country': country, 'service': service, 'attributes': attributes}
+
+    def answer(self, prompt, country=None):
+        """
+        Templated answer with its catalog citation
+
+        Args:
+            prompt (str): The user's question
+            country (str, optional): The user's country, used unless the question names one
+
+        Returns:
+            str: Markdown answer, or None if the question is not a catalog lookup
+        """
+        slots = self.resolve(prompt or "", country)
+        if slots is None:
+            return None
+        service, country = slots['service'], slots['country']
+
+        lines = [f"**{service['name']}** ({country})", ""]
+        for field in slots['attributes']:
+            value = service[field]
+            label = ATTRIBUTES[field]['label']
+            if isinstance(value, (list, tuple)):
+                lines.append(f"**{label}:**")
+                lines.extend(f"- {item}" for item in value)
+                lines.append("")
+            else:
+                lines.append(f"**{label}:** {value}")
+                lines.append("")
+
+        citation = f"AfriDesk service catalog, {country} › {service['name']}"
+        if self._version:
+            citation += f" (version {self._version})"
+        lines.append(f"*Source: {citation}*")
+        if service.get('website'):
+            lines.append(f"*Official page: {service['website']}*")
+        return "\n".join(lines)
+
+
+# Shared by both chat interfaces
+CATALOG_ANSWERS = CatalogAnswerer(SERVICE_CATALOG, LOCAL_SERVICES)
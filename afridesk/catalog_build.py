@@ -0,0 +1,286 @@
+"""
+Validate service catalog sources and compile them into the SQLite artifact.
+
+Sources are one YAML file per country (``country:`` plus a ``services:`` list)
+or CSV files with one row per service and a ``country`` column. Required
+documents in CSV are separated by semicolons.
+
+Usage:
+    python -m afridesk.catalog_build              # validate and compile
+    python -m afridesk.catalog_build --check      # fail if the artifact is stale
+"""
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import zlib
+from datetime import datetime, timezone
+
+from afridesk.paths import CATALOG_PATH, CATALOG_SOURCES_DIR
+
+# Bump when the artifact layout changes
+CATALOG_FORMAT_VERSION = 1
+
+# Country served when a user's country has no catalog entries
+DEFAULT_COUNTRY = "Nigeria"
+
+REQUIRED_FIELDS = ('name', 'description', 'required_documents', 'processing_time', 'fees', 'category')
+OPTIONAL_FIELDS = ('why_relevant', 'eligibility', 'website', 'application_process', 'additional_notes')
+
+
+class CatalogValidationError(ValueError):
+    """Raised when catalog sources are malformed"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("\n".join(errors))
+
+
+def _load_yaml(path):
+    import yaml
+
+    with open(path, 'r', encoding='utf-8') as f:
+        document = yaml.safe_load(f) or {}
+    if not isinstance(document, dict):
+        raise CatalogValidationError([f"{path}: expected a mapping with 'country' and 'services'"])
+    return [(document.get('country'), document.get('services'), path)]
+
+
+def _load_csv(path):
+    countries = {}
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            country = (row.pop('country', '') or '').strip()
+            service = {key: (value or '').strip() for key, value in row.items() if key}
+            service['required_documents'] = [
+                doc.strip() for doc in service.get('required_documents', '').split(';') if doc.strip()
+            ]
+            countries.setdefault(country, []).append(service)
+    return [(country, services, path) for country, services in countries.items()]
+
+
+def _validate_service(service, where):
+    errors = []
+    if not isinstance(service, dict):
+        return [f"{where}: expected a mapping"]
+    for field in REQUIRED_FIELDS:
+        if field not in service:
+            errors.append(f"{where}: missing '{field}'")
+    for field, value in service.items():
+        if field not in REQUIRED_FIELDS and field not in OPTIONAL_FIELDS:
+            errors.append(f"{where}: unknown field '{field}'")
+        elif field == 'required_documents':
+            if not isinstance(value, list) or not all(isinstance(doc, str) and doc.strip() for doc in value):
+                errors.append(f"{where}: 'required_documents' must be a list of non-empty strings")
+        elif not isinstance(value, str) or (field in REQUIRED_FIELDS and not value.strip()):
+            errors.append(f"{where}: '{field}' must be a non-empty string")
+    return errors
+
+
+def source_paths(sources_dir=CATALOG_SOURCES_DIR):
+    """Catalog source files in a directory, in load order"""
+    return sorted(
+        glob.glob(os.path.join(sources_dir, '*.yaml'))
+        + glob.glob(os.path.join(sources_dir, '*.yml'))
+        + glob.glob(os.path.join(sources_dir, '*.csv'))
+    )
+
+
+def load_sources(sources_dir=CATALOG_SOURCES_DIR):
+    """
+    Load and validate every catalog source in a directory
+
+    Args:
+        sources_dir (str): Directory containing *.yaml / *.yml / *.csv sources
+
+    Returns:
+        dict: Mapping of country name to {"services": [...]}
+
+    Raises:
+        CatalogValidationError: If any source is malformed
+    """
+    paths = source_paths(sources_dir)
+    catalog = {}
+    origins = {}
+    errors = []
+
+    for path in paths:
+        try:
+            entries = _load_csv(path) if path.endswith('.csv') else _load_yaml(path)
+        except CatalogValidationError as e:
+            errors.extend(e.errors)
+            continue
+        except Exception as e:
+            errors.append(f"{path}: could not be read: {e}")
+            continue
+
+        for country, services, origin in entries:
+            if not isinstance(country, str) or not country.strip():
+                errors.append(f"{origin}: missing 'country'")
+                continue
+            if country in origins:
+                errors.append(f"{origin}: '{country}' is already defined in {origins[country]}")
+                continue
+            if not isinstance(services, list) or not services:
+                errors.append(f"{origin}: '{country}' must have a non-empty 'services' list")
+                continue
+            origins[country] = origin
+
+            seen_names = set()
+            for position, service in enumerate(services, 1):
+                where = f"{origin}: {country} service #{position}"
+                errors.extend(_validate_service(service, where))
+                name = service.get('name', '').strip().lower() if isinstance(service, dict) else ''
+                if name and name in seen_names:
+                    errors.append(f"{where}: duplicate service name '{service['name']}'")
+                seen_names.add(name)
+            catalog[country] = {"services": services}
+
+    if not catalog and not errors:
+        errors.append(f"{sources_dir}: no catalog sources found")
+    if errors:
+        raise CatalogValidationError(errors)
+    return catalog
+
+
+def content_hash(catalog):
+    """Stable hash of the catalog contents"""
+    payload = json.dumps([CATALOG_FORMAT_VERSION, catalog], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def compile_catalog(catalog, output_path=CATALOG_PATH, default_country=DEFAULT_COUNTRY):
+    """
+    Write a catalog to a SQLite artifact
+
+    Each country is stored as one zlib-compressed JSON blob so the app can
+    load countries individually on first use.
+
+    Returns:
+        str: The catalog content hash
+    """
+    digest = content_hash(catalog)
+    if default_country not in catalog:
+        default_country = sorted(catalog)[0]
+    # Default country first, then alphabetical; the first country is the fallback
+    ordered = [default_country] + sorted(country for country in catalog if country != default_country)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute(
+            "CREATE TABLE countries (position INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, "
+            "service_count INTEGER NOT NULL, payload BLOB NOT NULL)"
+        )
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ('format_version', str(CATALOG_FORMAT_VERSION)),
+            ('content_hash', digest),
+            ('built_at', datetime.now(timezone.utc).isoformat()),
+        ])
+        for position, country in enumerate(ordered):
+            services = catalog[country]['services']
+            payload = zlib.compress(
+                json.dumps(services, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), 9
+            )
+            conn.execute(
+                "INSERT INTO countries VALUES (?, ?, ?, ?)",
+                (position, country, len(services), payload),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, output_path)
+    return digest
+
+
+def artifact_hash(path=CATALOG_PATH):
+    """Content hash recorded in an artifact, or None if it is missing or unreadable"""
+    if not os.path.exists(path):
+        return None
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'content_hash'").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+
+def is_stale(sources_dir=CATALOG_SOURCES_DIR, path=CATALOG_PATH):
+    """
+    Whether an artifact is missing or no longer matches its sources
+
+    Sources are only parsed and hashed when one of them, or the sources
+    directory (whose mtime changes when a file is added or deleted), is newer
+    than the artifact, so an unchanged catalog costs a few stat calls.
+
+    Raises:
+        CatalogValidationError: If the sources changed and are malformed
+    """
+    if not os.path.exists(path):
+        return True
+    built_at = os.path.getmtime(path)
+    watched = source_paths(sources_dir)
+    if os.path.isdir(sources_dir):
+        watched.append(sources_dir)
+    if all(os.path.getmtime(source) <= built_at for source in watched):
+        return False
+    if artifact_hash(path) != content_hash(load_sources(sources_dir)):
+        return True
+    # Same contents (e.g. a fresh checkout); skip the hash next time
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return False
+
+
+def build(sources_dir=CATALOG_SOURCES_DIR, output_path=CATALOG_PATH):
+    """Validate sources and compile them; returns the content hash"""
+    return compile_catalog(load_sources(sources_dir), output_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate and compile the AfriDesk service catalog")
+    parser.add_argument('--sources', default=CATALOG_SOURCES_DIR, help="Directory of YAML/CSV sources")
+    parser.add_argument('--output', default=CATALOG_PATH, help="Path of the compiled SQLite artifact")
+    parser.add_argument('--default-country', default=DEFAULT_COUNTRY, help="Fallback country for unknown countries")
+    parser.add_argument('--check', action='store_true', help="Only validate; exit non-zero if the artifact is stale")
+    args = parser.parse_args(argv)
+
+    try:
+        catalog = load_sources(args.sources)
+    except CatalogValidationError as e:
+        print(f"Catalog validation failed with {len(e.errors)} error(s):", file=sys.stderr)
+        for error in e.errors:
+            print(f"  - {error}", file=sys.stderr)
+        return 1
+
+    service_count = sum(len(data['services']) for data in catalog.values())
+    if args.check:
+        expected = content_hash(catalog)
+        if artifact_hash(args.output) != expected:
+            print(f"{args.output} is stale or missing; run python -m afridesk.catalog_build", file=sys.stderr)
+            return 1
+        print(f"{args.output} is up to date ({len(catalog)} countries, {service_count} services)")
+        return 0
+
+    digest = compile_catalog(catalog, args.output, args.default_country)
+    print(f"Compiled {len(catalog)} countries, {service_count} services to {args.output} ({digest[:12]})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from collections.abc import Mapping
+
+from afridesk.catalog import ServiceCatalog
+from afridesk.paths import CACHE_DIR, CATALOG_PATH, CATALOG_SOURCES_DIR
+
+# Upper bound for SQLite's memory-mapped reads of the artifact
+MMAP_SIZE = 256 * 1024 * 1024
+
+
+class CatalogStore(Mapping):
+    """
+    Read-only, lazily loaded view of the compiled service catalog.
+
+    Behaves like the old LOCAL_SERVICES dict (country -> {"services": [...]})
+    but only decodes a country the first time it is requested. The artifact
+    is opened read-only with memory-mapped I/O, so workers share its pages.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(
+            f"file:{path}?mode=ro&immutable=1", uri=True, check_same_thread=False
+        )
+        self._conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        self._lock = threading.Lock()
+        self._countries = {}
+
+        meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+        self.content_hash = meta.get('content_hash')
+        self.built_at = meta.get('built_at')
+        self._names = [row[0] for row in self._conn.execute("SELECT name FROM countries ORDER BY position")]
+
+    def __getitem__(self, country):
+        data = self._countries.get(country)
+        if data is not None:
+            return data
+        with self._lock:
+            data = self._countries.get(country)
+            if data is None:
+                row = self._conn.execute(
+                    "SELECT payload FROM countries WHERE name = ?", (country,)
+                ).fetchone()
+                if row is None:
+                    raise KeyError(country)
+                data = {"services": json.loads(zlib.decompress(row[0]).decode('utf-8'))}
+                self._countries[country] = data
+        return data
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, country):
+        return country in self._names
+
+
+def load_catalog(path=CATALOG_PATH, sources_dir=CATALOG_SOURCES_DIR):
+    """
+    Open the compiled catalog, compiling it from sources if it is missing or stale
+
+    Deployments normally ship the artifact built by
+    ``python -m afridesk.catalog_build``; compiling here is a fallback for
+    when it is missing or older than the sources it was built from. If the
+    package directory is read-only, the artifact goes to CACHE_DIR. Malformed
+    sources never replace a working artifact.
+    """
+    from afridesk.catalog_build import CatalogValidationError, build, is_stale
+
+    compiled = path
+    try:
+        if is_stale(sources_dir, path):
+            try:
+                build(sources_dir, path)
+            except OSError:
+                path = os.path.join(CACHE_DIR, os.path.basename(path))
+                if is_stale(sources_dir, path):
+                    build(sources_dir, path)
+    except CatalogValidationError as e:
+        if not os.path.exists(path):
+            path = compiled
+        if not os.path.exists(path):
+            raise
+        print(f"Catalog sources are invalid, serving the last compiled catalog: {e}")
+    return CatalogStore(path)
+
+# Local service data as fallback, categorized by service type.
+# Countries are compiled from afridesk/data/services and loaded on first use.
+LOCAL_SERVICES = load_catalog()
+
+# Indexed view over LOCAL_SERVICES, built lazily per country
+SERVICE_CATALOG = ServiceCatalog(LOCAL_SERVICES)
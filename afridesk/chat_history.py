@@ -0,0 +1,216 @@
+import math
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from afridesk.llm_clients import LLM_CLIENTS
+from afridesk.search import analyze
+
+# Smaller model for folding old turns into the running summary
+SUMMARY_MODEL = 'gemini-1.5-flash-latest'
+
+# Tokens of history sent with each chat turn, including the system prompt
+CHAT_TOKEN_BUDGET = int(os.getenv('AFRIDESK_CHAT_TOKEN_BUDGET', 8000))
+
+# Most recent turns always sent verbatim
+CHAT_RECENT_TURNS = int(os.getenv('AFRIDESK_CHAT_RECENT_TURNS', 6))
+
+# Share of a prompt's (idf-weighted) terms an older turn must contain to be recalled
+RECALL_MIN_SCORE = 0.5
+
+# Summaries run off the request path; each is one short Gemini call
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="afridesk-chat-summary")
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+def _message_text(message):
+    return " ".join(str(part) for part in message.get('parts', []))
+
+
+def _message_tokens(messages):
+    return sum(estimate_tokens(_message_text(message)) for message in messages)
+
+
+def split_turns(messages):
+    """Group alternating messages into (user, model) turns, dropping unanswered ones"""
+    turns = []
+    for message in messages:
+        if message.get('role') == 'user':
+            turns.append([message])
+        elif turns and len(turns[-1]) == 1:
+            turns[-1].append(message)
+    return [turn for turn in turns if len(turn) == 2]
+
+
+def summarize_turns(summary, turns, api_key):
+    """Fold turns into the running summary with Gemini"""
+    exchanges = "\n".join(
+        f"User: {_message_text(user)}\nAssistant: {_message_text(model)}" for user, model in turns
+    )
+    prompt = f"""
+        Update the running summary of a conversation between a citizen and AfriDesk,
+        a government services assistant. Keep facts about the user's situation, the
+        countries, services, documents, fees and decisions discussed. Drop small talk.
+        Answer with the updated summary only, in under 200 words.
+
+        Current summary:
+        {summary or "(none yet)"}
+
+        New exchanges:
+        {exchanges}
+        """
+    model = LLM_CLIENTS.gemini(api_key, SUMMARY_MODEL)
+    with LLM_CLIENTS.slot('gemini', api_key):
+        return model.generate_content(prompt).text.strip()
+
+
+class ChatMemory:
+    """
+    Token-budgeted view over a session's Gemini chat history.
+
+    Every turn sends the system prompt, the last ``recent_turns`` turns
+    verbatim, a running summary of older turns and the older turns most
+    similar to the new prompt, trimmed to ``token_budget``. Older turns are
+    summarized on a background thread, so a turn never waits for the summary;
+    it uses whichever summary is ready.
+    """
+
+    def __init__(self, token_budget=CHAT_TOKEN_BUDGET, recent_turns=CHAT_RECENT_TURNS,
+                 recall_turns=2, summary_batch=4, summarize=summarize_turns):
+        """
+        Args:
+            token_budget (int): Estimated tokens allowed per request
+            recent_turns (int): Turns always kept verbatim
+            recall_turns (int): Older turns pulled back in by similarity
+            summary_batch (int): Unsummarized older turns that trigger a summary
+            summarize (callable): (summary, turns, api_key) -> new summary
+        """
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self.recall_turns = recall_turns
+        self.summary_batch = summary_batch
+        self.summary = ""
+        self.summarized = 0       # older turns folded into the summary
+        self._summarize = summarize
+        self._pending = None      # (future, turns covered once it finishes)
+        self._terms_by_turn = []  # analyzed terms per turn, in turn order
+
+    def _collect_summary(self):
+        if self._pending is None or not self._pending[0].done():
+            return
+        future, covered = self._pending
+        self._pending = None
+        try:
+            self.summary = future.result()
+            self.summarized = covered
+        except Exception as e:
+            # Older turns stay unsummarized and are retried with the next batch
+            print(f"Chat summary failed: {e}")
+
+    def _schedule_summary(self, older, api_key):
+        if self._pending is not None or len(older) - self.summarized < self.summary_batch:
+            return
+        batch = older[self.summarized:]
+        future = _summary_executor.submit(self._summarize, self.summary, batch, api_key)
+        self._pending = (future, len(older))
+
+    def _terms(self, idx, turn):
+        while len(self._terms_by_turn) <= idx:
+            self._terms_by_turn.append(None)
+        if self._terms_by_turn[idx] is None:
+            self._terms_by_turn[idx] = frozenset(analyze(_message_text(turn[0]) + " " + _message_text(turn[1])))
+        return self._terms_by_turn[idx]
+
+    def _recall(self, turns, prompt):
+        """
+        Summarized turns most similar to the prompt, best first
+
+        A turn scores the idf-weighted share of the prompt's terms (among those
+        any earlier turn mentions) it contains, so long answers are not
+        penalized for their length.
+        """
+        query = set(analyze(prompt))
+        if not query or not self.summarized or not self.recall_turns:
+            return []
+        candidates = [self._terms(idx, turns[idx]) for idx in range(self.summarized)]
+        document_frequency = Counter(term for terms in candidates for term in query & terms)
+        if not document_frequency:
+            return []
+        # Terms no earlier turn mentions say nothing about which turn is closest
+        idf = {term: math.log(1 + len(candidates) / (1 + df)) for term, df in document_frequency.items()}
+        total = sum(idf.values())
+
+        scored = []
+        for idx, terms in enumerate(candidates):
+            score = sum(idf.get(term, 0.0) for term in query & terms) / total
+            if score >= RECALL_MIN_SCORE:
+                scored.append((score, idx))
+        scored.sort(key=lambda item: (-item[0], -item[1]))
+        return [turns[idx] for _, idx in scored[:self.recall_turns]]
+
+    def build(self, history, api_key):
+        """
+        Messages to send for the newest prompt
+
+        Args:
+            history (list): Full transcript: system prompt pair, earlier turns, then the new prompt
+            api_key (str): Gemini key used for background summaries
+
+        Returns:
+            list: Gemini contents within the token budget
+        """
+        prefix, current = history[:2], history[-1]
+        turns = split_turns(history[2:-1])
+
+        self._collect_summary()
+        older_count = max(0, len(turns) - self.recent_turns)
+        self._schedule_summary(turns[:older_count], api_key)
+
+        remaining = self.token_budget - _message_tokens(prefix) - _message_tokens([current])
+
+        # Newest turns first, so the oldest verbatim turns are dropped when over budget
+        kept = []
+        for turn in reversed(turns[older_count:]):
+            cost = _message_tokens(turn)
+            if cost > remaining:
+                break
+            kept.insert(0, turn)
+            remaining -= cost
+
+        context = []
+        if self.summary:
+            summary_pair = [
+                {"role": "user", "parts": [f"Summary of our earlier conversation:\n{self.summary}"]},
+                {"role": "model", "parts": ["Thanks, I'll keep that in mind."]},
+            ]
+            if _message_tokens(summary_pair) <= remaining:
+                context.extend(summary_pair)
+                remaining -= _message_tokens(summary_pair)
+
+        for user, model in self._recall(turns, _message_text(current)):
+            recalled = [
+                {"role": "user", "parts": [f"Earlier you were asked: {_message_text(user)}"]},
+                {"role": "model", "parts": [_message_text(model)]},
+            ]
+            if _message_tokens(recalled) <= remaining:
+                context.extend(recalled)
+                remaining -= _message_tokens(recalled)
+
+        # Older turns the summary does not cover yet, newest first
+        backlog = []
+        for turn in reversed(turns[self.summarized:older_count]):
+            cost = _message_tokens(turn)
+            if cost > remaining:
+                break
+            backlog.insert(0, turn)
+            remaining -= cost
+
+        messages = list(prefix) + context
+        for turn in backlog + kept:
+            messages.extend(turn)
+        messages.append(current)
+        return messages
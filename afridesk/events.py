@@ -0,0 +1,196 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+from afridesk.paths import CACHE_DIR
+
+EVENTS_PATH = os.getenv('AFRIDESK_EVENTS_PATH', os.path.join(CACHE_DIR, 'events.sqlite'))
+
+# Events written per transaction
+EVENT_BATCH_SIZE = int(os.getenv('AFRIDESK_EVENT_BATCH_SIZE', 200))
+
+# Longest an event waits in memory before it is committed
+EVENT_FLUSH_SECONDS = float(os.getenv('AFRIDESK_EVENT_FLUSH_SECONDS', 1.0))
+
+# Events held in memory before new ones are dropped (the writer is stuck or slow)
+EVENT_BUFFER_SIZE = int(os.getenv('AFRIDESK_EVENT_BUFFER_SIZE', 10000))
+
+
+class EventSink:
+    """
+    Append-only store for feedback and usage events.
+
+    ``emit`` only puts the event on an in-memory queue, so it never waits on
+    disk; a background thread commits queued events to SQLite (WAL mode) in
+    batches of up to ``batch_size``, at least every ``flush_seconds``. A crash
+    loses at most the batch not yet committed. When the queue is full new
+    events are dropped and counted rather than blocking the caller.
+    """
+
+    def __init__(self, path=EVENTS_PATH, batch_size=EVENT_BATCH_SIZE,
+                 flush_seconds=EVENT_FLUSH_SECONDS, buffer_size=EVENT_BUFFER_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=buffer_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._conn = None
+
+    def emit(self, kind, session=None, **fields):
+        """
+        Record an event without blocking
+
+        Args:
+            kind (str): Event type, e.g. 'chat' or 'feedback'
+            session (str, optional): Session the event belongs to
+            **fields: JSON-serializable event data
+
+        Returns:
+            bool: False if the event was dropped because the buffer is full
+        """
+        self._start()
+        try:
+            self._queue.put_nowait((kind, time.time(), session, fields))
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    def flush(self, timeout=5.0):
+        """
+        Wait until everything emitted so far is committed
+
+        Returns:
+            bool: False if the writer did not catch up within the timeout
+        """
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name="afridesk-events", daemon=True)
+                thread.start()
+                self._thread = thread
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, "
+                "created_at REAL NOT NULL, session TEXT, data TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS events_kind ON events (kind, created_at)")
+            self._conn = conn
+        return self._conn
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch, waiters = [], []
+            deadline = time.monotonic() + self.flush_seconds
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    # Commit now; nobody should wait out the flush interval
+                    deadline = 0
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    remaining = deadline - time.monotonic()
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                # Any bad batch is dropped; the writer must outlive it
+                with self._lock:
+                    self.dropped += len(batch)
+                print(f"Could not write {len(batch)} events: {e}")
+            finally:
+                for waiter in waiters:
+                    waiter.set()
+
+    def _write(self, batch):
+        if not batch:
+            return
+        rows = [
+            (kind, created_at, session, json.dumps(fields, ensure_ascii=False, default=str))
+            for kind, created_at, session, fields in batch
+        ]
+        try:
+            conn = self._connect()
+            with conn:
+                conn.executemany("INSERT INTO events (kind, created_at, session, data) VALUES (?, ?, ?, ?)", rows)
+            self.written += len(rows)
+        except (sqlite3.Error, OSError) as e:
+            # Losing analytics is better than taking the app down with it
+            with self._lock:
+                self.dropped += len(rows)
+            print(f"Could not write {len(rows)} events: {e}")
+
+    def read(self, kind=None, limit=100):
+        """
+        Most recent committed events, newest first
+
+        Returns:
+            list: Dicts with 'kind', 'created_at', 'session' and the event fields
+        """
+        if not os.path.exists(self.path):
+            return []
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            sql = "SELECT kind, created_at, session, data FROM events"
+            params = []
+            if kind:
+                sql += " WHERE kind = ?"
+                params.append(kind)
+            sql += " ORDER BY id DESC LIMIT ?"
+            params.append(limit)
+            rows = conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError:
+            return []
+        finally:
+            conn.close()
+        return [
+            dict(json.loads(data), kind=kind, created_at=created_at, session=session)
+            for kind, created_at, session, data in rows
+        ]
+
+
+def session_id(state):
+    """Stable id for a Streamlit session, stored in its session_state"""
+    if 'event_session_id' not in state:
+        state['event_session_id'] = uuid.uuid4().hex
+    return state['event_session_id']
+
+
+# Feedback and usage events from every session in the process
+EVENT_SINK = EventSink()
+
+# Commit what is still queued when the server shuts down cleanly
+atexit.register(EVENT_SINK.flush, 2.0)
@@ -0,0 +1,386 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from afridesk.events import EVENT_SINK
+from afridesk.llm_clients import LLM_CLIENTS
+
+# Race a second provider when the first is slow to start streaming
+HEDGE_CHAT = os.getenv('AFRIDESK_HEDGE_CHAT', '0') == '1'
+
+# Seconds to wait for the primary's first token until enough latencies are observed
+HEDGE_DEADLINE_SECONDS = float(os.getenv('AFRIDESK_HEDGE_DEADLINE_SECONDS', 2.5))
+
+# Percentile of observed first-token latencies used as the deadline afterwards
+HEDGE_PERCENTILE = float(os.getenv('AFRIDESK_HEDGE_PERCENTILE', 90))
+
+# Observed latencies needed before the percentile replaces the fixed deadline
+HEDGE_MIN_SAMPLES = 20
+
+# Never hedge sooner than this, however fast the primary usually is
+HEDGE_MIN_DEADLINE_SECONDS = 0.5
+
+# Seconds without a chunk from a running reply before it is given up as stalled
+HEDGE_STALL_SECONDS = float(os.getenv('AFRIDESK_HEDGE_STALL_SECONDS', 60))
+
+# Models used when a chat view hedges to the other provider
+HEDGE_GEMINI_MODEL = os.getenv('AFRIDESK_HEDGE_GEMINI_MODEL', 'gemini-1.5-pro-latest')
+HEDGE_OPENAI_MODEL = os.getenv('AFRIDESK_HEDGE_OPENAI_MODEL', 'gpt-4-turbo-preview')
+
+
+class NoTextError(RuntimeError):
+    """Raised when a provider's stream ends without producing any text"""
+
+
+class StreamCancelled(RuntimeError):
+    """Raised in a stream's reader when the stream was closed from another thread"""
+
+
+class TextStream:
+    """
+    Text chunks of one streamed reply that any thread can close.
+
+    ``close`` cancels the provider's response at once, even while the thread
+    reading it is blocked waiting for the next chunk; that reader then gets
+    StreamCancelled, which the key's circuit breaker does not count.
+    """
+
+    def __init__(self, read, cancel):
+        """
+        Args:
+            read (callable): read(stream) returning the chunk generator; it calls stream.attach(response)
+            cancel (callable): cancel(response), safe to call from any thread
+        """
+        self._cancel = cancel
+        self._lock = threading.Lock()
+        self._response = None
+        self.closed = False
+        self._chunks = read(self)
+
+    def attach(self, response):
+        """Register the provider's response; cancelled right away if the stream was already closed"""
+        with self._lock:
+            self._response = response
+            closed = self.closed
+        if closed:
+            self._cancel_response(response)
+
+    def __iter__(self):
+        return self._chunks
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            response = self._response
+        if response is not None:
+            self._cancel_response(response)
+        try:
+            self._chunks.close()
+        except ValueError:
+            # Running in the reader's thread; the cancelled response ends it there
+            pass
+
+    def _cancel_response(self, response):
+        try:
+            self._cancel(response)
+        except Exception as e:
+            print(f"Cancelling a stream failed: {e}")
+
+
+def _cancel_gemini(response):
+    # The gRPC call behind a streamed reply; no public handle exists, so best effort
+    cancel = getattr(getattr(response, '_iterator', None), 'cancel', None)
+    if cancel:
+        cancel()
+
+
+def _cancel_openai(response):
+    # Closing the HTTP response is what actually cancels the generation
+    close = getattr(response, 'close', None)
+    if close:
+        close()
+
+
+def gemini_text_stream(api_key, model, contents, **kwargs):
+    """
+    Text of a streamed Gemini reply as a TextStream, holding the key's slot while read
+
+    Blocked or empty chunks are skipped.
+    """
+    def read(stream):
+        with LLM_CLIENTS.slot('gemini', api_key):
+            try:
+                response = model.generate_content(contents, stream=True, **kwargs)
+                stream.attach(response)
+                for chunk in response:
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        continue
+                    if text:
+                        yield text
+            except Exception as e:
+                if stream.closed:
+                    raise StreamCancelled("gemini stream cancelled") from e
+                raise
+    return TextStream(read, _cancel_gemini)
+
+
+def openai_text_stream(api_key, client, model, messages, **kwargs):
+    """Text of a streamed OpenAI chat completion as a TextStream, holding the key's slot while read"""
+    def read(stream):
+        with LLM_CLIENTS.slot('openai', api_key):
+            try:
+                response = client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+                stream.attach(response)
+                try:
+                    for chunk in response:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            yield chunk.choices[0].delta.content
+                finally:
+                    _cancel_openai(response)
+            except Exception as e:
+                if stream.closed:
+                    raise StreamCancelled("openai stream cancelled") from e
+                raise
+    return TextStream(read, _cancel_openai)
+
+
+def gemini_to_openai(contents):
+    """Gemini contents as OpenAI chat messages"""
+    return [
+        {
+            "role": "assistant" if message.get('role') == 'model' else "user",
+            "content": " ".join(str(part) for part in message.get('parts', [])),
+        }
+        for message in contents
+    ]
+
+
+def openai_to_gemini(messages):
+    """
+    OpenAI chat messages as Gemini contents
+
+    The system message becomes a user turn, as the Ask AfriDesk chat sends its
+    system prompt, and consecutive turns of one role are merged.
+    """
+    contents = []
+    for message in messages:
+        role = 'model' if message.get('role') == 'assistant' else 'user'
+        if contents and contents[-1]['role'] == role:
+            contents[-1]['parts'].append(message.get('content', ''))
+        else:
+            contents.append({"role": role, "parts": [message.get('content', '')]})
+    return contents
+
+
+class HedgeStats:
+    """
+    First-token latencies and hedge outcomes per provider.
+
+    Latencies give each primary its own deadline: the ``HEDGE_PERCENTILE``
+    of its recent first tokens, so only its slowest requests get hedged.
+    """
+
+    def __init__(self, window=200):
+        self._lock = threading.Lock()
+        self._latencies = {}      # provider -> recent first-token seconds
+        self._window = window
+        self.requests = 0
+        self.hedged = 0
+        self.wins = {}            # provider -> requests it won
+        self.hedged_wins = {}     # provider -> hedged requests it won
+        self.failures = 0
+
+    def observe(self, provider, seconds):
+        with self._lock:
+            self._latencies.setdefault(provider, deque(maxlen=self._window)).append(seconds)
+
+    def deadline(self, provider):
+        """Seconds to wait for the provider's first token before hedging"""
+        with self._lock:
+            samples = sorted(self._latencies.get(provider, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEADLINE_SECONDS
+        rank = min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE / 100))
+        return max(HEDGE_MIN_DEADLINE_SECONDS, samples[rank])
+
+    def record(self, winner, hedged):
+        with self._lock:
+            self.requests += 1
+            if hedged:
+                self.hedged += 1
+            if winner is None:
+                self.failures += 1
+                return
+            self.wins[winner] = self.wins.get(winner, 0) + 1
+            if hedged:
+                self.hedged_wins[winner] = self.hedged_wins.get(winner, 0) + 1
+
+    def snapshot(self):
+        """Counters plus the hedge rate and each provider's win rate among hedged requests"""
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'hedged': self.hedged,
+                'hedge_rate': self.hedged / self.requests if self.requests else 0.0,
+                'wins': dict(self.wins),
+                'hedged_win_rate': {
+                    provider: wins / self.hedged for provider, wins in self.hedged_wins.items()
+                } if self.hedged else {},
+                'failures': self.failures,
+            }
+
+
+# Shared by both chat views
+HEDGE_STATS = HedgeStats()
+
+
+def hedged_stream(primary, secondary, deadline=None, stats=HEDGE_STATS, interface=None):
+    """
+    Stream from the primary, racing the secondary if the primary is slow to start
+
+    The secondary is started when the primary has produced no text within
+    the deadline, or fails first. Whichever yields text first wins; the
+    other's stream is closed at once and everything after comes from the
+    winner. A primary that loses before its first token is recorded at the
+    time it had waited, a lower bound on its latency, so its deadline does
+    not drift down. A reply silent for HEDGE_STALL_SECONDS raises TimeoutError.
+
+    Args:
+        primary (tuple): (provider name, zero-argument function returning a text iterator)
+        secondary (tuple): Same for the provider to hedge to
+        deadline (float, optional): Seconds before hedging; defaults to the primary's percentile
+        stats (HedgeStats): Where latencies and outcomes are recorded
+        interface (str, optional): Chat view, for the recorded event
+
+    Yields:
+        str: Text chunks of the winning reply
+
+    Raises:
+        Exception: The primary's error if neither provider produced text
+    """
+    if deadline is None:
+        deadline = stats.deadline(primary[0])
+    events = queue.Queue()
+    cancelled = {primary[0]: threading.Event(), secondary[0]: threading.Event()}
+    streams = {}
+    started_at = {}
+
+    def pump(name, factory):
+        stream = None
+        try:
+            stream = factory()
+            streams[name] = stream
+            if cancelled[name].is_set():
+                return
+            produced = False
+            for text in stream:
+                if cancelled[name].is_set():
+                    break
+                produced = True
+                events.put((name, 'text', text))
+            if not produced and not cancelled[name].is_set():
+                raise NoTextError(f"{name} returned no text")
+            events.put((name, 'done', None))
+        except Exception as e:
+            events.put((name, 'error', e))
+        finally:
+            _close(stream)
+
+    def cancel(name):
+        cancelled[name].set()
+        _close(streams.get(name))
+
+    def next_event():
+        try:
+            return events.get(timeout=HEDGE_STALL_SECONDS)
+        except queue.Empty:
+            raise TimeoutError(f"No reply chunk for {HEDGE_STALL_SECONDS:g}s") from None
+
+    def start(name, factory):
+        started_at[name] = time.monotonic()
+        threading.Thread(target=pump, args=(name, factory), name=f"afridesk-hedge-{name}", daemon=True).start()
+
+    start(*primary)
+    hedged = False
+    errors = {}
+    winner = None
+    first = None
+    try:
+        while winner is None:
+            if hedged:
+                name, kind, value = next_event()
+            else:
+                try:
+                    name, kind, value = events.get(timeout=max(0.0, started_at[primary[0]] + deadline - time.monotonic()))
+                except queue.Empty:
+                    start(*secondary)
+                    hedged = True
+                    continue
+            if kind == 'text':
+                winner, first = name, value
+            else:
+                errors[name] = value if kind == 'error' else NoTextError(f"{name} returned no text")
+                if not hedged:
+                    start(*secondary)
+                    hedged = True
+                elif len(errors) == len(started_at):
+                    break
+
+        if winner is None:
+            stats.record(None, hedged)
+            _record_event(interface, primary[0], secondary[0], hedged, None, deadline, None, errors)
+            raise errors.get(primary[0]) or errors[secondary[0]]
+
+        loser = secondary[0] if winner == primary[0] else primary[0]
+        if hedged and loser == primary[0] and primary[0] not in errors:
+            # Censored: the primary's first token would have taken at least this long
+            stats.observe(primary[0], time.monotonic() - started_at[primary[0]])
+        cancel(loser)
+        first_token = time.monotonic() - started_at[winner]
+        stats.observe(winner, first_token)
+        stats.record(winner, hedged)
+        _record_event(interface, primary[0], secondary[0], hedged, winner, deadline, first_token, errors)
+
+        yield first
+        while True:
+            name, kind, value = next_event()
+            if name != winner:
+                continue
+            if kind == 'text':
+                yield value
+            elif kind == 'error':
+                raise value
+            else:
+                return
+    finally:
+        # Also reached when the caller stops reading early
+        for name in cancelled:
+            cancel(name)
+
+
+def _close(stream):
+    close = getattr(stream, 'close', None)
+    if close:
+        try:
+            close()
+        except ValueError:
+            # A plain generator still running in its pump thread; it stops at its next chunk
+            pass
+
+
+def _record_event(interface, primary, secondary, hedged, winner, deadline, first_token, errors):
+    EVENT_SINK.emit(
+        'hedge',
+        interface=interface,
+        primary=primary,
+        secondary=secondary,
+        hedged=hedged,
+        winner=winner,
+        deadline_ms=round(deadline * 1000),
+        first_token_ms=round(first_token * 1000) if first_token is not None else None,
+        errors={name: str(error) for name, error in errors.items()} or None,
+    )
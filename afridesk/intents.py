@@ -0,0 +1,240 @@
+import os
+import threading
+from collections import deque
+
+from afridesk.catalog import tokenize
+from afridesk.paths import DATA_DIR
+from afridesk.search import fold_accents, stem
+
+INTENTS_PATH = os.path.join(DATA_DIR, 'intents.yaml')
+
+# Words in service names too common to point at one service on their own
+GENERIC_NAME_WORDS = {
+    'application', 'registration', 'register', 'certificate', 'card', 'service', 'services',
+    'program', 'programme', 'scheme', 'fund', 'renewal', 'national', 'office', 'license',
+    'licence', 'and', 'for', 'of', 'the',
+}
+
+# Weights of terms generated from catalog services
+SERVICE_NAME_WEIGHT = 4
+SERVICE_ACRONYM_WEIGHT = 3
+SERVICE_WORD_WEIGHT = 1
+
+
+def normalize(text):
+    """
+    Lowercase, fold accents, tokenize and stem, padded with spaces
+
+    Patterns and prompts both go through this, so matching " id " can only
+    hit the whole word "id" and never the inside of "provide".
+    """
+    return " " + " ".join(stem(token) for token in tokenize(fold_accents(text))) + " "
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over characters.
+
+    Finds every occurrence of every pattern in one pass over the text,
+    however many patterns there are.
+    """
+
+    def __init__(self, patterns):
+        """
+        Args:
+            patterns (dict): Pattern string -> payload returned when it matches
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for pattern, payload in patterns.items():
+            state = 0
+            for ch in pattern:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(payload)
+
+        # Breadth-first so a state's fail link is final before its children need it
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, text):
+        """Payloads of every pattern occurrence in text, in order of their end"""
+        matches = []
+        state = 0
+        for ch in text:
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            if self._output[state]:
+                matches.extend(self._output[state])
+        return matches
+
+
+class IntentMatcher:
+    """
+    Scores every intent against a prompt in one pass.
+
+    An intent's score is the sum of the weights of its distinct terms found in
+    the prompt as whole words; the highest score wins, earlier intents win ties.
+    """
+
+    def __init__(self, intents):
+        """
+        Args:
+            intents (list): Dicts with 'name', 'terms' ({term: weight}) and 'answer'
+        """
+        self.intents = intents
+        patterns = {}
+        for idx, intent in enumerate(intents):
+            for term, weight in intent['terms'].items():
+                key = normalize(term)
+                if key.strip():
+                    patterns.setdefault(key, []).append((idx, term, weight))
+        self._automaton = AhoCorasick(patterns)
+
+    def scores(self, prompt):
+        """Score per intent index for the prompt"""
+        matched = set()
+        for entries in self._automaton.find(normalize(prompt)):
+            matched.update(entries)
+        scores = {}
+        for idx, _, weight in matched:
+            scores[idx] = scores.get(idx, 0) + weight
+        return scores
+
+    def match(self, prompt):
+        """
+        Best intent for the prompt
+
+        Returns:
+            dict: The winning intent, or None if no term matched
+        """
+        scores = self.scores(prompt)
+        if not scores:
+            return None
+        best = min(scores, key=lambda idx: (-scores[idx], idx))
+        return self.intents[best]
+
+
+def _load_yaml(path):
+    import yaml
+
+    with open(path, encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
+
+
+def load_intents(path=INTENTS_PATH):
+    """
+    Read the intent table
+
+    Returns:
+        tuple: (intents, fallback answer)
+    """
+    document = _load_yaml(path)
+    intents = []
+    for intent in document.get('intents', []):
+        terms = intent.get('terms', {})
+        if isinstance(terms, list):
+            terms = {term: 1 for term in terms}
+        intents.append({'name': intent['name'], 'terms': terms, 'answer': intent['answer'].strip()})
+    return intents, document.get('fallback', '').strip()
+
+
+def format_service_answer(service, country):
+    """Markdown answer for a catalog service"""
+    lines = [f"Here's what I have on **{service.get('name')}** in {country}:", ""]
+    if service.get('description'):
+        lines.append(service['description'])
+        lines.append("")
+    if service.get('required_documents'):
+        lines.append(f"- **Required documents:** {', '.join(service['required_documents'])}")
+    if service.get('processing_time'):
+        lines.append(f"- **Processing time:** {service['processing_time']}")
+    if service.get('fees'):
+        lines.append(f"- **Fees:** {service['fees']}")
+    if service.get('website'):
+        lines.append(f"- **Website:** {service['website']}")
+    return "\n".join(lines)
+
+
+def service_intents(services, country):
+    """
+    One intent per catalog service
+
+    Its terms are the full service name, the name without a trailing generic
+    word, acronyms in the name (e.g. NHIF, KRA) and its other distinctive words.
+    """
+    # "Ghana" in "Ghana Card Registration" says nothing about which Ghana service is meant
+    country_words = {word.lower() for word in (country or '').split()}
+    intents = []
+    for service in services:
+        name = service.get('name', '')
+        terms = {name: SERVICE_NAME_WEIGHT}
+        # People say "Ghana Card" or "KRA PIN" rather than "... Registration"
+        words = name.split()
+        if len(words) > 1 and words[-1].lower() in GENERIC_NAME_WORDS:
+            core = " ".join(words[:-1])
+            if core.lower() not in country_words | {(country or '').lower()}:
+                terms[core] = SERVICE_NAME_WEIGHT
+        for word in name.replace('/', ' ').split():
+            token = "".join(ch for ch in word if ch.isalnum())
+            if len(token) < 3 or token.lower() in GENERIC_NAME_WORDS or token.lower() in country_words:
+                continue
+            weight = SERVICE_ACRONYM_WEIGHT if token.isupper() else SERVICE_WORD_WEIGHT
+            terms[token] = max(weight, terms.get(token, 0))
+        intents.append({
+            'name': f"service:{name}",
+            'terms': terms,
+            'answer': format_service_answer(service, country),
+        })
+    return intents
+
+
+class LocalResponder:
+    """
+    Offline answers from the intent table and the service catalog.
+
+    One compiled matcher per country (the table plus that country's catalog
+    services) is built on first use and shared by every session.
+    """
+
+    def __init__(self, catalog, path=INTENTS_PATH):
+        self._catalog = catalog
+        self._intents, self.fallback = load_intents(path)
+        self._matchers = {}
+        self._lock = threading.Lock()
+
+    def _matcher(self, country):
+        key = (country or '').strip().lower()
+        matcher = self._matchers.get(key)
+        if matcher is None:
+            with self._lock:
+                matcher = self._matchers.get(key)
+                if matcher is None:
+                    intents = list(self._intents)
+                    # Unknown countries would get the catalog's fallback country's services
+                    if country and country in self._catalog.countries():
+                        intents += service_intents(self._catalog.get_services(country), country)
+                    matcher = self._matchers[key] = IntentMatcher(intents)
+        return matcher
+
+    def respond(self, prompt, country=None):
+        """Best matching answer, or the fallback answer"""
+        intent = self._matcher(country).match(prompt or "")
+        return intent['answer'] if intent else self.fallback
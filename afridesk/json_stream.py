@@ -0,0 +1,92 @@
+import json
+import re
+
+
+class JsonArrayStreamParser:
+    """
+    Incrementally extract objects from a JSON array as text arrives.
+
+    Feed it chunks of an LLM response shaped like ``{"services": [{...}, ...]}``
+    (or a bare ``[{...}, ...]``, with or without markdown fences) and it
+    returns each object as soon as its closing brace has been received.
+    Objects that ``decode`` rejects are skipped.
+    """
+
+    def __init__(self, array_key="services", decode=json.loads):
+        self._decode = decode
+        self._key_re = re.compile(r'"%s"\s*:\s*\[' % re.escape(array_key))
+        self._buffer = ""
+        self._pos = None          # scan position inside the array, None while seeking it
+        self._depth = 0           # nesting depth relative to the array
+        self._in_string = False
+        self._escape = False
+        self._object_start = None
+        self.complete = False     # True once the array's closing bracket was seen
+
+    def _find_array(self):
+        match = self._key_re.search(self._buffer)
+        if match:
+            return match.end()
+        # A bare top-level array: the first structural character is '['
+        first = re.search(r'[\[{]', self._buffer)
+        if first and first.group() == '[':
+            return first.end()
+        return None
+
+    def feed(self, text):
+        """
+        Add a chunk of text
+
+        Returns:
+            list: Objects completed by this chunk, in order
+        """
+        if self.complete or not text:
+            return []
+        self._buffer += text
+
+        if self._pos is None:
+            start = self._find_array()
+            if start is None:
+                return []
+            self._pos = start
+
+        objects = []
+        buffer = self._buffer
+        pos = self._pos
+        while pos < len(buffer):
+            ch = buffer[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                if self._depth == 0 and ch == '{':
+                    self._object_start = pos
+                self._depth += 1
+            elif ch in '}]':
+                if self._depth == 0:
+                    # Closing bracket of the array itself
+                    self.complete = True
+                    pos += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0 and ch == '}' and self._object_start is not None:
+                    try:
+                        objects.append(self._decode(buffer[self._object_start:pos + 1]))
+                    except ValueError:
+                        pass
+                    self._object_start = None
+            pos += 1
+
+        # Drop text we no longer need so long responses stay cheap to scan
+        keep_from = self._object_start if self._object_start is not None else pos
+        self._buffer = buffer[keep_from:]
+        self._pos = pos - keep_from
+        if self._object_start is not None:
+            self._object_start = 0
+        return objects
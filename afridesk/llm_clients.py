@@ -0,0 +1,318 @@
+import asyncio
+import os
+import threading
+import time
+
+import google.generativeai as genai
+import httpx
+from google.ai.generativelanguage_v1beta.services.generative_service import GenerativeServiceClient
+from google.ai.generativelanguage_v1beta.services.generative_service.transports import GenerativeServiceGrpcTransport
+from google.api_core import gapic_v1
+from google.api_core.exceptions import RetryError
+from google.auth import api_key as api_key_credentials
+from google.generativeai import client as genai_client
+from openai import APIConnectionError, AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+from afridesk.cassettes import cassette_from_env
+
+# Requests in flight per (provider, API key) across every session in the process
+LLM_MAX_CONCURRENCY = int(os.getenv('AFRIDESK_LLM_MAX_CONCURRENCY', 8))
+
+GEMINI_HOST = "generativelanguage.googleapis.com"
+
+# Keep idle channels open and detect dead ones without waiting for a request
+GEMINI_CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+
+# Consecutive failures that open a key's circuit breaker (a 429 opens it at once)
+LLM_BREAKER_FAILURES = int(os.getenv('AFRIDESK_LLM_BREAKER_FAILURES', 5))
+
+# Seconds an open breaker fails fast before letting a probe through; doubles per failed probe
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv('AFRIDESK_LLM_BREAKER_COOLDOWN_SECONDS', 30))
+LLM_BREAKER_MAX_COOLDOWN_SECONDS = float(os.getenv('AFRIDESK_LLM_BREAKER_MAX_COOLDOWN_SECONDS', 300))
+
+# Pooled HTTP/1.1 connections kept warm for OpenAI
+OPENAI_CONNECTION_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+
+def is_rate_limit(error):
+    """Whether an error is a provider's 429 / quota exhaustion"""
+    status = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+    if status == 429:
+        return True
+    return type(error).__name__ in ('ResourceExhausted', 'RateLimitError', 'TooManyRequests')
+
+
+def is_provider_error(error):
+    """
+    Whether an error says the provider is failing, rather than our request or our own code
+
+    Rate limits, 5xx responses, timeouts and connection errors count; 4xx
+    request errors, blocked prompts and errors raised while we parse or
+    render a response do not.
+    """
+    if is_rate_limit(error):
+        return True
+    status = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+    if isinstance(status, int) and not isinstance(status, bool):
+        return status >= 500
+    return isinstance(error, (APIConnectionError, RetryError, httpx.TransportError, TimeoutError, ConnectionError))
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast while a provider key is failing.
+
+    Opens after ``failure_threshold`` consecutive failures, or at once on a
+    429, since quota errors will not clear on a retry. While open, calls raise
+    CircuitOpenError without touching the network, so callers go straight to
+    their local fallback. After the cooldown one probe call is let through
+    (half-open): success closes the breaker, failure reopens it with a doubled
+    cooldown, up to ``max_cooldown``. A probe that ends without a verdict
+    (see record_neutral), or is still running a cooldown later, lets the
+    next call probe instead.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=LLM_BREAKER_FAILURES,
+                 cooldown=LLM_BREAKER_COOLDOWN_SECONDS, max_cooldown=LLM_BREAKER_MAX_COOLDOWN_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.cooldown = cooldown
+        self.opened_at = None
+        self.last_error = None
+        self._probing = False
+        self._probe_started = None
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go to the provider now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and (
+                not self._probing or time.monotonic() - self._probe_started >= self.cooldown
+            ):
+                self._probing = True
+                self._probe_started = time.monotonic()
+                return
+            retry_in = max(0.0, self.opened_at + self.cooldown - time.monotonic())
+            raise CircuitOpenError(
+                f"{self.name} is unavailable (last error: {self.last_error}); retrying in {retry_in:.0f}s"
+            )
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+            self._probing = False
+
+    def record_neutral(self):
+        """End a call that says nothing about the provider, e.g. a stream its reader stopped early"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            if self.state == self.HALF_OPEN:
+                self._open(min(self.cooldown * 2, self.max_cooldown))
+            elif self.state == self.CLOSED and (self.failures >= self.failure_threshold or is_rate_limit(error)):
+                self._open(self.base_cooldown)
+
+    def _open(self, cooldown):
+        if self.state != self.OPEN:
+            print(f"Circuit breaker for {self.name} opened for {cooldown:.0f}s: {self.last_error}")
+        self.state = self.OPEN
+        self.cooldown = cooldown
+        self.opened_at = time.monotonic()
+        self._probing = False
+
+    def snapshot(self):
+        """State, consecutive failures and the last error, for status pages"""
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'cooldown': self.cooldown,
+                'last_error': str(self.last_error) if self.last_error else None,
+            }
+
+
+class ClientRegistry:
+    """
+    Process-wide LLM clients keyed by (provider, API key, model).
+
+    ``genai.configure`` is global, so sessions using different keys would race
+    on it; instead each key gets its own Gemini channel, bound to the models
+    built for it. OpenAI clients share a keep-alive connection pool per key.
+    Clients are built once and reused by every session, as are each key's
+    concurrency slot and circuit breaker.
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, cassette=None):
+        """
+        Args:
+            max_concurrency (int): Requests in flight per (provider, key)
+            cassette (Cassette, optional): Record or replay every call (see afridesk.cassettes)
+        """
+        self.max_concurrency = max_concurrency
+        self.cassette = cassette
+        # Re-entrant: building a model also builds its key's channel
+        self._lock = threading.RLock()
+        self._clients = {}
+        self._slots = {}
+
+    def _get_or_create(self, key, factory):
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._clients[key] = factory()
+        return client
+
+    def _gemini_channel(self, api_key):
+        return self._get_or_create(('gemini-channel', api_key), lambda: GenerativeServiceGrpcTransport.create_channel(
+            GEMINI_HOST,
+            credentials=api_key_credentials.Credentials(api_key),
+            options=GEMINI_CHANNEL_OPTIONS,
+        ))
+
+    def _client_info(self):
+        return gapic_v1.client_info.ClientInfo(user_agent=f"{genai_client.USER_AGENT}/{genai.__version__}")
+
+    def _gemini_service(self, api_key):
+        return self._get_or_create(('gemini-service', api_key), lambda: GenerativeServiceClient(
+            transport=GenerativeServiceGrpcTransport(channel=self._gemini_channel(api_key)),
+            client_info=self._client_info(),
+        ))
+
+    def gemini(self, api_key, model_name):
+        """
+        Shared GenerativeModel bound to the key's channel
+
+        Args:
+            api_key (str): Gemini API key
+            model_name (str): e.g. 'gemini-2.5-flash'
+        """
+        def build():
+            if self.cassette is not None and self.cassette.replaying:
+                return self.cassette.gemini(model_name)
+            model = genai.GenerativeModel(model_name)
+            # GenerativeModel only creates a client when it has none; give it the key's own.
+            # _client is private: requirements.txt pins google-generativeai and
+            # tests/test_llm_clients.py fails if the SDK stops using it.
+            model._client = self._gemini_service(api_key)
+            if self.cassette is not None:
+                return self.cassette.gemini(model_name, model)
+            return model
+        return self._get_or_create(('gemini', api_key, model_name), build)
+
+    def openai(self, api_key):
+        """Shared OpenAI client with a keep-alive connection pool"""
+        def build():
+            if self.cassette is not None and self.cassette.replaying:
+                return self.cassette.openai()
+            client = OpenAI(api_key=api_key, http_client=DefaultHttpxClient(limits=OPENAI_CONNECTION_LIMITS))
+            if self.cassette is not None:
+                return self.cassette.openai(client)
+            return client
+        return self._get_or_create(('openai', api_key, None), build)
+
+    def openai_async(self, api_key):
+        """
+        Shared AsyncOpenAI client with its own keep-alive pool, or None under a cassette
+
+        Only await it on ASYNC_RUNNER's loop (afridesk.async_runner): its
+        connections belong to the loop that opened them. Cassettes wrap the
+        synchronous client only, so callers fall back to it in a thread.
+        """
+        if self.cassette is not None:
+            return None
+        return self._get_or_create(
+            ('openai-async', api_key, None),
+            lambda: AsyncOpenAI(api_key=api_key, http_client=DefaultAsyncHttpxClient(limits=OPENAI_CONNECTION_LIMITS))
+        )
+
+    def slot(self, provider, api_key):
+        """
+        Concurrency slot and circuit breaker for one key
+
+        Use as ``with LLM_CLIENTS.slot('gemini', api_key): ...`` around a call,
+        including the iteration of a streamed response, or ``async with`` in a
+        coroutine; both share the key's slots. Entering raises
+        CircuitOpenError at once while the key's breaker is open.
+        """
+        key = (provider, api_key)
+        slot = self._slots.get(key)
+        if slot is None:
+            with self._lock:
+                slot = self._slots.get(key)
+                if slot is None:
+                    slot = self._slots[key] = _Slot(
+                        threading.BoundedSemaphore(self.max_concurrency), CircuitBreaker(provider)
+                    )
+        return slot
+
+    def breaker(self, provider, api_key):
+        """The circuit breaker guarding one key"""
+        return self.slot(provider, api_key).breaker
+
+
+class _Slot:
+    """Context manager pairing a key's semaphore with its breaker"""
+
+    def __init__(self, semaphore, breaker):
+        self.semaphore = semaphore
+        self.breaker = breaker
+
+    def __enter__(self):
+        self.breaker.before_call()
+        self.semaphore.acquire()
+        return self
+
+    async def __aenter__(self):
+        self.breaker.before_call()
+        # Never block the shared event loop on a busy key; wait for a free slot cooperatively
+        while not self.semaphore.acquire(blocking=False):
+            await asyncio.sleep(0.05)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+    def __exit__(self, exc_type, exc, tb):
+        self.semaphore.release()
+        if exc_type is None:
+            self.breaker.record_success()
+        elif issubclass(exc_type, Exception) and is_provider_error(exc):
+            self.breaker.record_failure(exc)
+        else:
+            # Our own parsing/rendering errors, cancellations and streams closed
+            # early by their reader (GeneratorExit) say nothing about the provider
+            self.breaker.record_neutral()
+        return False
+
+
+# Shared by every LLM call site in the process; AFRIDESK_LLM_CASSETTE records or replays its calls
+LLM_CLIENTS = ClientRegistry(cassette=cassette_from_env())
@@ -0,0 +1,219 @@
+import json
+import re
+
+from afridesk.events import EVENT_SINK
+from afridesk.json_stream import JsonArrayStreamParser
+
+# JSON schema sent to Gemini's structured-output mode for personalized services
+SERVICES_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "services": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "description": {"type": "string"},
+                    "required_documents": {"type": "array", "items": {"type": "string"}},
+                    "processing_time": {"type": "string"},
+                    "fees": {"type": "string"},
+                    "category": {"type": "string"},
+                    "why_relevant": {"type": "string"},
+                },
+                "required": ["name", "description", "required_documents", "processing_time", "fees"],
+            },
+        },
+    },
+    "required": ["services"],
+}
+
+# Text fields we keep from a service object; anything else is dropped
+SERVICE_TEXT_FIELDS = (
+    'name', 'description', 'processing_time', 'fees', 'category', 'why_relevant',
+    'eligibility', 'website', 'application_process', 'additional_notes',
+)
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL | re.IGNORECASE)
+_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+
+
+class ServicesParseError(ValueError):
+    """Raised when no service could be recovered from an LLM response"""
+
+    def __init__(self, message, text):
+        super().__init__(message)
+        self.text = text
+
+
+def _record(outcome, count=1):
+    """Log a parse outcome: parsed, repaired, salvaged, failed or dropped_services"""
+    EVENT_SINK.emit('services_parse', outcome=outcome, count=count)
+
+
+def strip_code_fences(text):
+    """Return the body of the first markdown code block, or the text itself"""
+    text = (text or "").strip()
+    match = _FENCE_RE.search(text)
+    return match.group(1).strip() if match else text
+
+
+def repair_json(text):
+    """
+    Fix common LLM JSON defects outside of string literals
+
+    Drops prose around the JSON value, removes trailing commas and // comments,
+    inserts missing commas between adjacent objects and converts Python
+    literals (True/False/None).
+    """
+    start = min((pos for pos in (text.find('{'), text.find('[')) if pos != -1), default=0)
+    end = max(text.rfind('}'), text.rfind(']'))
+    text = text[start:end + 1] if end > start else text[start:]
+
+    out = []
+    in_string = False
+    escape = False
+    i = 0
+    length = len(text)
+    while i < length:
+        ch = text[i]
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+            i += 1
+            continue
+
+        if ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch == '/' and text.startswith('//', i):
+            newline = text.find('\n', i)
+            i = length if newline == -1 else newline
+            continue
+        elif ch == ',':
+            j = i + 1
+            while j < length and text[j].isspace():
+                j += 1
+            if j < length and text[j] in '}]':
+                i += 1
+                continue
+            out.append(ch)
+        elif ch in '}]':
+            out.append(ch)
+            j = i + 1
+            while j < length and text[j].isspace():
+                j += 1
+            if j < length and text[j] in '{[':
+                out.append(',')
+        else:
+            for literal, replacement in _LITERALS.items():
+                if (text.startswith(literal, i) and not text[i - 1:i].isalnum()
+                        and not text[i + len(literal):i + len(literal) + 1].isalnum()):
+                    out.append(replacement)
+                    i += len(literal)
+                    break
+            else:
+                out.append(ch)
+                i += 1
+            continue
+        i += 1
+    return "".join(out)
+
+
+def loads_lenient(text):
+    """json.loads, retrying once on the repaired text"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(repair_json(text))
+
+
+def validate_service(service):
+    """
+    Coerce a service object to the expected schema
+
+    Returns:
+        dict: The cleaned service, or None if it has no usable name
+    """
+    if not isinstance(service, dict):
+        return None
+
+    cleaned = {}
+    for field in SERVICE_TEXT_FIELDS:
+        value = service.get(field)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        elif isinstance(value, list):
+            value = ", ".join(str(v) for v in value if v not in (None, ""))
+        if isinstance(value, str) and value.strip():
+            cleaned[field] = value.strip()
+
+    documents = service.get('required_documents', [])
+    if isinstance(documents, str):
+        documents = re.split(r"[;,\n]", documents)
+    if not isinstance(documents, list):
+        documents = []
+    cleaned['required_documents'] = [
+        str(doc).strip() for doc in documents if isinstance(doc, (str, int, float)) and str(doc).strip()
+    ]
+
+    if 'name' not in cleaned:
+        return None
+    return cleaned
+
+
+def _validated(services):
+    valid = [s for s in (validate_service(service) for service in services) if s is not None]
+    if len(valid) < len(services):
+        _record('dropped_services', len(services) - len(valid))
+    return valid
+
+
+def _services_from_document(document):
+    if isinstance(document, dict):
+        services = document.get('services')
+    else:
+        services = document
+    return services if isinstance(services, list) else None
+
+
+def parse_services_response(text):
+    """
+    Parse an LLM services response, recovering as much as possible
+
+    Tries strict JSON first, then a repaired copy, then salvages every
+    complete service object from a truncated response.
+
+    Returns:
+        dict: {"services": [...]} with schema-validated services
+
+    Raises:
+        ServicesParseError: If no valid service could be recovered
+    """
+    body = strip_code_fences(text)
+
+    attempts = (('parsed', lambda: json.loads(body)), ('repaired', lambda: json.loads(repair_json(body))))
+    for outcome, parse in attempts:
+        try:
+            services = _services_from_document(parse())
+        except json.JSONDecodeError:
+            continue
+        if services is not None:
+            valid = _validated(services)
+            if valid:
+                _record(outcome)
+                return {"services": valid}
+
+    parser = JsonArrayStreamParser("services", decode=loads_lenient)
+    valid = _validated(parser.feed(body))
+    if valid:
+        _record('salvaged')
+        return {"services": valid}
+
+    _record('failed')
+    raise ServicesParseError("No valid services found in the response", text)
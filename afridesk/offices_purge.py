@@ -0,0 +1,36 @@
+"""
+Drop cached government office lookups after a city's offices change.
+
+A location drops every cached lookup whose location contains its words, for
+every office type: "Nairobi" also drops "Nairobi, Kenya" and "Westlands, Nairobi".
+
+Usage:
+    python -m afridesk.offices_purge Nairobi
+    python -m afridesk.offices_purge "Cape Town" Durban
+    python -m afridesk.offices_purge --all
+"""
+import argparse
+import sys
+
+from afridesk.assistant import purge_government_offices
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drop cached government office lookups")
+    parser.add_argument('locations', nargs='*', help="Cities or regions to drop")
+    parser.add_argument('--all', action='store_true', help="Drop every cached office lookup")
+    args = parser.parse_args(argv)
+
+    if args.all == bool(args.locations):
+        parser.error("give one or more locations, or --all")
+
+    if args.all:
+        print(f"Dropped {purge_government_offices()} cached office lookups")
+        return 0
+    for location in args.locations:
+        print(f"{location}: dropped {purge_government_offices(location)} cached office lookups")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 import streamlit as st
 from streamlit_extras.stylable_container import stylable_container
+from afridesk.profile_options import ONBOARDING_SERVICES
 
 def onboarding_questionnaire():
     st.set_page_config(
@@ -99,8 +100,7 @@ def onboarding_questionnaire():
             st.markdown("### Service Preferences")
             st.session_state['user_data']['services_needed'] = st.multiselect(
                 "What services are you interested in? (Select all that apply)",
-                ["Passport/Visa", "National ID", "Business Registration", 
-                 "Tax Services", "Health Services", "Education Services"]
+                ONBOARDING_SERVICES
             )
             st.session_state['user_data']['language'] = st.selectbox(
                 "Preferred Language",
@@ -0,0 +1,11 @@
+import os
+
+# Writable directory for caches and derived indexes
+CACHE_DIR = os.getenv('AFRIDESK_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'afridesk'))
+
+# Bundled data shipped with the package
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Per-country YAML/CSV sources and the compiled catalog artifact
+CATALOG_SOURCES_DIR = os.path.join(DATA_DIR, 'services')
+CATALOG_PATH = os.getenv('AFRIDESK_CATALOG_PATH', os.path.join(DATA_DIR, 'services.db'))
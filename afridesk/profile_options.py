@@ -0,0 +1,15 @@
+# Countries offered in the profile form, also the set the cache warmer covers
+COUNTRIES = [
+    "Algeria", "Angola", "Benin", "Botswana", "Burkina Faso", "Burundi", "Cabo Verde", "Cameroon", "Central African Republic",
+    "Chad", "Comoros", "Congo (Congo-Brazzaville)", "Côte d'Ivoire", "Democratic Republic of the Congo", "Djibouti",
+    "Egypt", "Equatorial Guinea", "Eritrea", "Eswatini (fmr. Swaziland)", "Ethiopia", "Gabon", "Gambia", "Ghana", "Guinea",
+    "Guinea-Bissau", "Kenya", "Lesotho", "Liberia", "Libya", "Madagascar", "Malawi", "Mali", "Mauritania", "Mauritius",
+    "Morocco", "Mozambique", "Namibia", "Niger", "Nigeria", "Rwanda", "Sao Tome and Principe", "Senegal", "Seychelles",
+    "Sierra Leone", "Somalia", "South Africa", "South Sudan", "Sudan", "Tanzania", "Togo", "Tunisia", "Uganda", "Zambia", "Zimbabwe"
+]
+
+# Options of the onboarding "services needed" multiselect
+ONBOARDING_SERVICES = [
+    "Passport/Visa", "National ID", "Business Registration",
+    "Tax Services", "Health Services", "Education Services"
+]
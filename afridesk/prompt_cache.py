@@ -0,0 +1,49 @@
+import functools
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+# Rendered prompts kept per function; one per distinct profile (and date)
+PROMPT_CACHE_ENTRIES = 1024
+
+
+def prompt_key(profile, *args):
+    """Stable hash of a profile (as sorted-key JSON) and any extra prompt inputs"""
+    payload = json.dumps([profile, *args], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def memoize_by_profile(render, max_entries=PROMPT_CACHE_ENTRIES):
+    """
+    Memoize a prompt builder ``render(profile, *args)`` by a hash of the canonical profile
+
+    The profile is hashed as sorted-key JSON, so equal profiles share one
+    rendered prompt whatever their key order, and a prompt is rendered once
+    per profile: the same user gets a byte-identical prefix on every turn,
+    which is what provider-side prompt caches key on. Results are kept in a
+    small LRU shared by every session.
+    """
+    cache = OrderedDict()
+    lock = threading.Lock()
+
+    @functools.wraps(render)
+    def wrapper(profile, *args):
+        key = prompt_key(profile, *args)
+        with lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        value = render(profile, *args)
+        with lock:
+            cache[key] = value
+            while len(cache) > max_entries:
+                cache.popitem(last=False)
+        return value
+
+    def cache_clear():
+        with lock:
+            cache.clear()
+
+    wrapper.cache_clear = cache_clear
+    return wrapper
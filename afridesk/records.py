@@ -0,0 +1,153 @@
+import hashlib
+import json
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+from collections.abc import Mapping
+
+# Fields a service may carry, in storage order
+SERVICE_FIELDS = (
+    'name', 'description', 'required_documents', 'processing_time', 'fees', 'category',
+    'why_relevant', 'eligibility', 'website', 'application_process', 'additional_notes',
+)
+
+# Short values repeated across thousands of services; interned so they share one object
+_INTERNED_FIELDS = {'processing_time', 'fees', 'category'}
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Service(Mapping):
+    """
+    Immutable, compact service record.
+
+    Values live in a tuple aligned with SERVICE_FIELDS; categories, fees,
+    processing times and document names are interned. It reads like the old
+    service dicts (``service.get('fees')``, ``'category' in service``,
+    ``service['name']``), so rendering code works with either.
+    """
+
+    __slots__ = ('id', '_values', '__weakref__')
+
+    def __init__(self, data):
+        values = []
+        for field in SERVICE_FIELDS:
+            value = data.get(field)
+            if field == 'required_documents':
+                value = tuple(_intern(str(doc)) for doc in (value or ()))
+            elif field in _INTERNED_FIELDS:
+                value = _intern(value)
+            values.append(value)
+        object.__setattr__(self, '_values', tuple(values))
+        object.__setattr__(self, 'id', service_id(data))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Service records are immutable")
+
+    def __getitem__(self, field):
+        try:
+            value = self._values[_FIELD_INDEX[field]]
+        except KeyError:
+            raise KeyError(field) from None
+        if value is None:
+            raise KeyError(field)
+        return value
+
+    def __iter__(self):
+        return (field for field, value in zip(SERVICE_FIELDS, self._values) if value is not None)
+
+    def __len__(self):
+        return sum(1 for value in self._values if value is not None)
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"Service({self.id}, {self.get('name')!r})"
+
+    def to_dict(self):
+        """Plain dict copy, e.g. for JSON serialization"""
+        data = dict(self.items())
+        if 'required_documents' in data:
+            data['required_documents'] = list(data['required_documents'])
+        return data
+
+
+_FIELD_INDEX = {field: idx for idx, field in enumerate(SERVICE_FIELDS)}
+
+
+def service_id(data):
+    """Stable content-derived id, so identical services share one record"""
+    payload = json.dumps(
+        [data.get(field) if field != 'required_documents' else list(data.get(field) or ())
+         for field in SERVICE_FIELDS],
+        ensure_ascii=False, separators=(',', ':'),
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class ServiceStore:
+    """
+    Process-wide, read-only store of Service records keyed by id.
+
+    Sessions hold references to the shared records and resolve ids here.
+    Catalog records are pinned. Records from LLM responses stay resolvable for
+    as long as anything references them: a weak index covers every live one,
+    and a bounded LRU keeps the most recent ones alive for reuse across sessions
+    after their sessions end.
+    """
+
+    def __init__(self, max_generated=20000):
+        self.max_generated = max_generated
+        self._pinned = {}
+        self._generated = OrderedDict()
+        self._live = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def add(self, data, pinned=False):
+        """
+        Register a service and return its record
+
+        Args:
+            data (Mapping): Service fields; an existing Service is stored as is
+            pinned (bool): Never evict (used for catalog services)
+        """
+        record = data if isinstance(data, Service) else Service(data)
+        with self._lock:
+            existing = self._pinned.get(record.id)
+            if existing is not None:
+                return existing
+            existing = self._live.get(record.id)
+            if existing is not None and not pinned:
+                record = existing
+            if pinned:
+                self._pinned[record.id] = record
+                self._generated.pop(record.id, None)
+            else:
+                # Evicted records are only dropped once no session holds them
+                self._live[record.id] = record
+                self._generated[record.id] = record
+                self._generated.move_to_end(record.id)
+                while len(self._generated) > self.max_generated:
+                    self._generated.popitem(last=False)
+        return record
+
+    def add_many(self, services, pinned=False):
+        """Register services and return their ids in order"""
+        return [self.add(service, pinned).id for service in services]
+
+    def get(self, record_id):
+        """Look up a record, or None if it is unknown or no longer referenced"""
+        return self._pinned.get(record_id) or self._live.get(record_id)
+
+    def get_many(self, record_ids):
+        """Resolve ids to records, skipping any that are no longer referenced"""
+        records = (self.get(record_id) for record_id in record_ids)
+        return [record for record in records if record is not None]
+
+
+# Shared by every session in the process
+SERVICE_STORE = ServiceStore()
@@ -1,14 +1,38 @@
+import os
+import time
 import streamlit as st
-import google.generativeai as genai
 import json
 from datetime import datetime
+from afridesk.catalog_answers import CATALOG_ANSWERS
+from afridesk.chat_history import ChatMemory
+from afridesk.events import EVENT_SINK, session_id
+from afridesk.hedging import (
+    HEDGE_CHAT, HEDGE_OPENAI_MODEL, gemini_text_stream, gemini_to_openai, hedged_stream, openai_text_stream
+)
+from afridesk.intents import LocalResponder
+from afridesk.llm_clients import LLM_CLIENTS
+from afridesk.prompt_cache import memoize_by_profile
+from afridesk.catalog_store import SERVICE_CATALOG
+
+CHAT_MODEL = 'gemini-1.5-pro-latest'
+
+# Offline answers for outages, quota errors and missing keys
+LOCAL_RESPONDER = LocalResponder(SERVICE_CATALOG)
+
+# Render chat replies token by token instead of waiting for the full reply
+STREAM_CHAT = os.getenv('AFRIDESK_STREAM_CHAT', '1') == '1'
+
+NO_PROFILE_CONTEXT = "No user profile data available. Please complete the onboarding process first."
 
 def get_user_context():
     """Get the user's profile data from session state"""
     if 'user_data' not in st.session_state:
-        return "No user profile data available. Please complete the onboarding process first."
-    
-    user_data = st.session_state.user_data
+        return NO_PROFILE_CONTEXT
+    return render_user_context(st.session_state.user_data)
+
+@memoize_by_profile
+def render_user_context(user_data):
+    """Profile section of the system prompt, rendered once per distinct profile"""
     context = """User Profile Information:
     - Country: {country}
     - Age: {age}
@@ -32,7 +56,17 @@ def get_user_context():
 
 def get_system_prompt():
     """Generate a system prompt with user context"""
-    user_context = get_user_context()
+    return render_system_prompt(st.session_state.get('user_data'), datetime.now().strftime('%Y-%m-%d'))
+
+@memoize_by_profile
+def render_system_prompt(user_data, current_date):
+    """
+    System prompt for a profile and date
+    
+    Memoized, so every turn of a session (and every session with the same
+    profile) sends a byte-identical prefix.
+    """
+    user_context = render_user_context(user_data) if user_data is not None else NO_PROFILE_CONTEXT
     
     return f"""
     You are AfriDesk, an AI assistant that helps citizens navigate government services in Africa. 
@@ -57,7 +91,7 @@ def get_system_prompt():
     7. Be patient and understanding of the user's situation
     8. If the user needs to visit an office, provide the nearest location if possible
     
-    Current Date: {datetime.now().strftime('%Y-%m-%d')}
+    Current Date: {current_date}
     """
 
 # Common government services knowledge base
@@ -97,60 +131,98 @@ GOV_SERVICES_KNOWLEDGE = {
     }
 }
 
+# Sampling settings for chat replies
+CHAT_GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 2048,
+}
+
+CHAT_SAFETY_SETTINGS = [
+    {
+        "category": "HARM_CATEGORY_HARASSMENT",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+    {
+        "category": "HARM_CATEGORY_HATE_SPEECH",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+    {
+        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+    {
+        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+        "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+    },
+]
+
+def get_chat_history():
+    """The session's Gemini chat history, started with the system prompt"""
+    # Create chat history if it doesn't exist
+    if 'chat_history' not in st.session_state:
+        st.session_state.chat_history = []
+    
+    # Add system prompt to the chat history if it's the first message
+    if not st.session_state.chat_history:
+        system_prompt = get_system_prompt()
+        st.session_state.chat_history.append({"role": "user", "parts": [system_prompt]})
+        st.session_state.chat_history.append({"role": "model", "parts": ["I understand your profile and am ready to help you with government services. How can I assist you today?"]})
+    return st.session_state.chat_history
+
+def get_catalog_answer(prompt):
+    """
+    Answer documents, fees and processing time questions from the service catalog
+    
+    A hit is added to the chat history as if Gemini had answered it.
+    """
+    country = st.session_state.get('user_data', {}).get('country')
+    answer = CATALOG_ANSWERS.answer(prompt, country)
+    if answer is None:
+        return None
+    history = get_chat_history()
+    history.append({"role": "user", "parts": [prompt]})
+    history.append({"role": "model", "parts": [answer]})
+    return answer
+
+def prepare_chat_contents(prompt, api_key):
+    """
+    Add the prompt to the Gemini chat history and return what to send
+    
+    Returns:
+        list: Token-budgeted contents: system prompt, summary, recalled and recent turns
+    """
+    # Add user message to chat history
+    get_chat_history().append({"role": "user", "parts": [prompt]})
+    
+    if 'chat_memory' not in st.session_state:
+        st.session_state.chat_memory = ChatMemory()
+    return st.session_state.chat_memory.build(st.session_state.chat_history, api_key)
+
 def get_ai_response(prompt, api_key):
     """Get response from Gemini API with local fallback"""
+    # Catalog lookups are answered without any model, even offline
+    grounded = get_catalog_answer(prompt)
+    if grounded is not None:
+        return grounded
+    
     # Check if we should use local responses (if API key is invalid or quota exceeded)
     if not api_key or api_key == 'your_gemini_api_key_here':
         return get_local_response(prompt)
     
     try:
-        # Configure the Gemini API
-        genai.configure(api_key=api_key)
-        
-        # Initialize the model with the latest version
-        model = genai.GenerativeModel('gemini-1.5-pro-latest')
-        
-        # Create chat history if it doesn't exist
-        if 'chat_history' not in st.session_state:
-            st.session_state.chat_history = []
-        
-        # Add system prompt to the chat history if it's the first message
-        if not st.session_state.chat_history:
-            system_prompt = get_system_prompt()
-            st.session_state.chat_history.append({"role": "user", "parts": [system_prompt]})
-            st.session_state.chat_history.append({"role": "model", "parts": ["I understand your profile and am ready to help you with government services. How can I assist you today?"]})
-        
-        # Add user message to chat history
-        st.session_state.chat_history.append({"role": "user", "parts": [prompt]})
+        # Shared model and channel for this key
+        model = LLM_CLIENTS.gemini(api_key, CHAT_MODEL)
+        contents = prepare_chat_contents(prompt, api_key)
         
         # Generate response with safety settings
-        response = model.generate_content(
-            st.session_state.chat_history,
-            generation_config={
-                "temperature": 0.7,
-                "top_p": 0.95,
-                "top_k": 40,
-                "max_output_tokens": 2048,
-            },
-            safety_settings=[
-                {
-                    "category": "HARM_CATEGORY_HARASSMENT",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-                {
-                    "category": "HARM_CATEGORY_HATE_SPEECH",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-                {
-                    "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-                {
-                    "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-            ]
-        )
+        with LLM_CLIENTS.slot('gemini', api_key):
+            response = model.generate_content(
+                contents,
+                generation_config=CHAT_GENERATION_CONFIG,
+                safety_settings=CHAT_SAFETY_SETTINGS
+            )
         
         # Get the response text safely
         try:
@@ -168,6 +240,61 @@ def get_ai_response(prompt, api_key):
         # If we hit a quota error or other API error, fall back to local responses
         return get_local_response(prompt)
 
+def stream_ai_response(prompt, api_key):
+    """
+    Yield the Gemini reply in chunks as it is generated, with local fallback
+    
+    The assembled reply is added to the chat history once the stream ends.
+    Errors before the first chunk fall back to the local response.
+    """
+    grounded = get_catalog_answer(prompt)
+    if grounded is not None:
+        yield grounded
+        return
+    
+    if not api_key or api_key == 'your_gemini_api_key_here':
+        yield get_local_response(prompt)
+        return
+    
+    parts = []
+    try:
+        model = LLM_CLIENTS.gemini(api_key, CHAT_MODEL)
+        contents = prepare_chat_contents(prompt, api_key)
+        
+        def gemini_reply():
+            return gemini_text_stream(
+                api_key, model, contents,
+                generation_config=CHAT_GENERATION_CONFIG,
+                safety_settings=CHAT_SAFETY_SETTINGS
+            )
+        
+        openai_key = os.getenv('OPENAI_API_KEY')
+        if HEDGE_CHAT and openai_key:
+            # OpenAI answers instead when Gemini is slow to start
+            chunks = hedged_stream(
+                ('gemini', gemini_reply),
+                ('openai', lambda: openai_text_stream(
+                    openai_key, LLM_CLIENTS.openai(openai_key), HEDGE_OPENAI_MODEL, gemini_to_openai(contents)
+                )),
+                interface='ask_afridesk',
+            )
+        else:
+            chunks = gemini_reply()
+        
+        for text in chunks:
+            parts.append(text)
+            yield text
+    except Exception as e:
+        print(f"Streaming chat failed: {e}")
+        if not parts:
+            yield get_local_response(prompt)
+            return
+    
+    if parts:
+        st.session_state.chat_history.append({"role": "model", "parts": ["".join(parts)]})
+    else:
+        yield get_local_response(prompt)
+
 def display_response(api_key=None):
     """Main function to handle the chat interface"""
     # Add custom CSS for chat interface
@@ -260,9 +387,15 @@ def display_response(api_key=None):
             st.markdown(prompt)
         
         # Display assistant response in chat message container
+        started = time.monotonic()
         with st.chat_message("assistant"):
-            response = get_ai_response(prompt, api_key)
-            st.markdown(response)
+            if STREAM_CHAT:
+                # Render tokens as they arrive; returns the assembled reply
+                response = st.write_stream(stream_ai_response(prompt, api_key))
+            else:
+                response = get_ai_response(prompt, api_key)
+                st.markdown(response)
+        log_chat_event('ask_afridesk', prompt, response, started)
         
         # Add assistant response to chat history
         st.session_state.messages.append({"role": "assistant", "content": response})
@@ -270,6 +403,8 @@ def display_response(api_key=None):
     # Add a clear chat button with custom styling
     st.markdown("<div style='margin: 1rem 0;'></div>", unsafe_allow_html=True)  # Add some space
     if st.button("🗑️ Clear Chat"):
+        for key in ('chat_history', 'chat_memory'):
+            st.session_state.pop(key, None)
         st.session_state.messages = [
             {"role": "assistant", "content": "Hello! I'm AfriDesk, your government services assistant. How can I help you with government services today?"}
         ]
@@ -287,11 +422,14 @@ def display_response(api_key=None):
         with col1:
             if st.button("👍 Yes", key="feedback_yes"):
                 st.session_state.feedback_submitted = True
+                save_feedback(st.session_state.user_data, rating='up')
                 st.success("Thank you for your feedback!")
         
         with col2:
-            if st.button("👎 No", key="feedback_no"):
+            if st.button("👎 No", key="feedback_no") and not st.session_state.get('show_feedback_form'):
                 st.session_state.show_feedback_form = True
+                # The vote counts even if the user never submits a comment
+                save_feedback(st.session_state.user_data, rating='down')
                 
         if st.session_state.get('show_feedback_form', False):
             feedback = st.text_area("We're sorry to hear that. Could you tell us how we can improve? (optional)", 
@@ -299,98 +437,52 @@ def display_response(api_key=None):
             if st.button("Submit Feedback", key="submit_feedback"):
                 st.session_state.feedback_submitted = True
                 if feedback:
-                    # Here you would typically log the feedback
-                    print(f"User feedback: {feedback}")
-                    # In a real app, you would save this to a database
+                    save_feedback(st.session_state.user_data, feedback, kind='feedback_comment')
                 st.success("Thank you for helping us improve our service!")
-            # Save feedback if provided
-            if 'user_data' in st.session_state and feedback:
-                save_feedback(st.session_state.user_data, feedback)
 
-def get_local_response(prompt):
-    """Generate a response using local knowledge base"""
-    # Convert prompt to lowercase for case-insensitive matching
-    prompt_lower = prompt.lower()
-    
-    # Check for common government service queries
-    if any(term in prompt_lower for term in ['passport', 'id', 'identification']):
-        return """I can help with passport and ID services. Here's what you need to know:
-        
-        - **Passport Application**: 
-          - Required documents: Birth certificate, Proof of citizenship, Passport photos, Completed application form
-          - Processing time: 2-6 weeks
-          - Fees: Varies by country
-          
-        - **National ID Card**:
-          - Required documents: Birth certificate, Proof of residence, Passport photo
-          - Processing time: 2-4 weeks
-          - Fees: Usually free for first-time applicants
-          
-        Would you like more specific information about any of these services?"""
-    
-    elif any(term in prompt_lower for term in ['health', 'hospital', 'clinic', 'nhis']):
-        return """I can provide information about health services:
-        
-        - **Clinic Registration**:
-          - Required documents: ID document, Proof of residence
-          - Processing time: Same day
-          - Fees: Free for citizens
-          
-        - **Health Insurance (NHIS)**:
-          - Required documents: ID document, Proof of residence, Passport photo
-          - Processing time: 1-2 weeks
-          - Fees: From GHS 30 annually (Ghana example)
-          
-        - **Chronic Medication**:
-          - Required documents: ID document, Prescription
-          - Processing time: Same day
-          - Fees: Covered by insurance or free for citizens"""
-    
-    elif any(term in prompt_lower for term in ['education', 'school', 'university', 'student']):
-        return """Here's information about education services:
-        
-        - **School Registration**:
-          - Required documents: Birth certificate, Previous school reports, Passport photos
-          - Processing time: 1-2 weeks
-          
-        - **University Applications**:
-          - Required documents: High school certificate, ID document, Application form
-          - Processing time: 4-8 weeks
-          - Fees: Varies by institution
-          
-        - **Scholarships/Bursaries**:
-          - Required documents: Academic records, ID document, Proof of income
-          - Processing time: 2-3 months"""
-    
-    elif any(term in prompt_lower for term in ['business', 'company', 'register business', 'tax']):
-        return """Here's information about business registration and tax services:
-        
-        - **Business Registration**:
-          - Required documents: ID copies, Proof of address, Company name reservation
-          - Processing time: 1-2 weeks
-          - Fees: Varies by country and business type
-          
-        - **Tax Registration**:
-          - Required documents: ID document, Business registration documents
-          - Processing time: 2-3 weeks
-          - Fees: Usually free
-          
-        - **Tax Filing**:
-          - Required documents: Financial records, Previous tax returns
-          - Processing time: 1-2 weeks
-          - Fees: Free for e-filing"""
+def get_local_response(prompt, country=None):
+    """
+    Generate a response using local knowledge base
     
-    # Default response if no specific match found
-    return """I'm currently operating with limited functionality. Here are some topics I can help with:
+    The prompt is matched in one pass against the intent table
+    (afridesk/data/intents.yaml) and the user's country's catalog services.
+    """
+    if country is None:
+        country = st.session_state.get('user_data', {}).get('country')
+    return LOCAL_RESPONDER.respond(prompt, country)
+
+def save_feedback(user_data, feedback=None, rating=None, kind='feedback'):
+    """
+    Save user feedback
     
-    - Passport and ID services
-    - Health services and insurance
-    - Education and student services
-    - Business registration and tax services
+    Queued for the background event writer, so the rerun never waits on disk.
     
-    Please ask about any of these topics, and I'll provide the information I have available."""
+    Args:
+        user_data (dict): The user's profile
+        feedback (str, optional): Free-text comment
+        rating (str, optional): 'up' or 'down'
+        kind (str): 'feedback' for a vote, 'feedback_comment' for the comment after a 👎
+    """
+    messages = st.session_state.get('messages', [])
+    last_reply = next((m['content'] for m in reversed(messages) if m.get('role') == 'assistant'), None)
+    EVENT_SINK.emit(
+        kind,
+        session=session_id(st.session_state),
+        rating=rating,
+        comment=feedback or None,
+        country=(user_data or {}).get('country'),
+        reply=last_reply,
+    )
 
-def save_feedback(user_data, feedback):
-    """Save user feedback"""
-    # This would typically save to a database
-    pass
+def log_chat_event(interface, prompt, response, started):
+    """Record a chat turn's size and latency (not its text) for usage reports"""
+    EVENT_SINK.emit(
+        'chat',
+        session=session_id(st.session_state),
+        interface=interface,
+        country=st.session_state.get('user_data', {}).get('country'),
+        prompt_chars=len(prompt or ""),
+        response_chars=len(response or ""),
+        latency_ms=round((time.monotonic() - started) * 1000),
+        streamed=STREAM_CHAT,
+    )
@@ -0,0 +1,345 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from afridesk.paths import CACHE_DIR
+from afridesk.singleflight import SingleFlight
+
+RESULT_CACHE_PATH = os.getenv('AFRIDESK_RESULT_CACHE_PATH', os.path.join(CACHE_DIR, 'results.sqlite'))
+
+# Seconds between LRU timestamp updates for an entry, so reads rarely write
+ACCESS_TOUCH_SECONDS = float(os.getenv('AFRIDESK_RESULT_CACHE_TOUCH_SECONDS', 300))
+
+# Background refreshes are rare and I/O bound; a couple of workers is plenty
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="afridesk-cache-refresh")
+
+# Concurrent misses for the same namespace and key run compute once
+_misses = SingleFlight()
+
+
+def cache_key(*parts):
+    """Build a stable cache key from JSON-serializable parts"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _DiskStore:
+    """SQLite table shared by every ResultCache namespace in the process"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL, tag TEXT, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_lru ON results (namespace, accessed_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_tag ON results (namespace, tag)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, namespace, key):
+        """Return (JSON text, created_at), or None"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, created_at, accessed_at FROM results WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            now = time.time()
+            if row is not None and now - row[2] >= ACCESS_TOUCH_SECONDS:
+                conn.execute(
+                    "UPDATE results SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    (now, namespace, key),
+                )
+                conn.commit()
+        if row is None:
+            return None
+        return row[0], row[1]
+
+    def set(self, namespace, key, text, created_at, tag, max_entries):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, text, created_at, created_at, tag),
+            )
+            # Evict least recently used entries beyond the namespace's budget
+            conn.execute(
+                "DELETE FROM results WHERE namespace = ? AND key IN ("
+                "SELECT key FROM results WHERE namespace = ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (namespace, namespace, max_entries),
+            )
+            conn.commit()
+
+    def touch(self, namespace, keys, accessed_at):
+        """Record reads served from memory, so LRU eviction sees them"""
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "UPDATE results SET accessed_at = ? WHERE namespace = ? AND key = ? AND accessed_at < ?",
+                [(accessed_at, namespace, key, accessed_at) for key in keys],
+            )
+            conn.commit()
+
+    def scan(self, namespace, created_since, tag=None):
+        query = "SELECT key, value FROM results WHERE namespace = ? AND created_at >= ?"
+        params = [namespace, created_since]
+        if tag is not None:
+            query += " AND tag = ?"
+            params.append(tag)
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(query + " ORDER BY accessed_at DESC", params).fetchall()
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+    def delete(self, namespace, key=None, tag=None, tag_words=None):
+        """Delete matching entries; returns how many were deleted"""
+        with self._lock:
+            conn = self._connect()
+            if key is not None:
+                cursor = conn.execute("DELETE FROM results WHERE namespace = ? AND key = ?", (namespace, key))
+            elif tag is not None:
+                cursor = conn.execute("DELETE FROM results WHERE namespace = ? AND tag = ?", (namespace, tag))
+            elif tag_words is not None:
+                pattern = tag_words.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                cursor = conn.execute(
+                    "DELETE FROM results WHERE namespace = ? AND (' ' || tag || ' ') LIKE ? ESCAPE '\\'",
+                    (namespace, f"% {pattern} %"),
+                )
+            else:
+                cursor = conn.execute("DELETE FROM results WHERE namespace = ?", (namespace,))
+            conn.commit()
+            return cursor.rowcount
+
+
+_disk_stores = {}
+_disk_stores_lock = threading.Lock()
+
+
+def _disk_store(path):
+    with _disk_stores_lock:
+        store = _disk_stores.get(path)
+        if store is None:
+            store = _disk_stores[path] = _DiskStore(path)
+        return store
+
+
+class ResultCache:
+    """
+    Process-wide LRU cache backed by a shared SQLite file.
+
+    Entries younger than ``ttl`` are fresh. Entries older than that but within
+    ``stale_ttl`` are served immediately while a background refresh replaces
+    them (stale-while-revalidate). Values must be JSON-serializable; they are
+    kept as JSON text, so every lookup returns a fresh copy the caller may mutate.
+    """
+
+    def __init__(self, namespace, ttl, stale_ttl=0, max_entries=1000, memory_entries=256, path=None):
+        """
+        Args:
+            namespace (str): Keeps different kinds of results apart in the shared store
+            ttl (float): Seconds an entry is served without refreshing
+            stale_ttl (float): Extra seconds a stale entry may be served while refreshing
+            max_entries (int): Entries kept on disk before LRU eviction
+            memory_entries (int): Entries kept in process memory
+            path (str, optional): SQLite file, defaults to RESULT_CACHE_PATH
+        """
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._disk = _disk_store(path or RESULT_CACHE_PATH)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._touched = set()    # keys served from memory since the last touch
+        self._touched_at = time.monotonic()
+
+    def with_path(self, path):
+        """Same namespace and limits, stored in another SQLite file"""
+        return ResultCache(
+            self.namespace, self.ttl, self.stale_ttl, self.max_entries, self.memory_entries, path
+        )
+
+    def _lookup(self, key):
+        """Return (JSON text, created_at) from memory or disk, or None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._touched.add(key)
+        if entry is not None:
+            self._flush_touches()
+            return entry
+        try:
+            entry = self._disk.get(self.namespace, key)
+        except (sqlite3.Error, OSError, ValueError) as e:
+            print(f"Result cache read failed ({self.namespace}): {e}")
+            entry = None
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    def _flush_touches(self, force=False):
+        """Write back the access times of memory hits, at most once per ACCESS_TOUCH_SECONDS"""
+        with self._lock:
+            if not self._touched or (not force and time.monotonic() - self._touched_at < ACCESS_TOUCH_SECONDS):
+                return
+            keys = list(self._touched)
+            self._touched.clear()
+            self._touched_at = time.monotonic()
+        try:
+            self._disk.touch(self.namespace, keys, time.time())
+        except (sqlite3.Error, OSError) as e:
+            print(f"Result cache touch failed ({self.namespace}): {e}")
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        Look up a cached value
+
+        Returns:
+            tuple: (value, is_fresh), or (None, False) if missing or fully expired
+        """
+        entry = self._lookup(key)
+        if entry is None:
+            return None, False
+        text, created_at = entry
+        age = time.time() - created_at
+        if age > self.ttl + self.stale_ttl:
+            return None, False
+        try:
+            value = json.loads(text)
+        except ValueError as e:
+            print(f"Result cache entry unreadable ({self.namespace}): {e}")
+            return None, False
+        return value, age <= self.ttl
+
+    def set(self, key, value, tag=None):
+        """Store a value in memory and on disk"""
+        self._store(key, value, tag)
+
+    def _store(self, key, value, tag):
+        """Store a value; returns its JSON text, or None if it cannot be serialized"""
+        try:
+            text = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            print(f"Result cache value not serializable ({self.namespace}): {e}")
+            return None
+        created_at = time.time()
+        self._remember(key, (text, created_at))
+        # Pending memory hits count before eviction picks its victims
+        self._flush_touches(force=True)
+        try:
+            self._disk.set(self.namespace, key, text, created_at, tag, self.max_entries)
+        except (sqlite3.Error, OSError) as e:
+            print(f"Result cache write failed ({self.namespace}): {e}")
+        return text
+
+    def delete(self, key):
+        """Drop a single entry"""
+        with self._lock:
+            self._memory.pop(key, None)
+        self._disk.delete(self.namespace, key=key)
+
+    def purge(self, tag=None, tag_words=None):
+        """
+        Drop every entry, or only those stored with the given tag
+
+        Args:
+            tag (str, optional): Exact tag to drop
+            tag_words (str, optional): Space-separated words; drops entries whose
+                space-separated tag contains them in a row (e.g. 'nairobi' drops
+                'nairobi kenya' but not 'nairobiville')
+
+        Returns:
+            int: Entries dropped from disk
+        """
+        with self._lock:
+            self._memory.clear()
+        return self._disk.delete(self.namespace, tag=tag, tag_words=tag_words)
+
+    def items(self, tag=None):
+        """(key, value) for every unexpired entry on disk, most recently used first"""
+        try:
+            return self._disk.scan(self.namespace, time.time() - self.ttl - self.stale_ttl, tag)
+        except (sqlite3.Error, OSError, ValueError) as e:
+            print(f"Result cache scan failed ({self.namespace}): {e}")
+            return []
+
+    def values(self, tag=None):
+        """Every unexpired value on disk (fresh or stale), most recently used first"""
+        return [value for _, value in self.items(tag)]
+
+    def _refresh(self, key, compute, tag):
+        try:
+            self.set(key, compute(), tag)
+        except Exception as e:
+            # Keep serving the stale value; the next request will try again
+            print(f"Background refresh failed ({self.namespace}): {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_refresh(self, key, compute, tag=None):
+        """
+        Return a cached value without computing on a miss
+
+        A stale value is returned and refreshed with ``compute`` in the
+        background, at most one refresh per key at a time.
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        value, fresh = self.get(key)
+        if value is not None and not fresh:
+            with self._lock:
+                schedule = key not in self._refreshing
+                self._refreshing.add(key)
+            if schedule:
+                _refresh_executor.submit(self._refresh, key, compute, tag)
+        return value
+
+    def get_or_compute(self, key, compute, tag=None):
+        """
+        Return a cached value, computing and storing it on a miss
+
+        Stale values are returned immediately and refreshed in the background,
+        at most one refresh per key at a time. Concurrent misses for a key run
+        ``compute`` once and only that call stores the result; every caller
+        gets its own copy. Exceptions from ``compute`` on a miss propagate to
+        every waiting caller and nothing is cached.
+        """
+        value = self.get_or_refresh(key, compute, tag)
+        if value is not None:
+            return value
+
+        def compute_and_store():
+            value = compute()
+            return self._store(key, value, tag), value
+
+        text, value = _misses.do(f"{self.namespace}:{key}", compute_and_store)
+        return value if text is None else json.loads(text)
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import unicodedata
+
+from afridesk.catalog import tokenize
+from afridesk.paths import CACHE_DIR
+
+# Field weights applied to term frequencies (a simple BM25F)
+FIELD_WEIGHTS = {
+    'name': 3,
+    'category': 2,
+    'required_documents': 1,
+    'description': 1,
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Bump when tokenization or the on-disk layout changes
+INDEX_FORMAT_VERSION = 1
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'do', 'for', 'from', 'get',
+    'how', 'i', 'in', 'is', 'it', 'me', 'my', 'of', 'on', 'or', 'the', 'to', 'what',
+    'where', 'with', 'you', 'your',
+}
+
+
+def fold_accents(text):
+    """Remove diacritics so 'Côte' and 'Cote' index the same"""
+    decomposed = unicodedata.normalize('NFKD', text or "")
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def stem(token):
+    """Light suffix stripping so plurals and common endings share a term"""
+    if len(token) <= 3 or token.isdigit():
+        return token
+    for suffix, replacement in (('sses', 'ss'), ('ies', 'y'), ('istration', 'ist'),
+                                ('ations', ''), ('ation', ''), ('ings', ''), ('ing', ''),
+                                ('ed', ''), ('ers', ''), ('er', ''), ('als', ''), ('al', ''),
+                                ('ss', 'ss'), ('s', '')):
+        if token.endswith(suffix):
+            stemmed = token[:-len(suffix)] + replacement
+            if len(stemmed) >= 3:
+                token = stemmed
+            break
+    if len(token) > 3 and token.endswith('e'):
+        token = token[:-1]
+    return token
+
+
+def analyze(text):
+    """Fold, tokenize and stem text into index terms"""
+    return [stem(token) for token in tokenize(fold_accents(text)) if token not in STOPWORDS]
+
+
+def _field_text(service, field):
+    value = service.get(field, '')
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v) for v in value)
+    return str(value or '')
+
+
+def _content_hash(services):
+    services = [dict(service) for service in services]
+    payload = json.dumps([INDEX_FORMAT_VERSION, services], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class _BM25Index:
+    """BM25 postings for one country's services"""
+
+    def __init__(self, postings, doc_lengths):
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.avg_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, services):
+        postings = {}
+        doc_lengths = []
+        for doc_id, service in enumerate(services):
+            frequencies = {}
+            for field, weight in FIELD_WEIGHTS.items():
+                for term in analyze(_field_text(service, field)):
+                    frequencies[term] = frequencies.get(term, 0) + weight
+            doc_lengths.append(sum(frequencies.values()))
+            for term, tf in frequencies.items():
+                postings.setdefault(term, []).append([doc_id, tf])
+        return cls(postings, doc_lengths)
+
+    def to_dict(self):
+        return {'postings': self.postings, 'doc_lengths': self.doc_lengths}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['postings'], data['doc_lengths'])
+
+    def score(self, query):
+        n_docs = len(self.doc_lengths)
+        scores = {}
+        for term in set(analyze(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / self.avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+
+class ServiceSearch:
+    """
+    Ranked full-text search over a ServiceCatalog.
+
+    Each country's index is built on first use and persisted under CACHE_DIR,
+    keyed by a hash of that country's services, so workers reuse it until the
+    catalog changes.
+    """
+
+    def __init__(self, catalog, index_dir=None):
+        self._catalog = catalog
+        self._index_dir = index_dir or os.path.join(CACHE_DIR, 'search')
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _index_path(self, country, content_hash):
+        safe_country = "".join(ch if ch.isalnum() else '_' for ch in fold_accents(country))
+        return os.path.join(self._index_dir, f"{safe_country}-{content_hash}.json")
+
+    def _load_or_build(self, country, services):
+        content_hash = _content_hash(services)
+        path = self._index_path(country, content_hash)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return _BM25Index.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            pass
+
+        index = _BM25Index.build(services)
+        try:
+            os.makedirs(self._index_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(index.to_dict(), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # A read-only filesystem only costs us the rebuild on the next start
+            print(f"Could not persist search index for {country}: {e}")
+        return index
+
+    def _index(self, country, services):
+        index = self._indexes.get(country)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(country)
+                if index is None:
+                    index = self._load_or_build(country, services)
+                    self._indexes[country] = index
+        return index
+
+    def search(self, query, country, limit=10):
+        """
+        Search a country's services
+
+        Args:
+            query (str): Free-text query, e.g. "renew passport"
+            country (str): The country to search in
+            limit (int): Maximum number of results
+
+        Returns:
+            list: (service, score) pairs, best match first
+        """
+        services = self._catalog.get_services(country)
+        if not services or not query or not query.strip():
+            return []
+
+        scores = self._index(country, services).score(query)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(services[doc_id], score) for doc_id, score in ranked[:limit]]
@@ -1,330 +1,80 @@
+import functools
+import math
 import os
+import queue
+import threading
 import streamlit as st
-import google.generativeai as genai
-import json
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from afridesk.catalog_store import SERVICE_CATALOG
+from afridesk.json_stream import JsonArrayStreamParser
+from afridesk.llm_clients import LLM_CLIENTS, CircuitOpenError
+from afridesk.llm_json import (
+    SERVICES_RESPONSE_SCHEMA, ServicesParseError, loads_lenient, parse_services_response, validate_service
+)
+from afridesk.records import SERVICE_STORE
+from afridesk.result_cache import ResultCache, cache_key
+from afridesk.search import ServiceSearch
 
 load_dotenv()
 
-# Local service data as fallback, categorized by service type
-LOCAL_SERVICES = {
-    "Nigeria": {
-        "services": [
-            # Health Services
-            {
-                "name": "National Health Insurance Scheme (NHIS) Enrollment",
-                "description": "Enroll in the national health insurance program for affordable healthcare services.",
-                "required_documents": ["Means of identification", "Passport photograph", "Proof of address"],
-                "processing_time": "1-2 weeks",
-                "fees": "From N15,000 annually",
-                "category": "Health Services"
-            },
-            {
-                "name": "Primary Healthcare Center Registration",
-                "description": "Register with your local primary healthcare center for basic medical services.",
-                "required_documents": ["Proof of residence", "Means of identification"],
-                "processing_time": "Same day",
-                "fees": "Free for basic services",
-                "category": "Health Services"
-            },
-            # Education Services
-            {
-                "name": "JAMB Registration",
-                "description": "Register for Joint Admissions and Matriculation Board examinations for tertiary education.",
-                "required_documents": ["O'Level results", "Birth certificate", "Passport photograph"],
-                "processing_time": "1 day",
-                "fees": "N4,700 for UTME",
-                "category": "Education Services"
-            },
-            {
-                "name": "WAEC Registration",
-                "description": "Register for West African Examinations Council (WAEC) exams.",
-                "required_documents": ["Birth certificate", "Passport photograph"],
-                "processing_time": "1 day",
-                "fees": "N18,000 - N25,000",
-                "category": "Education Services"
-            },
-            # Business Registration
-            {
-                "name": "Corporate Affairs Commission (CAC) Business Registration",
-                "description": "Register your business with the Corporate Affairs Commission.",
-                "required_documents": ["Business name reservation", "Passport photographs", "Means of identification"],
-                "processing_time": "1-2 weeks",
-                "fees": "From N10,000",
-                "category": "Business Registration"
-            },
-            {
-                "name": "Business Premises Registration",
-                "description": "Register your business premises with the local government.",
-                "required_documents": ["CAC certificate", "Proof of address", "Tax identification number"],
-                "processing_time": "1 week",
-                "fees": "Varies by location",
-                "category": "Business Registration"
-            },
-            # Tax Services
-            {
-                "name": "Tax Identification Number (TIN) Registration",
-                "description": "Register for a Tax Identification Number with the Federal Inland Revenue Service.",
-                "required_documents": ["Means of identification", "Proof of address", "Passport photograph"],
-                "processing_time": "24-48 hours",
-                "fees": "Free",
-                "category": "Tax Services"
-            },
-            {
-                "name": "Filing Annual Tax Returns",
-                "description": "File your annual tax returns with the Federal Inland Revenue Service.",
-                "required_documents": ["TIN", "Financial statements", "Previous tax returns"],
-                "processing_time": "1-2 days",
-                "fees": "Varies by income",
-                "category": "Tax Services"
-            },
-            # National ID
-            {
-                "name": "National ID Card Registration",
-                "description": "Register for or replace your National Identity Card.",
-                "required_documents": ["Birth certificate/age declaration", "Proof of address", "Local government identification"],
-                "processing_time": "2-6 weeks",
-                "fees": "Free",
-                "category": "National ID"
-            }
-        ]
-    },
-    "Kenya": {
-        "services": [
-            # Health Services
-            {
-                "name": "NHIF Registration",
-                "description": "Enroll in the National Hospital Insurance Fund for healthcare coverage.",
-                "required_documents": ["National ID", "Passport photo", "KRA PIN"],
-                "processing_time": "1-2 weeks",
-                "fees": "From KSh 500 monthly",
-                "category": "Health Services"
-            },
-            {
-                "name": "Linda Mama Maternity Program",
-                "description": "Free maternity services for expectant mothers.",
-                "required_documents": ["National ID", "NHIF card"],
-                "processing_time": "Same day registration",
-                "fees": "Free",
-                "category": "Health Services"
-            },
-            # Education Services
-            {
-                "name": "KUCCPS University Application",
-                "description": "Apply for university placement through the Kenya Universities and Colleges Central Placement Service.",
-                "required_documents": ["KCSE results slip", "National ID", "Passport photo"],
-                "processing_time": "2-4 weeks",
-                "fees": "KSh 1,500",
-                "category": "Education Services"
-            },
-            {
-                "name": "KNEC KCPE/KCSE Registration",
-                "description": "Register for national primary and secondary education examinations.",
-                "required_documents": ["Birth certificate", "Passport photo", "Previous school records"],
-                "processing_time": "1-2 weeks",
-                "fees": "KSh 1,000 - KSh 1,500",
-                "category": "Education Services"
-            },
-            # Business Registration
-            {
-                "name": "eCitizen Business Registration",
-                "description": "Register a new business through the eCitizen portal.",
-                "required_documents": ["National ID", "KRA PIN", "Passport photo", "Business name search"],
-                "processing_time": "1-3 days",
-                "fees": "From KSh 10,000",
-                "category": "Business Registration"
-            },
-            {
-                "name": "Single Business Permit",
-                "description": "Obtain a business permit from the county government.",
-                "required_documents": ["Business registration certificate", "KRA PIN certificate", "Lease agreement"],
-                "processing_time": "1-2 weeks",
-                "fees": "Varies by business type and size",
-                "category": "Business Registration"
-            },
-            # Tax Services
-            {
-                "name": "KRA PIN Registration",
-                "description": "Register for a Personal Identification Number with the Kenya Revenue Authority.",
-                "required_documents": ["National ID", "Passport photo"],
-                "processing_time": "24 hours",
-                "fees": "Free",
-                "category": "Tax Services"
-            },
-            {
-                "name": "File Tax Returns",
-                "description": "File your annual tax returns with the Kenya Revenue Authority.",
-                "required_documents": ["KRA PIN", "Monthly pay slips", "P9 form"],
-                "processing_time": "1-2 days",
-                "fees": "Free",
-                "category": "Tax Services"
-            }
-        ]
-    },
-    "Ghana": {
-        "services": [
-            # Health Services
-            {
-                "name": "National Health Insurance Scheme (NHIS) Registration",
-                "description": "Enroll in Ghana's national health insurance program.",
-                "required_documents": ["Ghana Card", "Proof of residence", "Passport photo"],
-                "processing_time": "1-2 weeks",
-                "fees": "From GHS 30 annually",
-                "category": "Health Services"
-            },
-            {
-                "name": "Community-based Health Planning and Services (CHPS)",
-                "description": "Access primary healthcare services in your community.",
-                "required_documents": ["NHIS card"],
-                "processing_time": "Same day",
-                "fees": "Free with NHIS",
-                "category": "Health Services"
-            },
-            # Education Services
-            {
-                "name": "WASSCE Registration",
-                "description": "Register for West African Senior School Certificate Examination.",
-                "required_documents": ["BECE certificate", "Birth certificate", "Passport photo"],
-                "processing_time": "2 weeks",
-                "fees": "GHS 400-600",
-                "category": "Education Services"
-            },
-            {
-                "name": "University of Ghana Applications",
-                "description": "Apply for undergraduate programs at the University of Ghana.",
-                "required_documents": ["WASSCE results", "Birth certificate", "Passport photo"],
-                "processing_time": "4-6 weeks",
-                "fees": "GHS 200-400",
-                "category": "Education Services"
-            },
-            # Business Registration
-            {
-                "name": "Registrar General's Department Business Registration",
-                "description": "Register your business with the Registrar General's Department.",
-                "required_documents": ["Business name certificate", "Form 3", "Passport photo", "ID copy"],
-                "processing_time": "1-2 weeks",
-                "fees": "From GHS 50",
-                "category": "Business Registration"
-            },
-            {
-                "name": "Ghana Investment Promotion Centre (GIPC) Registration",
-                "description": "Register your foreign-owned business with GIPC.",
-                "required_documents": ["Business registration certificate", "Business plan", "Passport copies"],
-                "processing_time": "2-3 weeks",
-                "fees": "From $1,000",
-                "category": "Business Registration"
-            },
-            # Tax Services
-            {
-                "name": "Ghana Revenue Authority (GRA) TIN Registration",
-                "description": "Register for a Tax Identification Number.",
-                "required_documents": ["Ghana Card/Passport", "Proof of address"],
-                "processing_time": "24-48 hours",
-                "fees": "Free",
-                "category": "Tax Services"
-            },
-            {
-                "name": "File Annual Tax Returns",
-                "description": "File your annual tax returns with the GRA.",
-                "required_documents": ["TIN certificate", "Financial statements", "Previous tax returns"],
-                "processing_time": "1-2 days",
-                "fees": "Free",
-                "category": "Tax Services"
-            },
-            # National ID
-            {
-                "name": "Ghana Card Registration",
-                "description": "Register for the national identification card.",
-                "required_documents": ["Birth certificate", "Proof of residence", "Passport photo"],
-                "processing_time": "2-4 weeks",
-                "fees": "Free",
-                "category": "National ID"
-            }
-        ]
-    },
-    "South Africa": {
-        "services": [
-            # Health Services
-            {
-                "name": "Clinic Registration",
-                "description": "Register at your local clinic for primary healthcare services.",
-                "required_documents": ["ID document", "Proof of residence", "Clinic card (if applicable)"],
-                "processing_time": "Same day",
-                "fees": "Free for South African citizens",
-                "category": "Health Services"
-            },
-            {
-                "name": "Chronic Medication Collection",
-                "description": "Access to chronic medication at designated facilities.",
-                "required_documents": ["ID document", "Clinic card", "Prescription"],
-                "processing_time": "Same day",
-                "fees": "Free for South African citizens",
-                "category": "Health Services"
-            },
-            # Education Services
-            {
-                "name": "Matric Certificate Application",
-                "description": "Apply for your National Senior Certificate (NSC) or replacement certificate.",
-                "required_documents": ["ID document", "Previous school reports", "Affidavit if lost"],
-                "processing_time": "6-8 weeks",
-                "fees": "R141 for replacement",
-                "category": "Education Services"
-            },
-            {
-                "name": "NSFAS Bursary Application",
-                "description": "Apply for National Student Financial Aid Scheme funding for tertiary education.",
-                "required_documents": ["ID document", "Matric certificate", "Parents/guardian proof of income"],
-                "processing_time": "3-6 months",
-                "fees": "Free application",
-                "category": "Education Services"
-            },
-            # Business Registration
-            {
-                "name": "CIPC Company Registration",
-                "description": "Register a new company with the Companies and Intellectual Property Commission.",
-                "required_documents": ["ID copies of directors", "Proof of address", "Company name reservation"],
-                "processing_time": "5-7 working days",
-                "fees": "From R125",
-                "category": "Business Registration"
-            },
-            {
-                "name": "SARS Business Tax Registration",
-                "description": "Register your business for tax with the South African Revenue Service.",
-                "required_documents": ["ID document", "Proof of address", "Business registration documents"],
-                "processing_time": "21 working days",
-                "fees": "Free",
-                "category": "Business Registration"
-            },
-            # Tax Services
-            {
-                "name": "eFiling Registration",
-                "description": "Register for SARS eFiling to submit tax returns online.",
-                "required_documents": ["ID document", "Proof of residence", "Banking details"],
-                "processing_time": "24-48 hours",
-                "fees": "Free",
-                "category": "Tax Services"
-            },
-            {
-                "name": "Income Tax Return Submission",
-                "description": "File your annual income tax return with SARS.",
-                "required_documents": ["IRP5/IT3(a) certificate", "Medical aid certificate", "Retirement annuity certificates"],
-                "processing_time": "7-21 working days",
-                "fees": "Free",
-                "category": "Tax Services"
-            },
-            # National ID
-            {
-                "name": "Smart ID Card Application",
-                "description": "Apply for the new Smart ID card.",
-                "required_documents": ["Green barcoded ID book", "Birth certificate", "Proof of residence"],
-                "processing_time": "10-14 working days",
-                "fees": "R140",
-                "category": "National ID"
-            }
-        ]
-    }
+# Ranked full-text search over the same catalog
+SERVICE_SEARCH = ServiceSearch(SERVICE_CATALOG)
+
+SERVICES_MODEL = 'gemini-2.5-flash'
+
+# Bump whenever build_services_prompt changes so cached results are regenerated
+SERVICES_PROMPT_VERSION = 2
+
+# Gemini's JSON mode constrains output to the services schema
+SERVICES_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": SERVICES_RESPONSE_SCHEMA,
 }
 
+# Personalized services shared across sessions and workers
+PERSONALIZED_SERVICES_CACHE = ResultCache(
+    'personalized_services',
+    ttl=int(os.getenv('AFRIDESK_SERVICES_CACHE_TTL', 24 * 60 * 60)),
+    stale_ttl=int(os.getenv('AFRIDESK_SERVICES_CACHE_STALE_TTL', 7 * 24 * 60 * 60)),
+    max_entries=int(os.getenv('AFRIDESK_SERVICES_CACHE_SIZE', 5000))
+)
+
+# Recent (country, services_needed) requests, replayed by the cache warmer
+PERSONALIZED_SERVICES_REQUESTS = ResultCache(
+    'personalized_services_requests',
+    ttl=int(os.getenv('AFRIDESK_SERVICES_TRAFFIC_TTL', 14 * 24 * 60 * 60)),
+    max_entries=int(os.getenv('AFRIDESK_SERVICES_TRAFFIC_SIZE', 2000))
+)
+
+# Show local services at once and swap in personalized ones when they arrive (the default)
+PROGRESSIVE_SERVICES = os.getenv('AFRIDESK_PROGRESSIVE_SERVICES', '1') == '1'
+
+# Without progressive mode: render service cards as Gemini streams them instead of
+# waiting for the full list. Off by default; progressive mode takes precedence.
+STREAM_SERVICES = os.getenv('AFRIDESK_STREAM_SERVICES', '0') == '1' and not PROGRESSIVE_SERVICES
+
+# How often the services page checks on background personalization
+PERSONALIZATION_POLL_SECONDS = float(os.getenv('AFRIDESK_PERSONALIZATION_POLL_SECONDS', 1))
+
+# Background personalization requests; each mostly waits on Gemini
+_personalization_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="afridesk-personalize")
+
+# Opt in to asking for each needed category in its own concurrent prompt instead of one
+# large one; more calls, fewer services per category, and the merged list is not cached
+FANOUT_SERVICES = os.getenv('AFRIDESK_FANOUT_SERVICES', '0') == '1'
+
+# Services requested per category in fan-out mode
+CATEGORY_SERVICE_COUNT = os.getenv('AFRIDESK_CATEGORY_SERVICE_COUNT', '2-3')
+
+# Concurrent per-category Gemini calls across the process
+_fanout_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('AFRIDESK_FANOUT_WORKERS', 4)), thread_name_prefix="afridesk-fanout"
+)
+
+# Service cards rendered per page in services_list
+SERVICES_PAGE_SIZE = max(1, int(os.getenv('AFRIDESK_SERVICES_PAGE_SIZE', 10)))
+
 def get_local_services(country, service_categories=None):
     """
     Get local services for a specific country, optionally filtered by service categories
@@ -336,48 +86,27 @@ def get_local_services(country, service_categories=None):
     Returns:
         list: List of services matching the criteria
     """
-    # Get services for the specified country
-    country_data = LOCAL_SERVICES.get(country, {})
-    services = country_data.get('services', [])
-    
-    # If no services found for the country, use the first available country's services
-    if not services and LOCAL_SERVICES:
-        first_country = next(iter(LOCAL_SERVICES.values()))
-        services = first_country.get('services', [])
-    
-    # Filter by service categories if provided
-    if service_categories:
-        # Normalize categories for case-insensitive comparison
-        categories = [cat.lower() for cat in service_categories]
-        services = [
-            service for service in services 
-            if service.get('category', '').lower() in categories
-            or any(cat.lower() in service.get('name', '').lower() for cat in service_categories)
-        ]
-    
-    return services
+    return SERVICE_CATALOG.get_services(country, service_categories)
 
-def get_personalized_services(user_data, api_key):
-    """
-    Get personalized services based on user's country and preferences using Google's Gemini API
-    with fallback to local data if API fails
+def search_local_services(query, country, limit=10):
     """
-    country = user_data.get('country', 'Nigeria')  # Default to Nigeria if not specified
-    services_needed = user_data.get('services_needed', [])
+    Search local services for a country by name, description, documents and category
     
-    try:
-        print("API Key: ", api_key)
-        if not api_key or api_key == 'your_gemini_api_key_here':
-            # print error message
-            print("No API key provided")
-            raise ValueError("No API key provided")
-            
-        # Configure the Gemini API
-        genai.configure(api_key=api_key)
-        
-        services_needed_str = ", ".join(services_needed)
+    Args:
+        query (str): Free-text query, e.g. "renew passport" or "KRA PIN"
+        country (str): The country to search in
+        limit (int, optional): Maximum number of results
         
-        prompt = f"""
+    Returns:
+        list: Services ranked by relevance
+    """
+    return [service for service, _ in SERVICE_SEARCH.search(query, country, limit)]
+
+def build_services_prompt(country, services_needed, service_count="5-7"):
+    """Build the Gemini prompt for personalized services"""
+    services_needed_str = ", ".join(services_needed)
+    
+    return f"""
         Based on the following user information, provide a list of relevant government services in {country}.
         
         User Preferences:
@@ -385,7 +114,7 @@ def get_personalized_services(user_data, api_key):
         - Interested Services: {services_needed_str}
         
         Please provide:
-        1. A list of 5-7 relevant government services
+        1. A list of {service_count} relevant government services
         2. A brief description of each service
         3. Required documents for each service
         4. Estimated processing time
@@ -405,38 +134,300 @@ def get_personalized_services(user_data, api_key):
         
         IMPORTANT: Only return the JSON object, no additional text or markdown formatting.
         """
+
+def fetch_personalized_services(country, services_needed, api_key, service_count="5-7"):
+    """
+    Ask Gemini for personalized services, without caching or fallback
+    
+    Safe to call outside a Streamlit script run (e.g. from a background refresh).
+    
+    Raises:
+        ServicesParseError: If no valid service could be recovered from the response
+        Exception: Any error raised by the Gemini client
+    """
+    prompt = build_services_prompt(country, services_needed, service_count)
+    
+    # Shared model and channel for this key
+    model = LLM_CLIENTS.gemini(api_key, SERVICES_MODEL)
+    
+    # Generate content
+    print("prompt: ", prompt)
+    with LLM_CLIENTS.slot('gemini', api_key):
+        response = model.generate_content(prompt, generation_config=SERVICES_GENERATION_CONFIG)
+    
+    # Repairs common defects and salvages complete services from truncated output
+    return parse_services_response(response.text)
+
+# Marks the end of a services stream on its queue
+_STREAM_END = object()
+
+def stream_personalized_services(user_data, api_key):
+    """
+    Yield personalized services one at a time as Gemini generates them
+    
+    Cached results are yielded straight from PERSONALIZED_SERVICES_CACHE.
+    Concurrent identical requests share one Gemini stream: the request that
+    starts it yields services as they arrive, the others get the finished
+    list. A fresh stream is cached only if the whole services array arrived.
+    
+    Raises:
+        ValueError: If no usable API key is provided
+        Exception: Any error raised by the Gemini client
+    """
+    country = user_data.get('country', 'Nigeria')  # Default to Nigeria if not specified
+    services_needed = user_data.get('services_needed', [])
+    if not api_key or api_key == 'your_gemini_api_key_here':
+        raise ValueError("No API key provided")
+    
+    record_services_request(country, services_needed)
+    key = personalized_services_cache_key(country, services_needed)
+    cached = PERSONALIZED_SERVICES_CACHE.get_or_refresh(
+        key, lambda: fetch_personalized_services(country, services_needed, api_key), tag=country
+    )
+    if cached is not None:
+        yield from cached.get('services', [])
+        return
+    
+    # Read on a worker so the stream goes through the cache's single flight
+    streamed = queue.Queue()
+    outcome = {}
+    
+    def load():
+        try:
+            outcome['value'] = PERSONALIZED_SERVICES_CACHE.get_or_compute(
+                key, lambda: read_services_stream(country, services_needed, api_key, streamed.put), tag=country
+            )
+        except Exception as e:
+            outcome['error'] = e
+        finally:
+            streamed.put(_STREAM_END)
+    
+    threading.Thread(target=load, name="afridesk-services-stream", daemon=True).start()
+    yielded = 0
+    while True:
+        service = streamed.get()
+        if service is _STREAM_END:
+            break
+        yielded += 1
+        yield service
+    if 'error' in outcome:
+        raise outcome['error']
+    if not yielded:
+        # Another request ran the stream; share its finished list
+        yield from outcome['value'].get('services', [])
+
+def read_services_stream(country, services_needed, api_key, emit):
+    """
+    Stream personalized services from Gemini, passing each valid one to ``emit``
+    
+    Blocked or empty chunks are skipped.
+    
+    Returns:
+        dict: {"services": [...]} once the whole array has arrived
         
-        # Initialize the Gemini model
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        # Generate content
-        print("prompt: ", prompt)
-        response = model.generate_content(prompt)
-        response_text = response.text.strip()
-        
-        # Sometimes Gemini includes markdown code blocks, so we'll remove them
-        if '```json' in response_text:
-            response_text = response_text.split('```json')[1].split('```')[0].strip()
-        elif '```' in response_text:
-            response_text = response_text.split('```')[1].split('```')[0].strip()
-            
-        # Parse the response
-        services_data = json.loads(response_text)
-        return services_data
+    Raises:
+        ServicesParseError: If the stream ended before the services array closed
+    """
+    model = LLM_CLIENTS.gemini(api_key, SERVICES_MODEL)
+    parser = JsonArrayStreamParser("services", decode=loads_lenient)
+    services = []
+    texts = []
+    # The slot is held until the stream has been read
+    with LLM_CLIENTS.slot('gemini', api_key):
+        response = model.generate_content(
+            build_services_prompt(country, services_needed),
+            generation_config=SERVICES_GENERATION_CONFIG,
+            stream=True
+        )
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                continue
+            if not text:
+                continue
+            texts.append(text)
+            for service in parser.feed(text):
+                service = validate_service(service)
+                if service is not None:
+                    services.append(service)
+                    emit(service)
+    
+    if not parser.complete:
+        raise ServicesParseError("The services stream ended before the list was complete", "".join(texts))
+    return {"services": services}
+
+def personalized_services_cache_key(country, services_needed):
+    """Normalized cache key: same country and set of needs share one entry"""
+    normalized_needs = sorted({need.strip().lower() for need in services_needed if need and need.strip()})
+    return cache_key(country.strip().lower(), normalized_needs, SERVICES_MODEL, SERVICES_PROMPT_VERSION)
+
+def category_services_cache_key(country, category):
+    """Cache key for one category's fan-out result; kept apart from full-prompt entries"""
+    return cache_key(country.strip().lower(), category.strip().lower(), SERVICES_MODEL, SERVICES_PROMPT_VERSION, 'category')
+
+def load_category_services(country, category, api_key):
+    """Services for a single category, through the shared cache"""
+    key = category_services_cache_key(country, category)
+    return PERSONALIZED_SERVICES_CACHE.get_or_compute(
+        key, lambda: fetch_personalized_services(country, [category], api_key, CATEGORY_SERVICE_COUNT), tag=country
+    )
+
+def fetch_personalized_services_fanout(country, categories, api_key):
+    """
+    One smaller Gemini prompt per category, run concurrently and merged
+    
+    Each category is cached on its own, so only the missing ones are requested.
+    Services are merged in category order and deduplicated by name; categories
+    that fail are left out.
+    
+    Raises:
+        Exception: The first category error if no category returned services
+    """
+    futures = [_fanout_executor.submit(load_category_services, country, category, api_key) for category in categories]
+    
+    services = []
+    seen = set()
+    errors = []
+    for category, future in zip(categories, futures):
+        try:
+            category_services = future.result()['services']
+        except Exception as e:
+            print(f"Services for {category} failed: {e}")
+            errors.append(e)
+            continue
+        for service in category_services:
+            name = service.get('name', '').strip().lower()
+            if name in seen:
+                continue
+            seen.add(name)
+            services.append(service)
+    
+    if not services and errors:
+        raise errors[0]
+    return {"services": services}
+
+def record_services_request(country, services_needed):
+    """Remember a request so the cache warmer can pre-generate it after a deploy"""
+    needs = sorted({need.strip() for need in services_needed if need and need.strip()})
+    key = cache_key(country, needs)
+    _, fresh = PERSONALIZED_SERVICES_REQUESTS.get(key)
+    if not fresh:
+        PERSONALIZED_SERVICES_REQUESTS.set(key, {"country": country, "services_needed": needs}, tag=country)
+
+def recent_services_requests():
+    """Requests seen within the traffic window, most recent first"""
+    return PERSONALIZED_SERVICES_REQUESTS.values()
+
+def load_personalized_services(country, services_needed, api_key):
+    """
+    Personalized services through the shared cache, without Streamlit calls or fallback
+    
+    Safe to run on a background thread.
+    
+    Raises:
+        ValueError: If no usable API key is provided
+        ServicesParseError: If no valid service could be recovered from the response
+        Exception: Any error raised by the Gemini client
+    """
+    if not api_key or api_key == 'your_gemini_api_key_here':
+        # print error message
+        print("No API key provided")
+        raise ValueError("No API key provided")
+    
+    # Distinct needs in the order the user picked them
+    categories = list({need.strip().lower(): need.strip() for need in services_needed if need and need.strip()}.values())
+    if FANOUT_SERVICES and len(categories) > 1:
+        return fetch_personalized_services_fanout(country, categories, api_key)
+    
+    key = personalized_services_cache_key(country, services_needed)
+    # Concurrent misses for the same key share one Gemini call (see ResultCache.get_or_compute)
+    return PERSONALIZED_SERVICES_CACHE.get_or_compute(
+        key, lambda: fetch_personalized_services(country, services_needed, api_key), tag=country
+    )
+
+def get_personalized_services(user_data, api_key):
+    """
+    Get personalized services based on user's country and preferences using Google's Gemini API
+    with fallback to local data if API fails
+    
+    Results are shared across sessions through PERSONALIZED_SERVICES_CACHE.
+    """
+    country = user_data.get('country', 'Nigeria')  # Default to Nigeria if not specified
+    services_needed = user_data.get('services_needed', [])
+    
+    try:
+        print("API Key: ", api_key)
+        record_services_request(country, services_needed)
+        return load_personalized_services(country, services_needed, api_key)
         
-    except json.JSONDecodeError as e:
+    except ServicesParseError as e:
         st.error("Error parsing the response from Gemini. Falling back to local service data.")
-        st.error(f"Response content: {response_text if 'response_text' in locals() else 'No response'}")
-        return {"services": get_locals_services(country, services_needed)}
+        st.error(f"Response content: {e.text or 'No response'}")
+        return {"services": get_local_services(country, services_needed)}
+    except CircuitOpenError:
+        st.info("Personalized recommendations are temporarily unavailable. Showing our local service guide.")
+        return {"services": get_local_services(country, services_needed)}
     except Exception as e:
         st.warning(f"Using local service data as fallback: {str(e)}")
         return {"services": get_local_services(country, services_needed)}
 
+def start_progressive_services(user_data, api_key):
+    """
+    Show local catalog services now and personalize them in the background
+    
+    Returns:
+        dict: {"services": [...]} with the local services stored in the session
+    """
+    country = user_data.get('country', 'Nigeria')
+    services_data = remember_services({"services": get_local_services(country, user_data.get('needs', []))})
+    st.session_state['services_source'] = 'local'
+    record_services_request(country, user_data.get('services_needed', []))
+    st.session_state['personalization_future'] = _personalization_executor.submit(
+        load_personalized_services, country, user_data.get('services_needed', []), api_key
+    )
+    return services_data
+
+def apply_personalized_services():
+    """
+    Merge finished background personalization into the session's list
+    
+    Personalized services come first, followed by local services they do not
+    already cover. Failures keep the local list.
+    """
+    future = st.session_state.get('personalization_future')
+    if future is None or not future.done():
+        return
+    del st.session_state['personalization_future']
+    
+    try:
+        personalized = future.result()['services']
+    except Exception as e:
+        print(f"Background personalization failed: {e}")
+        st.session_state['services_source'] = 'local'
+        return
+    
+    local = recall_services()['services'] if 'services_data' in st.session_state else []
+    names = {service.get('name', '').strip().lower() for service in personalized}
+    merged = list(personalized) + [service for service in local if service.get('name', '').strip().lower() not in names]
+    remember_services({"services": merged})
+    st.session_state['services_source'] = 'personalized'
+
+@st.fragment(run_every=PERSONALIZATION_POLL_SECONDS)
+def await_personalized_services():
+    """Poll the background request and rerun the page once it has finished"""
+    future = st.session_state.get('personalization_future')
+    if future is None:
+        return
+    if future.done():
+        st.rerun()
+    st.caption("⏳ Personalizing these results for you…")
+
 def services_list():
     st.title("Government Services")
     
     # Check if we should show service details
-    if st.session_state.get('show_service_details', False) and 'selected_service' in st.session_state:
+    if st.session_state.get('show_service_details', False) and 'selected_service_record' in st.session_state:
         service_details()
         return
     
@@ -460,6 +451,22 @@ def services_list():
     else:
         st.markdown("### Browse Available Government Services")
     
+    # Local ranked search answers most lookups without an LLM call
+    search_query = st.text_input(
+        "🔍 Search services",
+        placeholder="e.g. renew passport, KRA PIN",
+        key="service_search_query"
+    )
+    if search_query.strip():
+        country = user_data.get('country', 'Nigeria')
+        results = search_local_services(search_query, country)
+        if results:
+            st.success(f"Found {len(results)} services matching \"{search_query}\" in {country}:")
+            render_service_page(results, key_prefix="search")
+        else:
+            st.info(f"No services matching \"{search_query}\" in {country}. Try different keywords.")
+        return
+    
     # Try to get API key from environment or session state
     api_key = os.getenv("GEMINI_API_KEY") or st.session_state.get('gemini_api_key')
     
@@ -468,22 +475,37 @@ def services_list():
         # Fall back to local services
         country = user_data.get('country', 'Nigeria')
         services_needed = user_data.get('needs', [])
-        services_data = {"services": get_local_services(country, services_needed)}
-        st.session_state['services_data'] = services_data
+        services_data = remember_services({"services": get_local_services(country, services_needed)})
+        
+    # Swap in background personalization once it has finished
+    if PROGRESSIVE_SERVICES:
+        apply_personalized_services()
         
+    # Summary messages sit above the cards but are written once the list is known
+    summary = st.container()
+    cards_rendered = False
+    
     # Show loading state
     with st.spinner("Analyzing your profile to find the most relevant services..."):
         # Check if we already have services data
-        if 'services_data' not in st.session_state:
+        if 'services_data' not in st.session_state and PROGRESSIVE_SERVICES:
+            # Render the local catalog immediately and personalize in the background
+            services_data = start_progressive_services(user_data, api_key)
+        elif 'services_data' not in st.session_state:
             try:
-                # Get personalized services from Gemini API
-                services_data = get_personalized_services(user_data, api_key)
+                if STREAM_SERVICES:
+                    # Render each card as soon as Gemini finishes generating it
+                    services_data = render_streamed_services(user_data, api_key)
+                    cards_rendered = True
+                else:
+                    # Get personalized services from Gemini API
+                    services_data = get_personalized_services(user_data, api_key)
                 
                 if not services_data or 'services' not in services_data:
                     raise ValueError("No services data returned from API")
                     
                 # Store services in session state for details view
-                st.session_state['services_data'] = services_data
+                services_data = remember_services(services_data)
                 
             except Exception as e:
                 st.error("Sorry, we encountered an issue getting personalized recommendations.")
@@ -491,11 +513,12 @@ def services_list():
                 # Fall back to local services
                 country = user_data.get('country', 'Nigeria')
                 services_needed = user_data.get('needs', [])
-                services_data = {"services": get_local_services(country, services_needed)}
-                st.session_state['services_data'] = services_data
+                services_data = remember_services({"services": get_local_services(country, services_needed)})
+                cards_rendered = False
         else:
-            services_data = st.session_state['services_data']
+            services_data = recall_services()
             
+    with summary:
         # Display services with personalized message if coming from profile
         country = user_data.get('country', 'your location')
         if st.session_state.get('came_from_profile', False):
@@ -512,57 +535,155 @@ def services_list():
         if profile_data and 'needs' in profile_data and profile_data['needs']:
             st.info(f"✨ Personalized for: {', '.join(profile_data['needs'])}")
         
-        # Create columns for service cards
-        cols = st.columns(1)  # Single column for better readability of detailed cards
+        if st.session_state.get('services_source') == 'personalized':
+            st.badge("Personalized", icon="✨", color="green")
+        elif 'personalization_future' in st.session_state:
+            await_personalized_services()
         
-        for idx, service in enumerate(services_data['services']):
-            with cols[0]:  # Always use first (and only) column
-                with st.expander(f"🔹 {service.get('name', 'Service')}", expanded=False):
-                    # Service description
-                    st.markdown(f"**Description:** {service.get('description', 'No description available')}")
-                    
-                    # Why this service is relevant (if available)
-                    if 'why_relevant' in service and service['why_relevant']:
-                        st.markdown(f"**Why this matters for you:** {service['why_relevant']}")
-                    
-                    # Service details in a more organized way
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.markdown("**Processing Time**")
-                        st.info(f"⏱️ {service.get('processing_time', 'Varies')}")
-                    with col2:
-                        st.markdown("**Fees**")
-                        st.info(f"💰 {service.get('fees', 'Varies')}")
-                    
-                    # Required documents (if available)
-                    if 'required_documents' in service and service['required_documents']:
-                        with st.expander("📋 Required Documents", expanded=False):
-                            for doc in service['required_documents']:
-                                st.markdown(f"- {doc}")
-                    
-                    # Category tag (if available)
-                    if 'category' in service and service['category']:
-                        st.markdown(f"**Category:** `{service['category']}`")
-                    
-                    # View Details button
-                    if st.button("View Full Details", key=f"details_{idx}", use_container_width=True):
-                        st.session_state['selected_service'] = service
-                        st.session_state['show_service_details'] = True
-                        st.rerun()
+    if not cards_rendered:
+        render_service_page(services_data['services'])
+
+def remember_services(services_data):
+    """
+    Keep the shared SERVICE_STORE records in the session, not copies
+    
+    The session holds one reference per service, which also keeps the records
+    resolvable by id in the store for as long as the session lives.
+    
+    Returns:
+        dict: {"services": [...]} with the shared Service records
+    """
+    services = tuple(SERVICE_STORE.add(service) for service in services_data['services'])
+    st.session_state['services_data'] = {"services": services}
+    return {"services": list(services)}
+
+def recall_services():
+    """The session's shared Service records"""
+    return {"services": list(st.session_state['services_data'].get('services', ()))}
+
+def render_streamed_services(user_data, api_key):
+    """
+    Render service cards while Gemini is still generating the list
+    
+    Returns:
+        dict: {"services": [...]} with every service that was rendered
+        
+    Raises:
+        Exception: If the stream failed before producing any service
+    """
+    services = []
+    cards = st.container()
+    more = st.empty()
+    try:
+        for service in stream_personalized_services(user_data, api_key):
+            service = SERVICE_STORE.add(service)
+            # Only the first page is rendered; the rest are reached through the pager
+            if len(services) < SERVICES_PAGE_SIZE:
+                with cards:
+                    render_service_cards([service], start=len(services))
+            else:
+                more.caption(f"…and {len(services) + 1 - SERVICES_PAGE_SIZE} more on the next pages")
+            services.append(service)
+    except Exception as e:
+        if not services:
+            raise
+        st.warning(f"The response was cut short, showing the services received so far: {str(e)}")
+    
+    if not services:
+        raise ValueError("No services data returned from API")
+    more.empty()
+    page_count = math.ceil(len(services) / SERVICES_PAGE_SIZE)
+    if page_count > 1:
+        render_page_controls(0, page_count, "details_page")
+    return {"services": services}
+
+@functools.lru_cache(maxsize=4096)
+def service_card_summary(service_id):
+    """Markdown for a collapsed card; records are immutable, so it is cached by id"""
+    service = SERVICE_STORE.get(service_id)
+    facts = [f"⏱️ {service.get('processing_time', 'Varies')}", f"💰 {service.get('fees', 'Varies')}"]
+    if service.get('category'):
+        facts.insert(0, f"`{service['category']}`")
+    return f"#### 🔹 {service.get('name', 'Service')}\n{' · '.join(facts)}"
+
+@functools.lru_cache(maxsize=4096)
+def service_card_details(service_id):
+    """Markdown for an opened card, built on first open and cached by id"""
+    service = SERVICE_STORE.get(service_id)
+    sections = [f"**Description:** {service.get('description', 'No description available')}"]
+    
+    # Why this service is relevant (if available)
+    if service.get('why_relevant'):
+        sections.append(f"**Why this matters for you:** {service['why_relevant']}")
+    
+    # Required documents (if available)
+    if service.get('required_documents'):
+        documents = "\n".join(f"- {doc}" for doc in service['required_documents'])
+        sections.append(f"**📋 Required Documents**\n{documents}")
+    return "\n\n".join(sections)
+
+def render_service_cards(services, key_prefix="details", start=0):
+    """
+    Render services as cards whose details are only built once opened
+    
+    Args:
+        services (list): Service records (or dicts) to render
+        key_prefix (str): Widget key prefix, unique per list on the page
+        start (int): Position of the first service in the full list
+    """
+    for idx, service in enumerate(services, start):
+        service = SERVICE_STORE.add(service)
+        with st.container(border=True):
+            st.markdown(service_card_summary(service.id))
+            
+            # Details are only sent to the browser for opened cards
+            if st.toggle("Show details", key=f"{key_prefix}_open_{idx}_{service.id}"):
+                st.markdown(service_card_details(service.id))
+                
+                # View Details button
+                if st.button("View Full Details", key=f"{key_prefix}_{idx}", use_container_width=True):
+                    st.session_state['selected_service_record'] = service
+                    st.session_state['show_service_details'] = True
+                    st.rerun()
+
+def _set_page(page_key, page):
+    st.session_state[page_key] = page
+
+def render_page_controls(page, page_count, page_key):
+    """Previous/next buttons for a paginated list"""
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button("← Previous", key=f"{page_key}_prev", disabled=page <= 0,
+                  on_click=_set_page, args=(page_key, page - 1), use_container_width=True)
+    with col2:
+        st.caption(f"Page {page + 1} of {page_count}")
+    with col3:
+        st.button("Next →", key=f"{page_key}_next", disabled=page >= page_count - 1,
+                  on_click=_set_page, args=(page_key, page + 1), use_container_width=True)
+
+def render_service_page(services, key_prefix="details"):
+    """Render the current page of service cards, SERVICES_PAGE_SIZE at a time"""
+    page_key = f"{key_prefix}_page"
+    page_count = max(1, math.ceil(len(services) / SERVICES_PAGE_SIZE))
+    page = min(max(st.session_state.get(page_key, 0), 0), page_count - 1)
+    start = page * SERVICES_PAGE_SIZE
+    
+    render_service_cards(services[start:start + SERVICES_PAGE_SIZE], key_prefix, start)
+    if page_count > 1:
+        render_page_controls(page, page_count, page_key)
 
 def service_details():
     """Show detailed information about a selected service"""
     st.title("Service Details")
     
-    if 'selected_service' not in st.session_state:
+    service = st.session_state.get('selected_service_record')
+    if service is None:
         st.error("No service selected. Please go back and select a service.")
         if st.button("← Back to Services"):
             st.session_state['show_service_details'] = False
             st.rerun()
         return
     
-    service = st.session_state['selected_service']
-    
     # Service header with name and category
     st.markdown(f"## {service.get('name', 'Service Details')}")
     
@@ -0,0 +1,69 @@
+import threading
+
+
+class _Call:
+    """An in-flight call that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one.
+
+    Streamlit runs each session's script in its own thread, so when several
+    sessions (or a rerun of the same session) ask for the same key while a
+    call is in flight, they wait for that call and share its result instead
+    of issuing their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """
+        Run fn() unless a call for key is already in flight, then share its outcome
+
+        Args:
+            key (str): Normalized request key
+            fn (callable): Zero-argument function performing the request
+
+        Returns:
+            The result of the single underlying call. If that call raised,
+            every waiting caller sees the same exception.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        """Number of distinct calls currently running"""
+        with self._lock:
+            return len(self._calls)
+
+
+# Shared by every LLM call site in the process; keys are namespaced per call site
+LLM_REQUESTS = SingleFlight()
@@ -1,16 +1,28 @@
+import asyncio
 import streamlit as st
 import os
+import time
 import json
 import base64
-import google.generativeai as genai
 from pathlib import Path
 from streamlit_option_menu import option_menu
+from afridesk.async_runner import ASYNC_RUNNER
+from afridesk.llm_clients import LLM_CLIENTS
+from afridesk.profile_options import COUNTRIES
+from afridesk.response import STREAM_CHAT, log_chat_event
+from afridesk.result_cache import cache_key
+from afridesk.singleflight import LLM_REQUESTS
+
+RECOMMENDATIONS_MODEL = 'gemini-pro'
+
+# Seconds the chat page waits for the assistant's reply (non-streamed) and for the office lookup
+CHAT_TIMEOUT_SECONDS = float(os.getenv('AFRIDESK_CHAT_TIMEOUT_SECONDS', 60))
+OFFICE_LOOKUP_TIMEOUT_SECONDS = float(os.getenv('AFRIDESK_OFFICE_LOOKUP_TIMEOUT_SECONDS', 20))
 
 # Initialize Gemini API
 def init_gemini():
     try:
-        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-        return genai.GenerativeModel('gemini-pro')
+        return LLM_CLIENTS.gemini(os.getenv('GEMINI_API_KEY'), RECOMMENDATIONS_MODEL)
     except Exception as e:
         st.error(f"Error initializing Gemini: {e}")
         return None
@@ -483,15 +495,7 @@ def show_personal_info_step():
                             index=["Prefer not to say", "Male", "Female", "Other"].index(
                                 st.session_state.profile_data['gender']))
         
-        countries = [
-            "Select a country",
-            "Algeria", "Angola", "Benin", "Botswana", "Burkina Faso", "Burundi", "Cabo Verde", "Cameroon", "Central African Republic",
-            "Chad", "Comoros", "Congo (Congo-Brazzaville)", "Côte d'Ivoire", "Democratic Republic of the Congo", "Djibouti",
-            "Egypt", "Equatorial Guinea", "Eritrea", "Eswatini (fmr. Swaziland)", "Ethiopia", "Gabon", "Gambia", "Ghana", "Guinea",
-            "Guinea-Bissau", "Kenya", "Lesotho", "Liberia", "Libya", "Madagascar", "Malawi", "Mali", "Mauritania", "Mauritius",
-            "Morocco", "Mozambique", "Namibia", "Niger", "Nigeria", "Rwanda", "Sao Tome and Principe", "Senegal", "Seychelles",
-            "Sierra Leone", "Somalia", "South Africa", "South Sudan", "Sudan", "Tanzania", "Togo", "Tunisia", "Uganda", "Zambia", "Zimbabwe"
-        ]
+        countries = ["Select a country"] + COUNTRIES
         
         country = st.selectbox(
             "Country of Residence*",
@@ -607,8 +611,8 @@ def show_review_step():
         if st.button("✅ Save Profile"):
             st.session_state.user_profile_data = st.session_state.profile_data
             # Ensure services will be filtered based on this profile
-            if 'services_data' in st.session_state:
-                del st.session_state['services_data']
+            for key in ('services_data', 'services_source', 'personalization_future'):
+                st.session_state.pop(key, None)
             st.success("Profile saved successfully!", icon="✅")
             # st.session_state.current_page = 'recommendations'
             # st.rerun()
@@ -630,8 +634,13 @@ def get_service_recommendations(profile):
         
         Recommended Services:"""
         
-        response = model.generate_content(prompt)
-        return response.text
+        # Identical profiles in flight at the same time share one Gemini call
+        key = cache_key('recommendations', profile, RECOMMENDATIONS_MODEL)
+        def request_recommendations():
+            with LLM_CLIENTS.slot('gemini', os.getenv('GEMINI_API_KEY')):
+                return model.generate_content(prompt).text
+        
+        return LLM_REQUESTS.do(f"recommendations:{key}", request_recommendations)
     except Exception as e:
         st.error(f"Error getting recommendations: {e}")
         return "Unable to generate recommendations at this time. Please try again later."
@@ -693,20 +702,55 @@ def show_about():
     st.markdown("---")
     st.caption("© 2024 AfriDesk. All rights reserved.")
 
+def get_government_assistant(api_key, profile_data, asynchronous=False):
+    """
+    Reuse the session's GovernmentAssistant until the key or profile changes
+    
+    With asynchronous, the session's AsyncGovernmentAssistant instead.
+    """
+    from afridesk.assistant import AsyncGovernmentAssistant, GovernmentAssistant
+    
+    state_key = 'async_government_assistant' if asynchronous else 'government_assistant'
+    key = cache_key(api_key, profile_data)
+    cached = st.session_state.get(state_key)
+    if cached is None or cached[0] != key:
+        assistant_class = AsyncGovernmentAssistant if asynchronous else GovernmentAssistant
+        cached = (key, assistant_class(api_key, profile_data))
+        st.session_state[state_key] = cached
+    return cached[1]
+
+def office_lookup_request(prompt, user_context):
+    """(location, office type) to look up for an office-finding question, or None"""
+    if not any(keyword in prompt.lower() for keyword in ['find', 'locate', 'where is', 'nearest', 'office']):
+        return None
+    location = user_context.get('location', '')
+    if not location:
+        return None
+    office_type = None
+    if 'dmv' in prompt.lower() or 'driving' in prompt.lower():
+        office_type = 'DMV'
+    elif 'post' in prompt.lower() or 'mail' in prompt.lower():
+        office_type = 'Post Office'
+    elif 'city hall' in prompt.lower() or 'municipal' in prompt.lower():
+        office_type = 'City Hall'
+    return location, office_type
+
 def show_chat_interface():
     st.markdown("## 💬 Government Services Assistant")
     
     # Initialize chat history if it doesn't exist
 
     assistant = None
+    async_assistant = None
     # Initialize GovernmentAssistant if not already in session state
     try:
-        from afridesk.assistant import GovernmentAssistant
         openai_api_key = os.getenv('OPENAI_API_KEY')
         if not openai_api_key:
             st.warning("OpenAI API key not found. Some features may be limited.")
         profile_data = st.session_state.get('user_profile_data', {})
-        assistant = GovernmentAssistant(openai_api_key, profile_data)
+        assistant = get_government_assistant(openai_api_key, profile_data)
+        # Runs the reply and the office lookup concurrently
+        async_assistant = get_government_assistant(openai_api_key, profile_data, asynchronous=True)
     except Exception as e:
         st.error(f"Error initializing assistant: {str(e)}")
     
@@ -740,65 +784,86 @@ How can I assist you today?"""
             st.markdown(prompt)
         
         # Generate assistant response
+        started = time.monotonic()
         with st.chat_message("assistant"):
-            with st.spinner("Searching for information..."):
-                try:
-                    # Get user profile data for context if available
-                    user_context = st.session_state.get('user_profile_data', {}) or st.session_state.get('user_data', {})
-                    
-                    # Generate response using the assistant
-                    # Use the chat method for conversation history
-                    chat_history = [
-                        assistant._create_system_message()
-                    ]
-                    
-                    # Add previous messages to maintain context
-                    for msg in st.session_state.messages[-5:]:  # Keep last 5 messages for context
-                        chat_history.append({"role": msg["role"], "content": msg["content"]})
-                    
-                    # Get response from the assistant
-                    response = assistant.chat(chat_history)
-                    
-                    # If the response is about finding offices, try to get structured data
-                    if any(keyword in prompt.lower() for keyword in ['find', 'locate', 'where is', 'nearest', 'office']):
-                        location = user_context.get('location', '')
-                        if location:
-                            office_type = None
-                            if 'dmv' in prompt.lower() or 'driving' in prompt.lower():
-                                office_type = 'DMV'
-                            elif 'post' in prompt.lower() or 'mail' in prompt.lower():
-                                office_type = 'Post Office'
-                            elif 'city hall' in prompt.lower() or 'municipal' in prompt.lower():
-                                office_type = 'City Hall'
-                                
-                            office_info = assistant.get_government_offices(location, office_type)
-                            if office_info and 'error' not in office_info.lower():
-                                try:
-                                    offices = json.loads(office_info).get('offices', [])
-                                    if offices:
-                                        response += "\n\n**Nearby Government Offices:**\n\n"
-                                        for office in offices[:3]:  # Show top 3 results
-                                            response += f"**{office.get('name', 'Office')}**\n"
-                                            if 'address' in office:
-                                                response += f"📍 {office['address']}\n"
-                                            if 'phone' in office:
-                                                response += f"📞 {office['phone']}\n"
-                                            if 'hours' in office:
-                                                response += f"🕒 {office['hours']}\n"
-                                            if 'website' in office:
-                                                response += f"🌐 [Visit Website]({office['website']})\n"
-                                            response += "\n"
-                                except json.JSONDecodeError:
-                                    response += "\n\nI found some information about local offices, but couldn't format it properly."
+            office_lookup = None
+            try:
+                # Get user profile data for context if available
+                user_context = st.session_state.get('user_profile_data', {}) or st.session_state.get('user_data', {})
+                
+                # Generate response using the assistant
+                # Use the chat method for conversation history
+                chat_history = [
+                    assistant._create_system_message()
+                ]
+                
+                # Add previous messages to maintain context
+                for msg in st.session_state.messages[-5:]:  # Keep last 5 messages for context
+                    chat_history.append({"role": msg["role"], "content": msg["content"]})
+                
+                # If the question is about finding offices, look them up while the reply is generated
+                lookup = office_lookup_request(prompt, user_context)
+                if lookup:
+                    office_lookup = ASYNC_RUNNER.submit(asyncio.wait_for(
+                        async_assistant.get_government_offices(*lookup), OFFICE_LOOKUP_TIMEOUT_SECONDS
+                    ))
+                
+                # Get response from the assistant
+                if STREAM_CHAT:
+                    # Tokens render as they arrive (hedged when enabled); the offices follow below
+                    response = st.write_stream(assistant.chat(chat_history, stream=True, timeout=CHAT_TIMEOUT_SECONDS))
+                else:
+                    with st.spinner("Searching for information..."):
+                        try:
+                            response = ASYNC_RUNNER.run(
+                                asyncio.wait_for(async_assistant.chat(chat_history), CHAT_TIMEOUT_SECONDS)
+                            )
+                        except asyncio.TimeoutError:
+                            response = "I'm sorry, the assistant took too long to reply. Please try again."
+                
+                # Add structured office data when the lookup finishes in time
+                office_text = ""
+                if office_lookup is not None:
+                    with st.spinner("Looking up nearby offices..."):
+                        try:
+                            office_info = office_lookup.result()
+                        except asyncio.TimeoutError:
+                            office_info = None
+                            print(f"Office lookup timed out after {OFFICE_LOOKUP_TIMEOUT_SECONDS}s")
+                        if office_info and 'error' not in office_info.lower():
+                            try:
+                                offices = json.loads(office_info).get('offices', [])
+                                if offices:
+                                    office_text += "\n\n**Nearby Government Offices:**\n\n"
+                                    for office in offices[:3]:  # Show top 3 results
+                                        office_text += f"**{office.get('name', 'Office')}**\n"
+                                        if 'address' in office:
+                                            office_text += f"📍 {office['address']}\n"
+                                        if 'phone' in office:
+                                            office_text += f"📞 {office['phone']}\n"
+                                        if 'hours' in office:
+                                            office_text += f"🕒 {office['hours']}\n"
+                                        if 'website' in office:
+                                            office_text += f"🌐 [Visit Website]({office['website']})\n"
+                                        office_text += "\n"
+                            except json.JSONDecodeError:
+                                office_text += "\n\nI found some information about local offices, but couldn't format it properly."
                 
+                if STREAM_CHAT:
+                    if office_text:
+                        st.markdown(office_text, unsafe_allow_html=True)
+                else:
+                    st.markdown(response + office_text, unsafe_allow_html=True)
+                response += office_text
                 
-                    st.markdown(response, unsafe_allow_html=True)
-                    
-                except Exception as e:
-                    error_msg = f"I'm sorry, I encountered an error while processing your request: {str(e)}"
-                    st.error(error_msg)
-                    response = error_msg
+            except Exception as e:
+                error_msg = f"I'm sorry, I encountered an error while processing your request: {str(e)}"
+                st.error(error_msg)
+                response = error_msg
+                if office_lookup is not None:
+                    office_lookup.cancel()
             
+            log_chat_event('government_assistant', prompt, response, started)
             # Add assistant response to chat history
             st.session_state.messages.append({"role": "assistant", "content": response})
 
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# The repository root holds an __init__.py, so put it on the path for `import afridesk`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep result caches, events and search indexes out of the user's cache directory
+os.environ['AFRIDESK_CACHE_DIR'] = tempfile.mkdtemp(prefix='afridesk-tests-')
+os.environ.pop('AFRIDESK_LLM_CASSETTE', None)
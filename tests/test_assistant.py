@@ -0,0 +1,81 @@
+import pytest
+
+from afridesk.assistant import GovernmentAssistant
+
+PROFILE = {'country': 'Kenya', 'age': 34, 'gender': 'Female', 'employment_status': 'Employed'}
+QUESTION = {"role": "user", "content": "How do I renew an expired passport in Nairobi?"}
+
+
+def plan(messages, profile=None, use_profile_context=True):
+    assistant = GovernmentAssistant('test-key', profile)
+    return assistant._answer_plan(messages, use_profile_context)
+
+
+def test_opening_question_without_profile_context_is_shared():
+    question, scope, messages = plan([QUESTION], PROFILE, use_profile_context=False)
+    assert scope is not None
+    assert [m['role'] for m in messages] == ['system', 'user']
+    # The shared prompt holds the scope only, never personal details
+    assert 'Female' not in messages[0]['content']
+
+
+def test_profile_context_is_sent_and_never_cached():
+    question, scope, messages = plan([QUESTION], PROFILE)
+    assert scope is None
+    assert 'Female' in messages[0]['content'] and messages[1:] == [QUESTION]
+
+
+@pytest.mark.parametrize("profile", [None, PROFILE])
+def test_later_turns_keep_the_conversation_and_are_never_cached(profile):
+    history = [
+        {"role": "user", "content": "How do I renew an expired passport in Nairobi?"},
+        {"role": "assistant", "content": "Apply on eCitizen and book an appointment."},
+        {"role": "user", "content": "Which documents are required for the appointment?"},
+    ]
+    question, scope, messages = plan(history, profile, use_profile_context=False)
+    assert scope is None
+    assert messages == history
+
+
+def test_office_purge_from_another_process_applies_at_once(tmp_path):
+    from afridesk import assistant
+
+    path = str(tmp_path / "results.sqlite")
+    worker = assistant.GOVERNMENT_OFFICES_CACHE.with_path(path)
+    purger = assistant.GOVERNMENT_OFFICES_CACHE.with_path(path)
+    key = assistant._offices_cache_key('Nairobi, Kenya', None)
+    worker.set(key, {"offices": []}, tag=assistant.normalize_location('Nairobi, Kenya'))
+    assert worker.get(key)[0] == {"offices": []}
+
+    assert purger.purge(tag_words=assistant.normalize_location('Nairobi')) == 1
+    assert worker.get(key) == (None, False)
+
+
+def test_streamed_reply_is_cut_off_at_the_timeout(monkeypatch):
+    import time
+    from types import SimpleNamespace
+
+    from afridesk import assistant
+
+    def chunk(text):
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+    def slow_reply():
+        yield chunk("Apply on eCitizen")
+        time.sleep(0.2)
+        yield chunk(" and book an appointment.")
+        yield chunk(" Never sent.")
+
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        return slow_reply()
+
+    monkeypatch.setattr(assistant, 'HEDGE_CHAT', False)
+    government = GovernmentAssistant('test-key', PROFILE)
+    government.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    reply = list(government.chat([QUESTION], stream=True, timeout=0.1))
+    assert calls[0]['timeout'] == 0.1
+    assert reply[-1].endswith(assistant.CHAT_TIMEOUT_REPLY)
+    assert " Never sent." not in reply
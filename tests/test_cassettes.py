@@ -0,0 +1,128 @@
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from afridesk.cassettes import Cassette, CassetteMissError, summarize
+from afridesk.llm_clients import is_rate_limit
+
+
+class FakeCompletions:
+    def __init__(self, chunks=("Hello", " there"), error=None):
+        self.chunks = chunks
+        self.error = error
+        self.calls = 0
+
+    def create(self, model, messages, stream=False, **kwargs):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        if stream:
+            return iter(
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+                for text in self.chunks
+            )
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="".join(self.chunks)))])
+
+
+class FakeGeminiModel:
+    def generate_content(self, contents, generation_config=None, safety_settings=None, stream=False, **kwargs):
+        if stream:
+            return iter([SimpleNamespace(text="Jambo"), SimpleNamespace(text="!")])
+        return SimpleNamespace(text="Jambo!")
+
+
+def record(path, completions, **request):
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return Cassette(str(path), mode='record').openai(client).chat.completions.create(**request)
+
+
+def test_openai_stream_round_trip(tmp_path):
+    path = tmp_path / "chat.jsonl"
+    messages = [{"role": "user", "content": "Hi, today is 2024-01-01"}]
+    live = record(path, FakeCompletions(), model="gpt", messages=messages, stream=True)
+    assert [chunk.choices[0].delta.content for chunk in live] == ["Hello", " there"]
+
+    # Dates are masked, so the recording replays on another day
+    replay = Cassette(str(path), mode='replay', scale=0).openai().chat.completions
+    replayed = replay.create(model="gpt", messages=[{"role": "user", "content": "Hi, today is 2025-06-30"}], stream=True)
+    assert [chunk.choices[0].delta.content for chunk in replayed] == ["Hello", " there"]
+
+
+def test_gemini_round_trip(tmp_path):
+    path = tmp_path / "gemini.jsonl"
+    recorder = Cassette(str(path), mode='record').gemini('gemini-pro', FakeGeminiModel())
+    assert recorder.generate_content("Hi").text == "Jambo!"
+    assert [chunk.text for chunk in recorder.generate_content("Hi", stream=True)] == ["Jambo", "!"]
+
+    replay = Cassette(str(path), mode='replay', scale=0).gemini('gemini-pro')
+    assert replay.generate_content("Hi").text == "Jambo!"
+    assert [chunk.text for chunk in replay.generate_content("Hi", stream=True)] == ["Jambo", "!"]
+    assert summarize(str(path))['gemini']['exchanges'] == 2
+
+
+def test_rate_limit_replays_as_rate_limit(tmp_path):
+    path = tmp_path / "errors.jsonl"
+    request = httpx.Request("POST", "https://api.openai.com")
+    error = openai.RateLimitError("slow down", response=httpx.Response(429, request=request), body=None)
+    with pytest.raises(openai.RateLimitError):
+        record(path, FakeCompletions(error=error), model="gpt", messages=[{"role": "user", "content": "q"}])
+
+    replay = Cassette(str(path), mode='replay', scale=0).openai().chat.completions
+    with pytest.raises(openai.RateLimitError) as raised:
+        replay.create(model="gpt", messages=[{"role": "user", "content": "q"}])
+    assert raised.value.status_code == 429 and is_rate_limit(raised.value)
+
+
+def test_unrecorded_request_misses(tmp_path):
+    replay = Cassette(str(tmp_path / "empty.jsonl"), mode='replay').openai().chat.completions
+    with pytest.raises(CassetteMissError):
+        replay.create(model="gpt", messages=[{"role": "user", "content": "never recorded"}])
+
+
+def test_recorded_samples_are_replayed_in_turn(tmp_path):
+    path = tmp_path / "samples.jsonl"
+    messages = [{"role": "user", "content": "q"}]
+    record(path, FakeCompletions(chunks=("one",)), model="gpt", messages=messages)
+    record(path, FakeCompletions(chunks=("two",)), model="gpt", messages=messages)
+    replay = Cassette(str(path), mode='replay', scale=0).openai().chat.completions
+    answers = [replay.create(model="gpt", messages=messages).choices[0].message.content for _ in range(3)]
+    assert answers == ["one", "two", "one"]
+
+
+def test_unrecorded_openai_apis_pass_through_or_fail_clearly(tmp_path):
+    real = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()), audio="real audio")
+    assert Cassette(str(tmp_path / "c.jsonl"), mode='record').openai(real).audio == "real audio"
+
+    replay = Cassette(str(tmp_path / "c.jsonl"), mode='replay').openai()
+    with pytest.raises(CassetteMissError, match="'audio' calls are not recorded"):
+        replay.audio
+
+
+def test_recorded_gemini_stream_can_be_cancelled(tmp_path):
+    from afridesk.hedging import _cancel_gemini
+
+    cancelled = []
+
+    class LiveStream:
+        _iterator = SimpleNamespace(cancel=lambda: cancelled.append(True))
+
+        def __iter__(self):
+            yield SimpleNamespace(text="Jambo")
+            raise RuntimeError("cancelled")
+
+    class Model:
+        def generate_content(self, contents, stream=False, **kwargs):
+            return LiveStream()
+
+    path = tmp_path / "cancel.jsonl"
+    response = Cassette(str(path), mode='record').gemini('gemini-pro', Model()).generate_content("Hi", stream=True)
+    chunks = iter(response)
+    assert next(chunks).text == "Jambo"
+    _cancel_gemini(response)
+    assert cancelled == [True]
+    with pytest.raises(RuntimeError):
+        next(chunks)
+    # Part of a reply is not a recording
+    assert not path.exists()
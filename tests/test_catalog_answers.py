@@ -0,0 +1,81 @@
+import pytest
+
+from afridesk.catalog import ServiceCatalog
+from afridesk.catalog_answers import CatalogAnswerer
+
+CATALOG = {
+    'Kenya': {'services': [
+        {
+            'name': 'KRA PIN Registration',
+            'description': 'Register for a Kenya Revenue Authority PIN',
+            'category': 'Tax',
+            'required_documents': ['National ID', 'Email address'],
+            'fees': 'Free',
+            'processing_time': 'Same day',
+            'website': 'https://itax.kra.go.ke',
+        },
+        {
+            'name': 'eCitizen Business Registration',
+            'description': 'Register a business name',
+            'category': 'Business',
+            'required_documents': ['KRA PIN', 'National ID'],
+            'fees': 'KES 950',
+            'processing_time': '1-3 days',
+        },
+    ]},
+    'Ghana': {'services': [
+        {
+            'name': 'Ghana Card Registration',
+            'description': 'National identity card',
+            'category': 'Identity',
+            'required_documents': ['Birth certificate'],
+            'fees': 'Free for first issuance',
+            'processing_time': '2 weeks',
+        },
+    ]},
+}
+
+
+@pytest.fixture(scope='module')
+def answerer():
+    return CatalogAnswerer(ServiceCatalog(CATALOG))
+
+
+def test_resolves_service_and_attribute(answerer):
+    slots = answerer.resolve("How much does KRA PIN registration cost?", 'Kenya')
+    assert slots['service']['name'] == 'KRA PIN Registration'
+    assert slots['attributes'] == ['fees']
+
+
+def test_answer_cites_the_catalog(answerer):
+    answer = answerer.answer("What documents are required for KRA PIN registration?", 'Kenya')
+    assert "- National ID" in answer
+    assert "*Source: AfriDesk service catalog, Kenya › KRA PIN Registration*" in answer
+
+
+def test_country_named_in_the_question_wins(answerer):
+    slots = answerer.resolve("How long does the Ghana Card take in Ghana?", 'Kenya')
+    assert slots['country'] == 'Ghana'
+    assert slots['attributes'] == ['processing_time']
+
+
+@pytest.mark.parametrize("question", [
+    "Tell me about KRA PIN registration",            # no attribute asked
+    "How much does a passport cost?",                 # no such service
+    "What documents do I need for registration?",     # ties between services
+])
+def test_unresolved_questions_go_to_the_llm(answerer, question):
+    assert answerer.answer(question, 'Kenya') is None
+
+
+def test_unknown_country_is_not_answered(answerer):
+    assert answerer.answer("How much does KRA PIN registration cost?", 'Narnia') is None
+
+
+@pytest.mark.parametrize("question", [
+    "Do I need a KRA PIN to register a business?",
+    "Is a KRA PIN required for business registration?",
+])
+def test_service_that_is_not_the_subject_is_not_answered(answerer, question):
+    assert answerer.answer(question, 'Kenya') is None
+
@@ -0,0 +1,88 @@
+import os
+import time
+
+import pytest
+
+from afridesk.catalog_build import CatalogValidationError
+from afridesk.catalog_store import load_catalog
+
+SOURCE = """country: Kenya
+services:
+  - name: {name}
+    description: Register for a tax PIN
+    category: Tax
+    required_documents: [National ID]
+    fees: Free
+    processing_time: Same day
+"""
+
+
+@pytest.fixture
+def sources(tmp_path):
+    directory = tmp_path / "services"
+    directory.mkdir()
+    return directory
+
+
+def write_source(sources, name, age=0, country="Kenya"):
+    path = sources / f"{country.lower()}.yaml"
+    path.write_text(SOURCE.format(name=name).replace("Kenya", country), encoding='utf-8')
+    if age:
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+        os.utime(sources, (stamp, stamp))
+
+
+def names(store):
+    return [service['name'] for service in store['Kenya']['services']]
+
+
+def test_missing_artifact_is_compiled(sources, tmp_path):
+    write_source(sources, "KRA PIN")
+    store = load_catalog(str(tmp_path / "services.db"), str(sources))
+    assert names(store) == ["KRA PIN"]
+
+
+def test_edited_sources_rebuild_the_artifact(sources, tmp_path):
+    artifact = str(tmp_path / "services.db")
+    write_source(sources, "KRA PIN", age=60)
+    first = load_catalog(artifact, str(sources))
+
+    write_source(sources, "KRA PIN Registration")
+    second = load_catalog(artifact, str(sources))
+    assert names(second) == ["KRA PIN Registration"]
+    assert second.content_hash != first.content_hash
+
+
+def test_touched_but_unchanged_sources_are_not_rebuilt(sources, tmp_path):
+    artifact = str(tmp_path / "services.db")
+    write_source(sources, "KRA PIN", age=60)
+    built_at = load_catalog(artifact, str(sources)).built_at
+
+    write_source(sources, "KRA PIN")
+    assert load_catalog(artifact, str(sources)).built_at == built_at
+
+
+def test_invalid_sources_keep_the_last_artifact(sources, tmp_path):
+    artifact = str(tmp_path / "services.db")
+    write_source(sources, "KRA PIN", age=60)
+    load_catalog(artifact, str(sources))
+
+    (sources / "kenya.yaml").write_text("country: Kenya\nservices: []\n", encoding='utf-8')
+    assert names(load_catalog(artifact, str(sources))) == ["KRA PIN"]
+
+
+def test_invalid_sources_without_artifact_raise(sources, tmp_path):
+    (sources / "kenya.yaml").write_text("country: Kenya\nservices: []\n", encoding='utf-8')
+    with pytest.raises(CatalogValidationError):
+        load_catalog(str(tmp_path / "services.db"), str(sources))
+
+
+def test_deleted_source_drops_its_country(sources, tmp_path):
+    artifact = str(tmp_path / "services.db")
+    write_source(sources, "Ghana Card", country="Ghana")
+    write_source(sources, "KRA PIN", age=60)
+    assert sorted(load_catalog(artifact, str(sources))) == ["Ghana", "Kenya"]
+
+    (sources / "ghana.yaml").unlink()
+    assert list(load_catalog(artifact, str(sources))) == ["Kenya"]
@@ -0,0 +1,36 @@
+from afridesk.events import EventSink
+
+
+def test_events_are_committed_in_order(tmp_path):
+    sink = EventSink(str(tmp_path / "events.sqlite"), flush_seconds=0.05)
+    sink.emit('chat', session='s1', latency_ms=10)
+    sink.emit('feedback', session='s1', rating='down')
+    assert sink.flush()
+    assert [(e['kind'], e['session']) for e in sink.read()] == [('feedback', 's1'), ('chat', 's1')]
+    assert sink.read('chat')[0]['latency_ms'] == 10
+
+
+def test_writer_survives_a_failing_batch(tmp_path, monkeypatch):
+    sink = EventSink(str(tmp_path / "events.sqlite"), flush_seconds=0.05)
+    write = sink._write
+
+    def fail_once(batch):
+        monkeypatch.setattr(sink, '_write', write)
+        raise RuntimeError("disk on fire")
+
+    monkeypatch.setattr(sink, '_write', fail_once)
+    sink.emit('chat', session='lost')
+    assert sink.flush()
+    assert sink.dropped == 1
+
+    sink.emit('chat', session='kept')
+    assert sink.flush()
+    assert [e['session'] for e in sink.read()] == ['kept']
+
+
+def test_full_buffer_drops_instead_of_blocking(tmp_path):
+    sink = EventSink(str(tmp_path / "events.sqlite"), buffer_size=1)
+    sink._start = lambda: None   # no writer draining the queue
+    assert sink.emit('chat') is True
+    assert sink.emit('chat') is False
+    assert sink.dropped == 1
@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+from afridesk.hedging import HedgeStats, NoTextError, hedged_stream
+
+
+class Reply:
+    """A provider's reply: waits ``delay``, then yields its chunks; records being closed"""
+
+    def __init__(self, name, delay, chunks=("a", "b"), error=None):
+        self.name = name
+        self.delay = delay
+        self.chunks = chunks
+        self.error = error
+        self.started = threading.Event()
+        self.closed = threading.Event()
+
+    def __call__(self):
+        def stream():
+            self.started.set()
+            try:
+                time.sleep(self.delay)
+                if self.error:
+                    raise self.error
+                for chunk in self.chunks:
+                    yield f"{self.name}:{chunk}"
+            finally:
+                self.closed.set()
+        return stream()
+
+
+def test_fast_primary_is_not_hedged():
+    stats = HedgeStats()
+    primary, secondary = Reply('gemini', 0.01), Reply('openai', 0.01)
+    assert list(hedged_stream(('gemini', primary), ('openai', secondary), deadline=1, stats=stats)) == ["gemini:a", "gemini:b"]
+    assert not secondary.started.is_set()
+    assert stats.snapshot()['hedged'] == 0
+
+
+def test_slow_primary_loses_and_is_closed():
+    stats = HedgeStats()
+    primary, secondary = Reply('gemini', 0.5), Reply('openai', 0.01)
+    started = time.monotonic()
+    assert list(hedged_stream(('gemini', primary), ('openai', secondary), deadline=0.1, stats=stats)) == ["openai:a", "openai:b"]
+    assert time.monotonic() - started < 0.4
+    assert primary.closed.wait(2)
+    snapshot = stats.snapshot()
+    assert snapshot['hedged'] == 1 and snapshot['wins'] == {'openai': 1}
+
+
+def test_losing_primary_latency_is_recorded_as_a_lower_bound():
+    stats = HedgeStats()
+    list(hedged_stream(('gemini', Reply('gemini', 0.5)), ('openai', Reply('openai', 0.05)), deadline=0.1, stats=stats))
+    # Without it the primary's percentile deadline would only ever see its fast replies
+    assert stats._latencies['gemini'][0] >= 0.1
+
+
+def test_failing_primary_hedges_before_the_deadline():
+    primary = Reply('gemini', 0.01, error=RuntimeError("down"))
+    started = time.monotonic()
+    assert list(hedged_stream(('gemini', primary), ('openai', Reply('openai', 0.01)), deadline=5, stats=HedgeStats())) == ["openai:a", "openai:b"]
+    assert time.monotonic() - started < 1
+
+
+def test_empty_primary_counts_as_failed():
+    primary = Reply('gemini', 0.01, chunks=())
+    assert list(hedged_stream(('gemini', primary), ('openai', Reply('openai', 0.01)), deadline=5, stats=HedgeStats())) == ["openai:a", "openai:b"]
+
+
+def test_both_failing_raises_the_primary_error():
+    stats = HedgeStats()
+    with pytest.raises(RuntimeError, match="gemini down"):
+        list(hedged_stream(
+            ('gemini', Reply('gemini', 0.01, error=RuntimeError("gemini down"))),
+            ('openai', Reply('openai', 0.01, error=NoTextError("openai down"))),
+            deadline=5, stats=stats,
+        ))
+    assert stats.snapshot()['failures'] == 1
+
+
+def test_reader_stopping_early_closes_the_winner():
+    primary = Reply('gemini', 0.01, chunks=("a", "b", "c"))
+    stream = hedged_stream(('gemini', primary), ('openai', Reply('openai', 0.01)), deadline=5, stats=HedgeStats())
+    assert next(stream) == "gemini:a"
+    stream.close()
+    assert primary.closed.wait(2)
+
+
+def test_percentile_deadline():
+    stats = HedgeStats()
+    for ms in range(1, 101):
+        stats.observe('gemini', ms / 100)
+    assert stats.deadline('gemini') == pytest.approx(0.91)
+    assert stats.deadline('openai') > 0
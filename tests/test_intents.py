@@ -0,0 +1,36 @@
+from afridesk.intents import AhoCorasick, IntentMatcher, normalize
+
+
+def test_aho_corasick_finds_overlapping_patterns():
+    automaton = AhoCorasick({"he": "he", "she": "she", "his": "his", "hers": "hers"})
+    assert sorted(automaton.find("ushers")) == ["he", "hers", "she"]
+    assert automaton.find("xyz") == []
+
+
+def test_aho_corasick_reports_every_occurrence():
+    automaton = AhoCorasick({"ab": 1, "b": 2})
+    assert automaton.find("abab") == [1, 2, 1, 2]
+
+
+def test_normalize_pads_whole_words():
+    assert normalize("Renew my Passports!") == " renew my passport "
+    # " id " cannot match inside "provide"
+    assert " id " not in normalize("provide")
+
+
+def test_intent_matcher_scores_whole_words_once():
+    matcher = IntentMatcher([
+        {'name': 'passport', 'terms': {'passport': 2, 'renew': 1}, 'answer': "p"},
+        {'name': 'id', 'terms': {'id': 2, 'national id': 1}, 'answer': "i"},
+    ])
+    assert matcher.scores("renew passport passport") == {0: 3}
+    assert matcher.scores("Please provide a national ID") == {1: 3}
+    assert matcher.match("what do you provide") is None
+
+
+def test_intent_matcher_prefers_earlier_intents_on_ties():
+    matcher = IntentMatcher([
+        {'name': 'first', 'terms': {'office': 1}, 'answer': None},
+        {'name': 'second', 'terms': {'hours': 1}, 'answer': None},
+    ])
+    assert matcher.match("office hours")['name'] == 'first'
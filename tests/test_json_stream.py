@@ -0,0 +1,44 @@
+import json
+
+from afridesk.json_stream import JsonArrayStreamParser
+from afridesk.llm_json import loads_lenient
+
+
+def feed_all(parser, chunks):
+    objects = []
+    for chunk in chunks:
+        objects.extend(parser.feed(chunk))
+    return objects
+
+
+def test_objects_are_returned_as_soon_as_they_close():
+    parser = JsonArrayStreamParser("services")
+    assert parser.feed('{"services": [{"name": "Pass') == []
+    assert parser.feed('port"}, {"name"') == [{"name": "Passport"}]
+    assert parser.feed(': "ID"}]}') == [{"name": "ID"}]
+    assert parser.complete
+
+
+def test_single_character_chunks():
+    text = json.dumps({"services": [{"name": "A", "fees": "{not a brace}"}, {"name": "B \"quoted\""}]})
+    parser = JsonArrayStreamParser("services")
+    assert feed_all(parser, list(text)) == [{"name": "A", "fees": "{not a brace}"}, {"name": "B \"quoted\""}]
+    assert parser.complete
+
+
+def test_bare_array_in_code_fence():
+    parser = JsonArrayStreamParser("services")
+    assert feed_all(parser, ['```json\n[{"a": 1},', ' {"a": [2, 3]}]\n```']) == [{"a": 1}, {"a": [2, 3]}]
+
+
+def test_undecodable_objects_are_skipped_and_lenient_decode_repairs():
+    strict = JsonArrayStreamParser("services")
+    assert feed_all(strict, ['{"services": [{"a": 1,}, {"b": 2}]}']) == [{"b": 2}]
+    lenient = JsonArrayStreamParser("services", decode=loads_lenient)
+    assert feed_all(lenient, ['{"services": [{"a": 1,}, {"b": True}]}']) == [{"a": 1}, {"b": True}]
+
+
+def test_truncated_stream_is_not_complete():
+    parser = JsonArrayStreamParser("services")
+    assert feed_all(parser, ['{"services": [{"a": 1}, {"b":']) == [{"a": 1}]
+    assert not parser.complete
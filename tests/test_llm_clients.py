@@ -0,0 +1,143 @@
+import threading
+import time
+
+import httpx
+import openai
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from afridesk.llm_clients import CircuitBreaker, CircuitOpenError, ClientRegistry, _Slot, is_provider_error, is_rate_limit
+
+REQUEST = httpx.Request("POST", "https://api.example")
+
+
+def status_error(cls, status):
+    return cls("error", response=httpx.Response(status, request=REQUEST), body=None)
+
+
+def make_slot(**kwargs):
+    return _Slot(threading.BoundedSemaphore(2), CircuitBreaker('test', **kwargs))
+
+
+def fail(slot, error):
+    with pytest.raises(type(error)):
+        with slot:
+            raise error
+
+
+def test_opens_after_consecutive_provider_failures():
+    slot = make_slot(failure_threshold=3, cooldown=60)
+    for _ in range(2):
+        fail(slot, google_exceptions.ServiceUnavailable("down"))
+    assert slot.breaker.state == CircuitBreaker.CLOSED
+    fail(slot, google_exceptions.ServiceUnavailable("down"))
+    assert slot.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        with slot:
+            pass
+
+
+def test_rate_limit_opens_at_once():
+    slot = make_slot(failure_threshold=5, cooldown=60)
+    error = status_error(openai.RateLimitError, 429)
+    assert is_rate_limit(error)
+    fail(slot, error)
+    assert slot.breaker.state == CircuitBreaker.OPEN
+
+
+def test_success_resets_the_failure_count():
+    slot = make_slot(failure_threshold=2, cooldown=60)
+    fail(slot, openai.APITimeoutError(REQUEST))
+    with slot:
+        pass
+    fail(slot, openai.APITimeoutError(REQUEST))
+    assert slot.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_our_own_errors_do_not_count():
+    slot = make_slot(failure_threshold=1, cooldown=60)
+    fail(slot, ValueError("bad JSON from our parser"))
+    fail(slot, status_error(openai.BadRequestError, 400))
+    assert slot.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_probe_closes_or_reopens_with_backoff():
+    slot = make_slot(failure_threshold=1, cooldown=0.05, max_cooldown=0.15)
+    fail(slot, google_exceptions.InternalServerError("boom"))
+    time.sleep(0.06)
+
+    # One probe at a time while half-open; a failed probe doubles the cooldown
+    with pytest.raises(google_exceptions.InternalServerError):
+        with slot:
+            assert slot.breaker.state == CircuitBreaker.HALF_OPEN
+            with pytest.raises(CircuitOpenError):
+                with slot:
+                    pass
+            raise google_exceptions.InternalServerError("still down")
+    assert slot.breaker.state == CircuitBreaker.OPEN
+    assert slot.breaker.cooldown == pytest.approx(0.1)
+
+    time.sleep(0.11)
+    with slot:
+        pass
+    assert slot.breaker.state == CircuitBreaker.CLOSED
+    assert slot.breaker.cooldown == pytest.approx(0.05)
+
+
+def test_abandoned_probe_lets_the_next_call_probe():
+    slot = make_slot(failure_threshold=1, cooldown=0.05)
+    fail(slot, google_exceptions.ServiceUnavailable("down"))
+    time.sleep(0.06)
+
+    def stream():
+        with slot:
+            yield "first"
+            yield "second"
+
+    reader = stream()
+    next(reader)
+    reader.close()   # the reader stopped early: no verdict on the provider
+    assert slot.breaker.state == CircuitBreaker.HALF_OPEN
+    with slot:
+        pass
+    assert slot.breaker.state == CircuitBreaker.CLOSED
+    assert slot.semaphore._value == 2
+
+
+@pytest.mark.parametrize("error, expected", [
+    (status_error(openai.InternalServerError, 500), True),
+    (openai.APIConnectionError(request=REQUEST), True),
+    (google_exceptions.ResourceExhausted("quota"), True),
+    (google_exceptions.DeadlineExceeded("slow"), True),
+    (httpx.ReadTimeout("slow"), True),
+    (google_exceptions.InvalidArgument("bad"), False),
+    (KeyError("name"), False),
+])
+def test_is_provider_error(error, expected):
+    assert is_provider_error(error) is expected
+
+
+class _Injected(Exception):
+    pass
+
+
+def test_gemini_models_use_the_injected_client():
+    # ClientRegistry.gemini sets GenerativeModel._client; this fails if the pinned SDK stops honouring it
+    import google.generativeai as genai
+
+    class FakeService:
+        def generate_content(self, request, **kwargs):
+            raise _Injected(request.model)
+
+    model = genai.GenerativeModel('gemini-2.5-flash')
+    model._client = FakeService()
+    with pytest.raises(_Injected, match="models/gemini-2.5-flash"):
+        model.generate_content("hello")
+
+
+def test_shared_gemini_model_is_bound_to_its_key():
+    clients = ClientRegistry()
+    model = clients.gemini('key-a', 'gemini-2.5-flash')
+    assert model is clients.gemini('key-a', 'gemini-2.5-flash')
+    assert model._client is clients._gemini_service('key-a')
+    assert clients.gemini('key-b', 'gemini-2.5-flash')._client is not model._client
@@ -0,0 +1,44 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from afridesk.llm_json import loads_lenient, repair_json
+
+
+@pytest.mark.parametrize("broken, expected", [
+    ('{"a": [1, 2,], }', {"a": [1, 2]}),
+    ('Here you go: {"a": 1} Hope this helps!', {"a": 1}),
+    ('{"a": 1, // a comment\n "b": 2}', {"a": 1, "b": 2}),
+    ('[{"a": 1} {"a": 2}]', [{"a": 1}, {"a": 2}]),
+    ('{"a": True, "b": False, "c": None}', {"a": True, "b": False, "c": None}),
+])
+def test_repair_json(broken, expected):
+    assert json.loads(repair_json(broken)) == expected
+
+
+def test_repair_json_leaves_string_contents_alone():
+    text = '{"note": "keep , ] // None True", "url": "http://x.y/z"}'
+    assert json.loads(repair_json(text)) == json.loads(text)
+
+
+def test_loads_lenient_only_repairs_on_failure():
+    assert loads_lenient('{"a": "True"}') == {"a": "True"}
+    assert loads_lenient('{"a": [1,],}') == {"a": [1]}
+    with pytest.raises(json.JSONDecodeError):
+        loads_lenient('{"a": ')
+
+
+def test_parse_outcomes_are_logged(monkeypatch):
+    from afridesk import llm_json
+
+    events = []
+    monkeypatch.setattr(llm_json, 'EVENT_SINK', SimpleNamespace(emit=lambda kind, **fields: events.append((kind, fields))))
+    llm_json.parse_services_response('{"services": [{"name": "Passport"}, {"description": "no name"},]}')
+    with pytest.raises(llm_json.ServicesParseError):
+        llm_json.parse_services_response('no services here')
+    assert events == [
+        ('services_parse', {'outcome': 'dropped_services', 'count': 1}),
+        ('services_parse', {'outcome': 'repaired', 'count': 1}),
+        ('services_parse', {'outcome': 'failed', 'count': 1}),
+    ]
@@ -0,0 +1,50 @@
+import gc
+
+import pytest
+
+from afridesk.records import Service, ServiceStore
+
+
+def service(name, **fields):
+    return dict({'name': name, 'fees': 'Free', 'required_documents': ['National ID']}, **fields)
+
+
+def test_records_read_like_dicts_and_are_immutable():
+    record = Service(service('Passport'))
+    assert record['name'] == 'Passport' and record.get('website') is None
+    assert record.to_dict() == {'name': 'Passport', 'fees': 'Free', 'required_documents': ['National ID']}
+    with pytest.raises(AttributeError):
+        record.id = 'x'
+
+
+def test_identical_services_share_one_record():
+    store = ServiceStore()
+    assert store.add(service('Passport')) is store.add(service('Passport'))
+    assert store.add(service('Passport')) is not store.add(service('Visa'))
+
+
+def test_evicted_records_stay_resolvable_while_referenced():
+    store = ServiceStore(max_generated=2)
+    session = [store.add(service(f"Service {n}")) for n in range(5)]
+    ids = [record.id for record in session]
+    assert store.get_many(ids) == session
+
+    del session
+    gc.collect()
+    # Only the LRU's most recent records outlive the session that held them
+    assert [record['name'] for record in store.get_many(ids)] == ["Service 3", "Service 4"]
+
+
+def test_evicted_record_added_again_is_the_live_one():
+    store = ServiceStore(max_generated=1)
+    held = store.add(service('Passport'))
+    store.add(service('Visa'))
+    assert store.add(service('Passport')) is held
+
+
+def test_pinned_records_are_never_evicted():
+    store = ServiceStore(max_generated=0)
+    pinned_id = store.add(service('Passport'), pinned=True).id
+    store.add(service('Visa'))
+    gc.collect()
+    assert store.get(pinned_id)['name'] == 'Passport'
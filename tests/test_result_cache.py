@@ -0,0 +1,170 @@
+import time
+
+import pytest
+
+from afridesk.result_cache import ResultCache
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "results.sqlite")
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_fresh_then_expired(cache_path):
+    cache = ResultCache('ttl', ttl=0.2, path=cache_path)
+    cache.set('k', {"services": [1]})
+    assert cache.get('k') == ({"services": [1]}, True)
+    time.sleep(0.3)
+    assert cache.get('k') == (None, False)
+
+
+def test_entries_survive_a_new_process_cache(cache_path):
+    ResultCache('disk', ttl=60, path=cache_path).set('k', [1, 2])
+    assert ResultCache('disk', ttl=60, path=cache_path).get('k') == ([1, 2], True)
+
+
+def test_stale_value_is_served_while_refreshing(cache_path):
+    cache = ResultCache('swr', ttl=0.1, stale_ttl=60, path=cache_path)
+    cache.set('k', "old")
+    time.sleep(0.15)
+    assert cache.get('k') == ("old", False)
+
+    computed = []
+
+    def compute():
+        computed.append(1)
+        time.sleep(0.1)
+        return "new"
+
+    # Served at once, refreshed once in the background however often it is asked for
+    assert cache.get_or_compute('k', compute) == "old"
+    assert cache.get_or_compute('k', compute) == "old"
+    assert wait_for(lambda: cache.get('k') == ("new", True))
+    assert computed == [1]
+
+
+def test_miss_computes_and_errors_are_not_cached(cache_path):
+    cache = ResultCache('miss', ttl=60, path=cache_path)
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute('k', lambda: (_ for _ in ()).throw(RuntimeError("down")))
+    assert cache.get('k') == (None, False)
+    assert cache.get_or_compute('k', lambda: "value") == "value"
+    assert cache.get('k') == ("value", True)
+
+
+def test_purge_by_tag(cache_path):
+    cache = ResultCache('tags', ttl=60, path=cache_path)
+    cache.set('a', 1, tag='kenya')
+    cache.set('b', 2, tag='ghana')
+    cache.purge(tag='kenya')
+    assert cache.get('a') == (None, False)
+    assert cache.get('b') == (2, True)
+
+
+def test_size_bound_evicts_least_recently_used(cache_path):
+    cache = ResultCache('lru', ttl=60, max_entries=2, memory_entries=0, path=cache_path)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.set('c', 3)
+    assert [key for key in ('a', 'b', 'c') if cache.get(key)[0] is not None] == ['b', 'c']
+
+
+@pytest.mark.parametrize("memory_entries", [256, 0])
+def test_callers_get_their_own_copy(cache_path, memory_entries):
+    cache = ResultCache('copies', ttl=60, memory_entries=memory_entries, path=cache_path)
+    value = {"services": [{"name": "Passport"}]}
+    cache.set('k', value)
+    value["services"].append("mutated after set")
+
+    first, _ = cache.get('k')
+    first["services"][0]["name"] = "mutated after get"
+    assert cache.get('k') == ({"services": [{"name": "Passport"}]}, True)
+
+
+def test_reads_touch_the_lru_timestamp_at_most_once_per_interval(cache_path, monkeypatch):
+    import sqlite3
+
+    from afridesk import result_cache
+
+    cache = ResultCache('touch', ttl=60, memory_entries=0, path=cache_path)
+    cache.set('k', [1])
+
+    def accessed_at():
+        with sqlite3.connect(cache_path) as conn:
+            return conn.execute("SELECT accessed_at FROM results WHERE namespace = 'touch'").fetchone()[0]
+
+    written = accessed_at()
+    cache.get('k')
+    assert accessed_at() == written
+
+    monkeypatch.setattr(result_cache, 'ACCESS_TOUCH_SECONDS', 0)
+    cache.get('k')
+    assert accessed_at() > written
+
+
+def test_purge_by_tag_words(cache_path):
+    cache = ResultCache('words', ttl=60, path=cache_path)
+    cache.set('a', 1, tag='nairobi')
+    cache.set('b', 2, tag='nairobi kenya')
+    cache.set('c', 3, tag='westlands nairobi')
+    cache.set('d', 4, tag='nairobiville')
+    cache.set('e', 5, tag='mombasa kenya')
+    assert cache.purge(tag_words='nairobi') == 3
+    assert [cache.get(key)[0] for key in 'abcde'] == [None, None, None, 4, 5]
+
+
+def test_concurrent_misses_compute_and_store_once(cache_path, monkeypatch):
+    import threading
+
+    cache = ResultCache('flight', ttl=60, path=cache_path)
+    calls, stores = [], []
+    release = threading.Event()
+    store = cache._store
+    monkeypatch.setattr(cache, '_store', lambda *args: stores.append(args[0]) or store(*args))
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {"services": [1]}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    assert wait_for(lambda: calls)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1] and stores == ['k']
+    assert results == [{"services": [1]}] * 4
+    # Every caller owns its result
+    assert len({id(result) for result in results}) == 4
+
+
+def test_memory_hits_reach_the_disk_lru(cache_path, monkeypatch):
+    from afridesk import result_cache
+
+    monkeypatch.setattr(result_cache, 'ACCESS_TOUCH_SECONDS', 0)
+    cache = ResultCache('hot', ttl=60, max_entries=2, path=cache_path)
+    cache.set('hot', 1)
+    time.sleep(0.01)
+    cache.set('warm', 2)
+    time.sleep(0.01)
+    assert cache.get('hot') == (1, True)   # served from memory
+    time.sleep(0.01)
+    cache.set('new', 3)
+
+    fresh = ResultCache('hot', ttl=60, memory_entries=0, path=cache_path)
+    assert fresh.get('hot') == (1, True)
+    assert fresh.get('warm') == (None, False)
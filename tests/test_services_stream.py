@@ -0,0 +1,94 @@
+import contextlib
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from afridesk import services
+from afridesk.llm_json import ServicesParseError
+
+SERVICES = [{"name": "KRA PIN Registration"}, {"name": "Business Name Registration"}]
+TEXT = json.dumps({"services": SERVICES})
+USER = {'country': 'Kenya', 'services_needed': ['Tax Services']}
+
+
+class Blocked:
+    @property
+    def text(self):
+        raise ValueError("blocked")
+
+
+class FakeClients:
+    def __init__(self, pieces, gate=None):
+        self.pieces = pieces
+        self.gate = gate
+        self.calls = 0
+
+    def gemini(self, api_key, model_name):
+        return SimpleNamespace(generate_content=self.generate_content)
+
+    def slot(self, provider, api_key):
+        return contextlib.nullcontext()
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        self.calls += 1
+        for piece in self.pieces:
+            if self.gate is not None:
+                self.gate.wait(5)
+            yield Blocked() if piece is None else SimpleNamespace(text=piece)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = services.PERSONALIZED_SERVICES_CACHE.with_path(str(tmp_path / "results.sqlite"))
+    monkeypatch.setattr(services, 'PERSONALIZED_SERVICES_CACHE', cache)
+    monkeypatch.setattr(services, 'PERSONALIZED_SERVICES_REQUESTS',
+                        services.PERSONALIZED_SERVICES_REQUESTS.with_path(str(tmp_path / "results.sqlite")))
+    return cache
+
+
+def names(streamed):
+    return [service['name'] for service in streamed]
+
+
+def test_blocked_chunks_are_skipped_and_the_result_cached(cache, monkeypatch):
+    clients = FakeClients([TEXT[:30], None, TEXT[30:]])
+    monkeypatch.setattr(services, 'LLM_CLIENTS', clients)
+    assert names(services.stream_personalized_services(USER, 'key')) == names(SERVICES)
+
+    lookups = []
+    get = cache.get
+    monkeypatch.setattr(cache, 'get', lambda key: lookups.append(key) or get(key))
+    assert names(services.stream_personalized_services(USER, 'key')) == names(SERVICES)
+    assert clients.calls == 1 and len(lookups) == 1
+
+
+def test_truncated_stream_yields_what_arrived_and_is_not_cached(cache, monkeypatch):
+    monkeypatch.setattr(services, 'LLM_CLIENTS', FakeClients([TEXT[:TEXT.index('}') + 1]]))
+    received = []
+    with pytest.raises(ServicesParseError):
+        for service in services.stream_personalized_services(USER, 'key'):
+            received.append(service)
+    assert names(received) == ["KRA PIN Registration"]
+    assert cache.get(services.personalized_services_cache_key('Kenya', ['Tax Services'])) == (None, False)
+
+
+def test_concurrent_identical_streams_share_one_call(cache, monkeypatch):
+    gate = threading.Event()
+    clients = FakeClients([TEXT], gate)
+    monkeypatch.setattr(services, 'LLM_CLIENTS', clients)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(names(services.stream_personalized_services(USER, 'key'))))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    threading.Timer(0.2, gate.set).start()
+    for thread in threads:
+        thread.join(5)
+
+    assert clients.calls == 1
+    assert results == [names(SERVICES)] * 3
@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+
+from afridesk.singleflight import SingleFlight
+
+
+def run_concurrently(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    calls = []
+    results = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return "offices"
+
+    run_concurrently(8, lambda: results.append(flight.do("nairobi", fetch)))
+    assert calls == [1]
+    assert results == ["offices"] * 8
+    assert flight.in_flight() == 0
+
+
+def test_error_is_shared_and_key_is_released():
+    flight = SingleFlight()
+    errors = []
+
+    def fail():
+        time.sleep(0.2)
+        raise RuntimeError("down")
+
+    def call():
+        try:
+            flight.do("k", fail)
+        except RuntimeError as e:
+            errors.append(e)
+
+    run_concurrently(4, call)
+    assert len(errors) == 4 and len({id(e) for e in errors}) == 1
+    assert flight.do("k", lambda: "recovered") == "recovered"
+
+
+def test_different_keys_do_not_wait_for_each_other():
+    flight = SingleFlight()
+    started = time.monotonic()
+    run_concurrently(2, lambda: flight.do(str(threading.get_ident()), lambda: time.sleep(0.2)))
+    assert time.monotonic() - started < 0.35
+
+
+def test_sequential_calls_run_again():
+    flight = SingleFlight()
+    assert flight.do("k", lambda: 1) == 1
+    assert flight.do("k", lambda: 2) == 2
+    with pytest.raises(ValueError):
+        flight.do("k", lambda: int("x"))